@@ -3,6 +3,8 @@ import argparse
 import json
 import os
 import re
+import time
+from array import array
 from collections import defaultdict
 from typing import Dict, Optional
 
@@ -22,68 +24,293 @@ def norm_call(cs: str) -> str:
     cs = (cs or "").strip().upper()
     return re.sub(r"[^\w/\-]+$", "", cs)
 
-def parse_log(path: str, mycall: str) -> Dict:
-    heard: Dict[str, dict] = {}
-    current_parent: Optional[str] = None
+class LogParser:
+    """Line-at-a-time beacon log parser; current_parent carries across feed() calls (and runs)."""
+
+    def __init__(self, current_parent: Optional[str] = None):
+        self.heard: Dict[str, dict] = {}
+        self.current_parent: Optional[str] = current_parent
+        self.parent_snr = defaultdict(lambda: None)
+        self.child_snr: Dict[str, Dict[str, Optional[float]]] = defaultdict(lambda: defaultdict(lambda: None))
+        self.samples = []  # every SNR reading: (parent, child or None, snr)
+
+    def feed(self, raw: str):
+        line = raw.strip()
+        if not line:
+            return
+
+        mp = PARENT_RE.match(line)
+        if mp:
+            p = norm_call(mp.group("call"))
+            self.current_parent = p
+            snr_txt = mp.group("snr")
+            if snr_txt is not None:
+                try:
+                    snr_val = float(snr_txt)
+                    self.parent_snr[p] = snr_val if self.parent_snr[p] is None else max(self.parent_snr[p], snr_val)
+                    self.samples.append((p, None, snr_val))
+                except Exception:
+                    pass
+            if p not in self.heard:
+                self.heard[p] = {}
+            return
 
-    parent_snr = defaultdict(lambda: None)
-    child_snr: Dict[str, Dict[str, Optional[float]]] = defaultdict(lambda: defaultdict(lambda: None))
+        mc = CHILD_RE.match(line)
+        if mc and self.current_parent:
+            current_parent = self.current_parent
+            c = norm_call(mc.group("call"))
+            snr_txt = mc.group("snr")
+            if snr_txt is not None:
+                try:
+                    snr_val = float(snr_txt)
+                    prev = self.child_snr[current_parent][c]
+                    self.child_snr[current_parent][c] = snr_val if prev is None else max(prev, snr_val)
+                    self.samples.append((current_parent, c, snr_val))
+                except Exception:
+                    pass
+            if current_parent not in self.heard:
+                self.heard[current_parent] = {}
+            self.heard[current_parent].setdefault("children", {})
+            self.heard[current_parent]["children"].setdefault(c, {})
 
+    def result(self, mycall: str) -> Dict:
+        out = {"mycall": mycall, "heard": {}}
+        for p, payload in self.heard.items():
+            entry = {}
+            if self.parent_snr[p] is not None:
+                entry["snr"] = round(self.parent_snr[p], 1)
+            if "children" in payload:
+                kids = {}
+                for c in payload["children"].keys():
+                    kentry = {}
+                    snr_val = self.child_snr[p][c]
+                    if snr_val is not None:
+                        kentry["snr"] = round(snr_val, 1)
+                    kids[c] = kentry
+                entry["children"] = kids
+            out["heard"][p] = entry
+        return out
+
+def parse_log(path: str, mycall: str) -> Dict:
+    lp = LogParser()
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
         for raw in f:
-            line = raw.strip()
-            if not line:
-                continue
-
-            mp = PARENT_RE.match(line)
-            if mp:
-                p = norm_call(mp.group("call"))
-                current_parent = p
-                snr_txt = mp.group("snr")
-                if snr_txt is not None:
-                    try:
-                        snr_val = float(snr_txt)
-                        parent_snr[p] = snr_val if parent_snr[p] is None else max(parent_snr[p], snr_val)
-                    except Exception:
-                        pass
-                if p not in heard:
-                    heard[p] = {}
-                continue
-
-            mc = CHILD_RE.match(line)
-            if mc and current_parent:
-                c = norm_call(mc.group("call"))
-                snr_txt = mc.group("snr")
-                if snr_txt is not None:
-                    try:
-                        snr_val = float(snr_txt)
-                        prev = child_snr[current_parent][c]
-                        child_snr[current_parent][c] = snr_val if prev is None else max(prev, snr_val)
-                    except Exception:
-                        pass
-                if current_parent not in heard:
-                    heard[current_parent] = {}
-                heard[current_parent].setdefault("children", {})
-                heard[current_parent]["children"].setdefault(c, {})
-                continue
+            lp.feed(raw)
+    return lp.result(mycall)
 
-    out = {"mycall": mycall, "heard": {}}
-    for p, payload in heard.items():
-        entry = {}
-        if parent_snr[p] is not None:
-            entry["snr"] = round(parent_snr[p], 1)
-        if "children" in payload:
-            kids = {}
-            for c in payload["children"].keys():
-                kentry = {}
-                snr_val = child_snr[p][c]
-                if snr_val is not None:
-                    kentry["snr"] = round(snr_val, 1)
-                kids[c] = kentry
-            entry["children"] = kids
-        out["heard"][p] = entry
+def parse_range(path: str, start: int, end: Optional[int], mycall: str, current_parent: Optional[str] = None,
+                include_partial: bool = False):
+    """Parse complete lines in bytes [start, end). Returns (graph, current_parent, next_offset, samples).
 
-    return out
+    end=None reads to EOF; a trailing partial line is left for the next run unless include_partial.
+    """
+    lp = LogParser(current_parent)
+    pos = start
+    with open(path, "rb") as f:
+        f.seek(start)
+        while end is None or pos < end:
+            raw = f.readline()
+            if not raw or (not raw.endswith(b"\n") and not include_partial):
+                break  # EOF or a line still being written
+            pos += len(raw)
+            lp.feed(raw.decode("utf-8", errors="ignore"))
+    return lp.result(mycall), lp.current_parent, pos, lp.samples
+
+def _parse_chunk(args):
+    return parse_range(*args)
+
+def chunk_offsets(path: str, jobs: int):
+    """Split the file into ~jobs byte ranges, each starting on a parent ('..<CALL>') line."""
+    size = os.path.getsize(path)
+    cuts = [0]
+    with open(path, "rb") as f:
+        for k in range(1, jobs):
+            pos = max(cuts[-1], size * k // jobs)
+            f.seek(pos)
+            if pos:
+                pos += len(f.readline())  # finish the line we landed in
+            while pos < size:
+                raw = f.readline()
+                if PARENT_RE.match(raw.decode("utf-8", errors="ignore").strip()):
+                    break
+                pos += len(raw)
+            if cuts[-1] < pos < size:
+                cuts.append(pos)
+    cuts.append(size)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+def parse_parallel(path: str, mycall: str, jobs: int, start: int = 0, current_parent: Optional[str] = None,
+                   include_partial: bool = False):
+    """Parse a large log across a process pool. Chunks begin at parent lines, so only the
+    first one needs the carried-over current_parent. Returns (graph, current_parent, offset, samples)."""
+    from concurrent.futures import ProcessPoolExecutor
+    ranges = [(a, b) for a, b in chunk_offsets(path, max(1, jobs)) if b > start]
+    if not ranges:
+        return {"mycall": mycall, "heard": {}}, current_parent, start, []
+    ranges[0] = (max(start, ranges[0][0]), ranges[0][1])
+    # the last chunk reads to EOF so a partial final line is left for the next run
+    last = len(ranges) - 1
+    tasks = [(path, a, b if i < last else None, mycall, current_parent if i == 0 else None,
+              include_partial and i == last)
+             for i, (a, b) in enumerate(ranges)]
+    graph = {"mycall": mycall, "heard": {}}
+    samples = []
+    with ProcessPoolExecutor(max_workers=len(tasks)) as ex:
+        for g, cp, off, smp in ex.map(_parse_chunk, tasks):
+            graph = merge_graph(graph, g, mycall)
+            current_parent = cp or current_parent
+            offset = off
+            samples.extend(smp)
+    return graph, current_parent, offset, samples
+
+# ---- Link quality: per-edge SNR time series ----
+# Each edge keeps three fixed-size rings of buckets (count/min/max/sum). Every sample lands in
+# all three, so the coarse tiers are exact downsamples of the fine one and outlive it.
+LQ_TIERS = (("5m", 300, 288),      # 5-minute buckets, 1 day
+            ("1h", 3600, 168),     # hourly, 1 week
+            ("1d", 86400, 180))    # daily, ~6 months
+
+class _SnrRing:
+    __slots__ = ("width", "bid", "cnt", "mn", "mx", "sm")
+
+    def __init__(self, width: int, n: int):
+        self.width = width
+        self.bid = array("q", [-1]) * n   # bucket id (epoch // width) owning each slot
+        self.cnt = array("l", [0]) * n
+        self.mn = array("f", [0.0]) * n
+        self.mx = array("f", [0.0]) * n
+        self.sm = array("d", [0.0]) * n
+
+    def add(self, ts: float, snr: float, count: int = 1, mn=None, mx=None, sm=None):
+        b = int(ts // self.width)
+        i = b % len(self.bid)
+        mn = snr if mn is None else mn
+        mx = snr if mx is None else mx
+        sm = snr * count if sm is None else sm
+        if self.bid[i] != b:
+            if self.bid[i] > b:
+                return  # older than this ring's retention
+            self.bid[i] = b; self.cnt[i] = count; self.mn[i] = mn; self.mx[i] = mx; self.sm[i] = sm
+            return
+        self.cnt[i] += count
+        self.mn[i] = min(self.mn[i], mn); self.mx[i] = max(self.mx[i], mx); self.sm[i] += sm
+
+    def buckets(self, since: float = 0, until: Optional[float] = None):
+        """[(bucket_start, count, min, max, mean), ...] for buckets starting in [since, until), oldest first."""
+        lo = int(since // self.width)
+        hi = int(-(-until // self.width)) if until is not None else None  # bucket_start < until
+        out = [(self.bid[i] * self.width, self.cnt[i], self.mn[i], self.mx[i], self.sm[i] / self.cnt[i])
+               for i in range(len(self.bid))
+               if self.cnt[i] and self.bid[i] >= lo and (hi is None or self.bid[i] < hi)]
+        out.sort()
+        return out
+
+    def newest(self) -> int:
+        return max(self.bid) * self.width if max(self.bid) >= 0 else 0
+
+class LinkQualityStore:
+    """SNR history per edge ("SRC>DST"; the parent as heard by MYCALL is "MYCALL>PARENT").
+
+    Memory per edge is fixed (~17 KB across the three tiers); prune() drops edges idle
+    longer than the daily tier keeps, so the total stays bounded over months.
+    """
+
+    def __init__(self):
+        self.edges: Dict[str, list] = {}
+
+    @staticmethod
+    def key(src: str, dst: str) -> str:
+        return f"{src}>{dst}"
+
+    def add(self, key: str, ts: float, snr: float):
+        rings = self.edges.get(key)
+        if rings is None:
+            rings = self.edges[key] = [_SnrRing(w, n) for _, w, n in LQ_TIERS]
+        for r in rings:
+            r.add(ts, float(snr))
+
+    def _ring(self, key: str, tier: str):
+        rings = self.edges.get(key)
+        if rings is None:
+            return None
+        return rings[[t[0] for t in LQ_TIERS].index(tier)]
+
+    def series(self, key: str, tier: str = "5m", since: float = 0, until: Optional[float] = None):
+        r = self._ring(key, tier)
+        return r.buckets(since, until) if r else []
+
+    def summary(self, key: str, window: float = 3600, now: Optional[float] = None):
+        """{'count','min','max','mean'} over the window seconds before now, from the finest tier covering it."""
+        now = time.time() if now is None else now
+        tier = next((name for name, w, n in LQ_TIERS if w * n >= window), LQ_TIERS[-1][0])
+        rows = self.series(key, tier, now - window, now)
+        if not rows:
+            return None
+        cnt = sum(r[1] for r in rows)
+        return {"count": cnt, "min": min(r[2] for r in rows), "max": max(r[3] for r in rows),
+                "mean": round(sum(r[1] * r[4] for r in rows) / cnt, 1)}
+
+    def trend(self, key: str, window: float = 3600, now: Optional[float] = None):
+        """Mean SNR change (dB) of the last window versus the window before it, or None."""
+        now = time.time() if now is None else now
+        cur = self.summary(key, window, now)
+        prev = self.summary(key, window, now - window)
+        if not cur or not prev:
+            return None
+        return round(cur["mean"] - prev["mean"], 1)
+
+    def prune(self, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        _, w, n = LQ_TIERS[-1]
+        for k in [k for k, rings in self.edges.items() if rings[-1].newest() < now - w * n]:
+            del self.edges[k]
+
+    def to_json(self) -> Dict:
+        out = {"tiers": [[name, w, n] for name, w, n in LQ_TIERS], "edges": {}}
+        for k, rings in self.edges.items():
+            out["edges"][k] = [[[r.bid[i], r.cnt[i], round(r.mn[i], 1), round(r.mx[i], 1), round(r.sm[i], 1)]
+                                for i in range(len(r.bid)) if r.cnt[i]] for r in rings]
+        return out
+
+    @classmethod
+    def from_json(cls, data: Dict) -> "LinkQualityStore":
+        st = cls()
+        for k, tiers in ((data or {}).get("edges") or {}).items():
+            rings = st.edges[k] = [_SnrRing(w, n) for _, w, n in LQ_TIERS]
+            for r, rows in zip(rings, tiers):
+                for b, c, mn, mx, sm in rows:
+                    r.add(b * r.width, 0.0, int(c), mn, mx, sm)
+        return st
+
+    @classmethod
+    def load(cls, path: str) -> "LinkQualityStore":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls.from_json(json.load(f))
+        except Exception:
+            return cls()
+
+    def save(self, path: str):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+def quality_path_for(output: str) -> str:
+    """link_quality.json sits beside link_graph.json."""
+    return os.path.join(os.path.dirname(os.path.abspath(output)), "link_quality.json")
+
+def record_samples(output: str, mycall: str, samples, ts: float, fresh: bool = False):
+    """Add parser SNR samples [(parent, child or None, snr)] at ts to the store next to output.
+    fresh=True discards the stored history first (the graph is being overwritten)."""
+    if not samples and not fresh:
+        return
+    path = quality_path_for(output)
+    st = LinkQualityStore() if fresh else LinkQualityStore.load(path)
+    for parent, child, snr in samples:
+        st.add(LinkQualityStore.key(parent, child) if child else LinkQualityStore.key(mycall, parent), ts, snr)
+    st.prune(ts)
+    st.save(path)
 
 def merge_graph(existing: Dict, new: Dict, mycall: str) -> Dict:
     out = {"mycall": mycall, "heard": {}}
@@ -117,30 +344,122 @@ def merge_graph(existing: Dict, new: Dict, mycall: str) -> Dict:
 
     return out
 
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024  # below this a process pool costs more than it saves
+
+def state_path_for(output: str) -> str:
+    """Incremental state lives next to the graph: link_graph.json -> link_graph.state.json."""
+    return os.path.splitext(output)[0] + ".state.json"
+
+def load_state(path: str) -> Dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            st = json.load(f)
+            return st if isinstance(st, dict) else {}
+    except Exception:
+        return {}
+
+def save_state(path: str, st: Dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(st, f, indent=2)
+    os.replace(tmp, path)
+
+def load_graph(path: str, mycall: str) -> Dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return {"mycall": mycall, "heard": {}}
+
+def write_graph(path: str, graph: Dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(graph, f, indent=2)
+    os.replace(tmp, path)
+
+def ingested_offset(input_path: str, output: str, fst=None):
+    """(offset, current_parent) of input_path already ingested into output, per the state file;
+    (0, None) with no state or when the log was rotated or truncated since."""
+    st = load_state(state_path_for(output))
+    fst = fst or os.stat(input_path)
+    same = (st.get("input") == os.path.abspath(input_path) and st.get("inode") == fst.st_ino
+            and st.get("dev") == fst.st_dev and int(st.get("offset", 0)) <= fst.st_size)
+    return (int(st.get("offset", 0)), st.get("current_parent")) if same else (0, None)
+
+def save_ingested(input_path: str, output: str, fst, offset: int, current_parent: Optional[str]):
+    save_state(state_path_for(output), {"input": os.path.abspath(input_path), "inode": fst.st_ino,
+                                        "dev": fst.st_dev, "offset": offset, "current_parent": current_parent})
+
+def parse_new_bytes(input_path: str, output: str, mycall: str, jobs: int = 1) -> int:
+    """--follow: parse only bytes appended since the last run and merge them into output.
+
+    The state file records the input's inode/device and byte offset plus current_parent;
+    if the log was rotated or truncated, parsing restarts from the top. Returns bytes parsed.
+    Beacon lines carry no timestamp, so new SNR readings are filed under the time of this run.
+    """
+    fst = os.stat(input_path)
+    start, cp = ingested_offset(input_path, output, fst)
+    if fst.st_size <= start:
+        return 0
+
+    if jobs > 1 and fst.st_size - start >= PARALLEL_MIN_BYTES:
+        new_data, cp, offset, samples = parse_parallel(input_path, mycall, jobs, start, cp)
+    else:
+        new_data, cp, offset, samples = parse_range(input_path, start, None, mycall, cp)
+    if offset > start:
+        write_graph(output, merge_graph(load_graph(output, mycall), new_data, mycall))
+        record_samples(output, mycall, samples, time.time())
+    save_ingested(input_path, output, fst, offset, cp)
+    return offset - start
+
 def main():
     ap = argparse.ArgumentParser(description="Generate or update link_graph.json from beacon logs")
     ap.add_argument("--input", required=True, help="Path to beacon log text file")
     ap.add_argument("--output", default="./store/link_graph.json", help="Output JSON path (default: ./store/link_graph.json)")
     ap.add_argument("--mycall", required=True, help="Your callsign (center node)")
     ap.add_argument("--mode", choices=["append", "overwrite"], default="append", help="Append (merge) or overwrite the output file (default: append)")
+    ap.add_argument("--follow", action="store_true", help="Incremental: parse only bytes added since the last run (state kept next to the output)")
+    ap.add_argument("--poll", type=float, default=0, help="With --follow, keep running and re-check every N seconds")
+    ap.add_argument("--jobs", type=int, default=1, help="Parse large logs in parallel chunks across N processes")
     args = ap.parse_args()
-
-    new_data = parse_log(args.input, args.mycall.upper())
+    mycall = args.mycall.upper()
 
     os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
 
+    if args.follow:
+        while True:
+            n = parse_new_bytes(args.input, args.output, mycall, args.jobs)
+            if n:
+                print(f"Wrote {args.output} (+{n} bytes)")
+            if args.poll <= 0:
+                break
+            time.sleep(args.poll)
+        return
+
+    fst = os.stat(args.input)
+    fresh = args.mode == "overwrite"
+    start, cp = (0, None) if fresh else ingested_offset(args.input, args.output, fst)
+    if args.jobs > 1:
+        new_data, end_cp, end, samples = parse_parallel(args.input, mycall, args.jobs)
+    else:
+        new_data, end_cp, end, samples = parse_range(args.input, 0, None, mycall)
+    # a partial last line still counts for the graph; its reading waits until the line is complete
+    tail = parse_range(args.input, end, None, mycall, end_cp, include_partial=True)[0]
+    if tail["heard"]:
+        new_data = merge_graph(new_data, tail, mycall)
+    if start:
+        # earlier runs (one-shot or --follow) already filed the readings before start
+        samples = parse_range(args.input, start, end, mycall, cp)[3]
+    # a whole-log parse has no per-line times; file the readings at the log's last write
+    record_samples(args.output, mycall, samples, fst.st_mtime, fresh=fresh)
+    save_ingested(args.input, args.output, fst, end, end_cp)
+
     if args.mode == "overwrite" or not os.path.exists(args.output):
         final = new_data
     else:
-        try:
-            with open(args.output, "r", encoding="utf-8") as f:
-                existing = json.load(f)
-        except Exception:
-            existing = {"mycall": args.mycall.upper(), "heard": {}}
-        final = merge_graph(existing, new_data, args.mycall.upper())
+        final = merge_graph(load_graph(args.output, mycall), new_data, mycall)
 
-    with open(args.output, "w", encoding="utf-8") as f:
-        json.dump(final, f, indent=2)
+    write_graph(args.output, final)
     print(f"Wrote {args.output} (mode: {args.mode})")
 
 if __name__ == "__main__":
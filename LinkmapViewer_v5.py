@@ -10,8 +10,12 @@ LinkmapViewer v5 — Uniform triangles (18px) + edge routing
 - Labels centered under triangles with overlap avoidance
 """
 
-import os, sys, json, math, argparse
+import os, sys, json, math, time, argparse
 from PyQt5 import QtCore, QtGui, QtWidgets
+try:
+    from Linkmap import LinkQualityStore, quality_path_for  # SNR history written by Linkmap.py
+except Exception:
+    LinkQualityStore = None
 
 DARK_BG  = "#0b0f14"
 PANEL_BG = "#0f1621"
@@ -24,12 +28,25 @@ C_ORANGE = QtGui.QColor("#FFA500")  # child
 
 TRI_RADIUS = 18  # uniform triangle size for all roles
 
+# Cached static layer: tiles are rendered per zoom bucket and blitted on pan
+ZOOM_BUCKET_STEP = 1.25   # re-render when zoom crosses a power of this
+TILE_PX = 512
+TILE_CACHE_MAX = 48      # ~48 MB at 512 px ARGB
+
+# Edge colour ramp for link quality (mean SNR, dB): red at/below WEAK, green at/above STRONG
+SNR_WEAK_DB = -18.0
+SNR_STRONG_DB = 3.0
+
 class LinkGraph:
     def __init__(self, path):
         self.path = path
         self.mycall = "ME"
         self.nodes = []  # [{'label','role'}]
         self.edges = []  # [(src, dst)]
+        self.version = 0  # bumped only when nodes/edges actually change
+        self.quality = None          # LinkQualityStore from link_quality.json, if present
+        self.quality_version = 0
+        self._quality_mtime = None
         self.load()
 
     def load(self):
@@ -38,6 +55,32 @@ class LinkGraph:
                 data = json.load(f)
         except Exception:
             data = {"mycall":"ME","heard":{}}
+        self.set_data(data)
+        self._load_quality()
+
+    def _load_quality(self):
+        if LinkQualityStore is None or not self.path:
+            return
+        try:
+            qp = quality_path_for(self.path)
+            mt = os.path.getmtime(qp) if os.path.exists(qp) else None
+        except Exception:
+            return
+        if mt != self._quality_mtime:
+            self._quality_mtime = mt
+            self.quality = LinkQualityStore.load(qp) if mt else None
+            self.quality_version += 1
+
+    def edge_snr(self, src, dst):
+        """Mean SNR over the last hour (else day) for edge src->dst by node index, or None."""
+        if self.quality is None:
+            return None
+        key = LinkQualityStore.key(self.nodes[src]["label"], self.nodes[dst]["label"])
+        s = self.quality.summary(key, 3600) or self.quality.summary(key, 86400)
+        return s["mean"] if s else None
+
+    def set_data(self, data):
+        old = (self.mycall, [n["label"] for n in self.nodes], self.edges)
         self.mycall = (data.get("mycall") or "ME").upper()
         heard = data.get("heard", {}) or {}
 
@@ -56,6 +99,80 @@ class LinkGraph:
                 self.nodes.append({"label": c, "role": "child"})
                 self.edges.append((pi, ci))  # parent -> child (branch outward)
 
+        if (self.mycall, [n["label"] for n in self.nodes], self.edges) != old:
+            self.version += 1
+
+class RectGrid:
+    """Uniform grid over axis-aligned rects (label boxes) for overlap and segment queries."""
+
+    def __init__(self, cell=96.0):
+        self.cell = float(cell)
+        self.cells = {}   # (i, j) -> set(keys)
+        self.rects = {}   # key -> (left, top, right, bottom)
+
+    def _span(self, l, t, r, b):
+        c = self.cell
+        return int(math.floor(l / c)), int(math.floor(t / c)), int(math.floor(r / c)), int(math.floor(b / c))
+
+    def insert(self, key, rect: QtCore.QRectF):
+        box = (rect.left(), rect.top(), rect.right(), rect.bottom())
+        self.rects[key] = box
+        i0, j0, i1, j1 = self._span(*box)
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                self.cells.setdefault((i, j), set()).add(key)
+
+    def remove(self, key):
+        box = self.rects.pop(key, None)
+        if box is None:
+            return
+        i0, j0, i1, j1 = self._span(*box)
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                s = self.cells.get((i, j))
+                if s is not None:
+                    s.discard(key)
+                    if not s:
+                        del self.cells[(i, j)]
+
+    def move(self, key, rect: QtCore.QRectF):
+        self.remove(key); self.insert(key, rect)
+
+    def query_box(self, l, t, r, b):
+        """Keys whose cells touch the box (candidates; caller does the exact test)."""
+        i0, j0, i1, j1 = self._span(l, t, r, b)
+        out = set()
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                s = self.cells.get((i, j))
+                if s:
+                    out |= s
+        return out
+
+    def query_segment(self, x1, y1, x2, y2):
+        """Candidate keys along a segment: walks the cells the segment passes through."""
+        c = self.cell
+        i, j = int(math.floor(x1 / c)), int(math.floor(y1 / c))
+        i_end, j_end = int(math.floor(x2 / c)), int(math.floor(y2 / c))
+        dx, dy = x2 - x1, y2 - y1
+        si = 1 if dx > 0 else -1; sj = 1 if dy > 0 else -1
+        t_dx = abs(c / dx) if dx else float("inf")
+        t_dy = abs(c / dy) if dy else float("inf")
+        nx = ((i + (si > 0)) * c - x1) / dx if dx else float("inf")
+        ny = ((j + (sj > 0)) * c - y1) / dy if dy else float("inf")
+        out = set()
+        for _ in range(abs(i_end - i) + abs(j_end - j) + 1):
+            s = self.cells.get((i, j))
+            if s:
+                out |= s
+            if i == i_end and j == j_end:
+                break
+            if nx < ny:
+                i += si; nx += t_dx
+            else:
+                j += sj; ny += t_dy
+        return out
+
 def equilateral_triangle(center_x, center_y, radius, rotation=0.0):
     pts = []
     for k in range(3):
@@ -134,12 +251,19 @@ class GraphView(QtWidgets.QWidget):
 
         self._positions = {}
         self._label_boxes = []  # list[(QRectF, idx)]
+        self._label_grid = RectGrid()
+        self._label_rect = {}   # node index -> label QRectF
+        self._routes = []       # per edge: routed polyline points
+        self._layout_key = None # (graph.version, w, h) the cached layout was built for
         self._recalc_needed = True
+        self._world_rect = QtCore.QRectF()
+        self._tiles = {}        # (ti, tj) -> QPixmap for the current (layout, zoom bucket)
+        self._tile_key = None
 
         self._timer = QtCore.QTimer(self); self._timer.setInterval(200); self._timer.timeout.connect(self.update); self._timer.start()
 
     def sizeHint(self): return QtCore.QSize(1360, 900)
-    def resetView(self): self._offset = QtCore.QPointF(0,0); self._zoom = 1.0; self._recalc_needed = True; self.update()
+    def resetView(self): self._offset = QtCore.QPointF(0,0); self._zoom = 1.0; self.update()
 
     def wheelEvent(self, ev: QtGui.QWheelEvent):
         delta = ev.angleDelta().y() / 120.0
@@ -207,37 +331,86 @@ class GraphView(QtWidgets.QWidget):
             rect = QtCore.QRectF(x - box_w/2.0, y + TRI_RADIUS + 10, box_w, box_h)
             boxes.append([rect, i])
 
-        # Resolve label overlaps (downward/outward bias)
-        def collide(a: QtCore.QRectF, b: QtCore.QRectF) -> bool:
-            return a.intersects(b)
+        # Resolve label overlaps (downward/outward bias); only grid neighbours are tested
+        cell = 2.0 * max([b[0].width() for b in boxes] + [b[0].height() for b in boxes] + [48.0])
+        grid = RectGrid(cell)
+        for k, (rect, _) in enumerate(boxes):
+            grid.insert(k, rect)
 
         cx, cy = w/2.0, h/2.0
         for _ in range(36):
             moved = False
             for ia in range(len(boxes)):
-                ra, ia_idx = boxes[ia]
-                for ib in range(ia+1, len(boxes)):
-                    rb, ib_idx = boxes[ib]
-                    if collide(ra, rb):
+                ra = boxes[ia][0]
+                near = grid.query_box(ra.left(), ra.top(), ra.right(), ra.bottom())
+                for ib in sorted(k for k in near if k > ia):
+                    rb = boxes[ib][0]
+                    if ra.intersects(rb):
                         ax, ay = ra.center().x(), ra.center().y()
                         bx, by = rb.center().x(), rb.center().y()
                         # push down and out
                         ra.translate(0, 9); rb.translate(0, -9)
                         ra.translate((ax - cx)*0.02, (ay - cy)*0.02)
                         rb.translate((bx - cx)*0.02, (by - cy)*0.02)
-                        boxes[ia][0] = ra; boxes[ib][0] = rb
+                        grid.move(ia, ra); grid.move(ib, rb)
                         moved = True
             if not moved:
                 break
 
+        # Label grid keyed by node index, reused for edge routing
+        self._label_grid = RectGrid(cell)
+        for rect, idx in boxes:
+            self._label_grid.insert(idx, rect)
         self._positions = pos
         self._label_boxes = boxes
+        self._label_rect = {idx: rect for rect, idx in boxes}
+
+        # Route every edge once per layout; paint just replays the polylines
+        routes = []
+        for (src, dst) in self.graph.edges:
+            x1, y1 = pos.get(src, (cx, cy))
+            x2, y2 = pos.get(dst, (cx, cy))
+            tx1, ty1, tx2, ty2 = trim_segment(x1, y1, x2, y2, TRI_RADIUS, TRI_RADIUS, margin=8.0)
+            routes.append(self._route_segment(tx1, ty1, tx2, ty2, src_idx=src, dst_idx=dst))
+        self._routes = routes
+
+        # World bounds for tiling: nodes, labels and detours
+        xs = [x for x, _ in pos.values()] + [x for r in routes for x, _ in r]
+        ys = [y for _, y in pos.values()] + [y for r in routes for _, y in r]
+        world = QtCore.QRectF(min(xs) - TRI_RADIUS, min(ys) - TRI_RADIUS,
+                              max(xs) - min(xs) + 2 * TRI_RADIUS, max(ys) - min(ys) + 2 * TRI_RADIUS)
+        for rect, _ in boxes:
+            world = world.united(rect)
+        self._world_rect = world.adjusted(-4, -4, 4, 4)
+
+    def _edge_pens(self):
+        """One pen per edge: green by default, red (weak) .. green (strong) from link_quality SNR."""
+        key = (self._layout_key, self.graph.quality_version)
+        if getattr(self, "_pens_key", None) != key:
+            default = QtGui.QPen(EDGE_QCOLOR, 2.2)
+            pens = []
+            for (src, dst) in self.graph.edges:
+                snr = self.graph.edge_snr(src, dst)
+                if snr is None:
+                    pens.append(default)
+                    continue
+                t = max(0.0, min(1.0, (snr - SNR_WEAK_DB) / (SNR_STRONG_DB - SNR_WEAK_DB)))
+                pens.append(QtGui.QPen(QtGui.QColor.fromHsvF(t / 3.0, 1.0, 0.9, 0.85), 2.2))
+            self._pens_cache, self._pens_key = pens, key
+        return self._pens_cache
+
+    def _ensure_layout(self, w, h):
+        key = (self.graph.version, w, h)
+        if self._recalc_needed or key != self._layout_key:
+            self._compute_layout(w, h)
+            self._layout_key = key
+            self._recalc_needed = False
 
     def _edge_hits_any_label(self, x1, y1, x2, y2, exclude_a=None, exclude_b=None) -> bool:
-        for rect, idx in self._label_boxes:
+        for idx in self._label_grid.query_segment(x1, y1, x2, y2):
             if idx == exclude_a or idx == exclude_b:
                 continue
-            if segment_intersects_rect(x1, y1, x2, y2, rect):
+            if segment_intersects_rect(x1, y1, x2, y2, self._label_rect[idx]):
                 return True
         return False
 
@@ -263,29 +436,66 @@ class GraphView(QtWidgets.QWidget):
 
     def paintEvent(self, ev: QtGui.QPaintEvent):
         p = QtGui.QPainter(self)
-        p.setRenderHint(QtGui.QPainter.Antialiasing, True)
         p.fillRect(self.rect(), QtGui.QColor(DARK_BG))
 
         w, h = self.width(), self.height()
-        if not self._positions or self._recalc_needed:
-            self._compute_layout(w, h)
-            self._recalc_needed = False
-
-        # world transform
+        self._ensure_layout(w, h)
+
+        # The graph is pre-rendered into tiles at the nearest zoom bucket.
+        # Pan is a blit; zoom inside a bucket only rescales the cached tiles.
+        bucket = int(round(math.log(self._zoom, ZOOM_BUCKET_STEP)))
+        zb = ZOOM_BUCKET_STEP ** bucket
+        key = (self._layout_key, bucket, self.graph.quality_version)
+        if key != self._tile_key:
+            self._tiles.clear()
+            self._tile_key = key
+        s = self._zoom / zb
+        if abs(s - 1.0) > 1e-6:
+            p.setRenderHint(QtGui.QPainter.SmoothPixmapTransform, True)
         p.translate(self._offset)
-        p.scale(self._zoom, self._zoom)
-
-        # draw edges (green), with trimming and routing
-        pen_edge = QtGui.QPen(EDGE_QCOLOR, 2.2)
-        p.setPen(pen_edge)
-        for (src, dst) in self.graph.edges:
-            x1, y1 = self._positions.get(src, (w/2, h/2))
-            x2, y2 = self._positions.get(dst, (w/2, h/2))
-            # trim at triangles
-            tx1, ty1, tx2, ty2 = trim_segment(x1, y1, x2, y2, TRI_RADIUS, TRI_RADIUS, margin=8.0)
-            # route if would cross labels
-            pts = self._route_segment(tx1, ty1, tx2, ty2, src_idx=src, dst_idx=dst)
-            # draw polyline
+        p.scale(s, s)
+
+        # visible area in bucket-pixel coordinates, clipped to the world bounds
+        wr = self._world_rect
+        vx0 = max((-self._offset.x()) / s, wr.left() * zb)
+        vy0 = max((-self._offset.y()) / s, wr.top() * zb)
+        vx1 = min((w - self._offset.x()) / s, wr.right() * zb)
+        vy1 = min((h - self._offset.y()) / s, wr.bottom() * zb)
+        if vx1 <= vx0 or vy1 <= vy0:
+            return
+        T = TILE_PX
+        for ti in range(int(math.floor(vx0 / T)), int(math.floor(vx1 / T)) + 1):
+            for tj in range(int(math.floor(vy0 / T)), int(math.floor(vy1 / T)) + 1):
+                p.drawPixmap(ti * T, tj * T, self._tile(ti, tj, zb))
+
+    def _tile(self, ti, tj, zb):
+        pm = self._tiles.pop((ti, tj), None)
+        if pm is None:
+            pm = QtGui.QPixmap(TILE_PX, TILE_PX)
+            pm.fill(QtCore.Qt.transparent)
+            tp = QtGui.QPainter(pm)
+            tp.setRenderHint(QtGui.QPainter.Antialiasing, True)
+            tp.translate(-ti * TILE_PX, -tj * TILE_PX)
+            tp.scale(zb, zb)
+            self._paint_world(tp, QtCore.QRectF(ti * TILE_PX / zb, tj * TILE_PX / zb, TILE_PX / zb, TILE_PX / zb))
+            tp.end()
+            while len(self._tiles) >= TILE_CACHE_MAX:
+                self._tiles.pop(next(iter(self._tiles)))
+        self._tiles[(ti, tj)] = pm  # re-insert: dict order doubles as LRU order
+        return pm
+
+    def _paint_world(self, p, clip: QtCore.QRectF):
+        """Draw edges, triangles and labels that touch clip (world coordinates)."""
+        pad = TRI_RADIUS + 4
+        cl, ct, cr, cb = clip.left() - pad, clip.top() - pad, clip.right() + pad, clip.bottom() + pad
+
+        # draw edges, trimmed and routed once per layout; coloured by recent SNR when known
+        pens = self._edge_pens()
+        for pts, pen in zip(self._routes, pens):
+            xs = [q[0] for q in pts]; ys = [q[1] for q in pts]
+            if max(xs) < cl or min(xs) > cr or max(ys) < ct or min(ys) > cb:
+                continue
+            p.setPen(pen)
             for i in range(len(pts)-1):
                 a = pts[i]; b = pts[i+1]
                 p.drawLine(QtCore.QLineF(a[0], a[1], b[0], b[1]))
@@ -295,8 +505,11 @@ class GraphView(QtWidgets.QWidget):
         pen_parent = QtGui.QPen(C_RED,    3.0)
         pen_child  = QtGui.QPen(C_ORANGE, 3.0)
 
+        p.setBrush(QtCore.Qt.NoBrush)
         for i, node in enumerate(self.graph.nodes):
-            x, y = self._positions.get(i, (w/2, h/2))
+            x, y = self._positions.get(i, (0.0, 0.0))
+            if x < cl or x > cr or y < ct or y > cb:
+                continue
             role = node["role"]
             if role == "center":
                 pen = pen_center
@@ -305,13 +518,14 @@ class GraphView(QtWidgets.QWidget):
             else:
                 pen = pen_child
             pts = equilateral_triangle(x, y, TRI_RADIUS, rotation=-math.pi/2)
-            p.setBrush(QtCore.Qt.NoBrush); p.setPen(pen)
+            p.setPen(pen)
             p.drawPolygon(QtGui.QPolygonF(pts))
 
         # labels centered under triangles (drawn last)
         p.setFont(self._font)
         p.setPen(QtGui.QPen(QtGui.QColor(FG_TEXT)))
-        for rect, idx in self._label_boxes:
+        for idx in self._label_grid.query_box(clip.left(), clip.top(), clip.right(), clip.bottom()):
+            rect = self._label_rect[idx]
             text = self.graph.nodes[idx]["label"]
             p.drawText(rect, QtCore.Qt.AlignHCenter | QtCore.Qt.AlignVCenter, text)
 
@@ -367,8 +581,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.statusBar().showMessage(msg, 6000)
 
     def reload_graph(self):
-        self.graph.load()
-        self.view._recalc_needed = True
+        self.graph.load()  # bumps graph.version only if the content changed
         self.view.update()
         self._status("Graph reloaded.")
 
@@ -460,12 +673,52 @@ def build_html(graph: LinkGraph) -> str:
 """
     return html
 
+def _bench_heard(n_nodes):
+    """Synthetic graph: ~n_nodes stations split into parents with 4 children each."""
+    n_par = max(1, n_nodes // 5)
+    heard = {}
+    k = 0
+    for i in range(n_par):
+        kids = {}
+        for _ in range(4):
+            kids[f"C{k:04d}"] = {}
+            k += 1
+        heard[f"P{i:04d}"] = {"children": kids}
+    return {"mycall": "ME", "heard": heard}
+
+def run_benchmark(sizes=(100, 500, 2000)):
+    """Time layout (label collision + edge routing) and a cached re-layout per graph size."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv)
+    for n in sizes:
+        g = LinkGraph(os.devnull)
+        g.set_data(_bench_heard(n))
+        v = GraphView(g); v._timer.stop()
+        w, h = 1360, 900
+        t0 = time.perf_counter(); v._ensure_layout(w, h); t1 = time.perf_counter()
+        v._ensure_layout(w, h); t2 = time.perf_counter()
+        routed = sum(1 for r in v._routes if len(r) > 2)
+        # first paint renders tiles; a pan afterwards should only blit them
+        v.resize(w, h)
+        img = QtGui.QImage(w, h, QtGui.QImage.Format_ARGB32)
+        t3 = time.perf_counter(); v.render(img); t4 = time.perf_counter()
+        v._offset += QtCore.QPointF(40, 25)
+        v.render(img); t5 = time.perf_counter()
+        print(f"{len(g.nodes):5d} nodes  layout {1000*(t1-t0):8.1f} ms  cached {1000*(t2-t1):6.3f} ms  "
+              f"edges {len(g.edges)} (rerouted {routed})  paint {1000*(t4-t3):6.1f} ms  pan {1000*(t5-t4):6.2f} ms")
+    return app
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--json", default=os.path.join(".", "store", "link_graph.json"), help="Path to link_graph.json")
     ap.add_argument("--refresh", type=int, default=1800, help="Auto-refresh seconds (min 60)")
+    ap.add_argument("--bench", action="store_true", help="Time layout at 100/500/2000 nodes and exit")
     args = ap.parse_args()
 
+    if args.bench:
+        run_benchmark()
+        return
+
     app = QtWidgets.QApplication(sys.argv); app.setStyle("Fusion")
     win = MainWindow(args.json, max(60, args.refresh)); win.show()
     sys.exit(app.exec_())
@@ -55,6 +55,12 @@ try:
 except Exception:
     serial = None
     SERIAL_AVAILABLE = False
+try:
+    import numpy as _np
+    NUMPY_AVAILABLE = True
+except Exception:
+    _np = None
+    NUMPY_AVAILABLE = False
 
 # --------- Helpers ---------
 
@@ -85,6 +91,267 @@ def _geo_cardinal16(deg):
     except Exception:
         return "N"
 
+# ---- Compact position tracks: packed ring buffer + Douglas-Peucker export ----
+from array import array as _array
+
+POS_TRACK_CAPACITY = 512       # points kept per station
+POS_TRACK_MIN_MOVE_M = 25.0    # record a point once the station moved this far...
+POS_TRACK_MAX_GAP_SEC = 900    # ...or this long after the last recorded point
+POS_SAVE_MIN_SEC = 5.0         # positions.json is rewritten at most this often while fixes stream in
+# (min zoom, max zoom, simplification tolerance in metres) for tracks.geojson
+POS_TRACK_ZOOMS = ((0, 7, 2000.0), (8, 11, 200.0), (12, 22, 15.0))
+
+class _PosTrack:
+    '''Per-station track as packed t/lat/lon columns in a fixed-size ring.'''
+    __slots__ = ('cap', 't', 'lat', 'lon', 'head', 'size')
+
+    def __init__(self, cap=POS_TRACK_CAPACITY):
+        self.cap = max(2, int(cap))
+        self.t = _array('q', [0]) * self.cap
+        self.lat = _array('d', [0.0]) * self.cap
+        self.lon = _array('d', [0.0]) * self.cap
+        self.head = 0   # next write slot
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, t, lat, lon):
+        i = self.head
+        self.t[i] = int(t); self.lat[i] = float(lat); self.lon[i] = float(lon)
+        self.head = (i + 1) % self.cap
+        if self.size < self.cap:
+            self.size += 1
+
+    def last(self):
+        if not self.size:
+            return None
+        i = (self.head - 1) % self.cap
+        return (self.t[i], self.lat[i], self.lon[i])
+
+    def offer(self, t, lat, lon, min_move_m=POS_TRACK_MIN_MOVE_M, max_gap_sec=POS_TRACK_MAX_GAP_SEC):
+        '''Record the fix only if it moved far enough or the last point is old. Returns True if kept.'''
+        prev = self.last()
+        if prev is not None:
+            moved_m = _geo_haversine_km(prev[1], prev[2], lat, lon) * 1000.0
+            if moved_m < float(min_move_m) and (int(t) - prev[0]) < int(max_gap_sec):
+                return False
+        self.push(t, lat, lon)
+        return True
+
+    def points(self):
+        '''Chronological list of (t, lat, lon).'''
+        start = (self.head - self.size) % self.cap
+        out = []
+        for k in range(self.size):
+            i = (start + k) % self.cap
+            out.append((self.t[i], self.lat[i], self.lon[i]))
+        return out
+
+    def to_json(self):
+        pts = self.points()
+        return {'t': [p[0] for p in pts],
+                'lat': [round(p[1], 6) for p in pts],
+                'lon': [round(p[2], 6) for p in pts]}
+
+    @classmethod
+    def from_entry(cls, entry, cap=POS_TRACK_CAPACITY):
+        '''Build from a positions.json entry: column 'track' or legacy 'history' list of dicts.'''
+        tr = cls(cap)
+        try:
+            col = entry.get('track')
+            if isinstance(col, dict):
+                for t, la, lo in zip(col.get('t') or [], col.get('lat') or [], col.get('lon') or []):
+                    tr.push(t, la, lo)
+                return tr
+            for h in entry.get('history') or []:
+                try:
+                    tr.push(int(h.get('t') or h.get('ts') or 0), float(h['lat']), float(h['lon']))
+                except Exception:
+                    continue
+        except Exception:
+            pass
+        return tr
+
+def _geo_simplify_dp(pts, tol_m):
+    '''Douglas-Peucker over [(lat, lon), ...]; returns the kept points. Iterative, local flat projection.'''
+    n = len(pts)
+    if n < 3 or tol_m <= 0:
+        return list(pts)
+    lat0 = math.radians(pts[0][0])
+    kx = 6371000.0 * math.cos(lat0) * math.pi / 180.0
+    ky = 6371000.0 * math.pi / 180.0
+    xy = [(p[1] * kx, p[0] * ky) for p in pts]
+    keep = bytearray(n)
+    keep[0] = keep[n - 1] = 1
+    tol2 = float(tol_m) ** 2
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        ax, ay = xy[a]; bx, by = xy[b]
+        dx, dy = bx - ax, by - ay
+        seg2 = dx * dx + dy * dy
+        best, best_d2 = -1, tol2
+        for i in range(a + 1, b):
+            px, py = xy[i][0] - ax, xy[i][1] - ay
+            if seg2 > 0:
+                u = max(0.0, min(1.0, (px * dx + py * dy) / seg2))
+                ex, ey = px - u * dx, py - u * dy
+            else:
+                ex, ey = px, py
+            d2 = ex * ex + ey * ey
+            if d2 > best_d2:
+                best, best_d2 = i, d2
+        if best >= 0:
+            keep[best] = 1
+            stack.append((a, best)); stack.append((best, b))
+    return [pts[i] for i in range(n) if keep[i]]
+
+def _pos_tracks_features(positions):
+    '''GeoJSON LineString features per station and zoom band from positions.json entries.'''
+    feats = []
+    for call, ent in (positions.items() if isinstance(positions, dict) else []):
+        if not isinstance(ent, dict):
+            continue
+        pts = [(p[1], p[2]) for p in _PosTrack.from_entry(ent).points()]
+        if len(pts) < 2:
+            continue
+        for zmin, zmax, tol in POS_TRACK_ZOOMS:
+            simp = _geo_simplify_dp(pts, tol)
+            if len(simp) < 2:
+                continue
+            feats.append({
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": [[lo, la] for la, lo in simp]},
+                "properties": {"callsign": str(call), "minzoom": zmin, "maxzoom": zmax,
+                               "tolerance_m": tol, "points": len(simp)}
+            })
+    return feats
+
+# ---- Spatial index over station positions (grid buckets) ----
+class _GeoGridIndex:
+    '''Fixed-degree grid buckets: callsign -> (lat, lon), cell -> {callsigns}.'''
+
+    def __init__(self, cell_deg=0.5):
+        self.cell = float(cell_deg)
+        self.pts = {}
+        self.cells = {}
+
+    def __len__(self):
+        return len(self.pts)
+
+    def _key(self, lat, lon):
+        return (int(math.floor(lat / self.cell)), int(math.floor(lon / self.cell)))
+
+    def update(self, cs, lat, lon):
+        '''Insert or move cs. Returns True if the stored position changed.'''
+        lat = float(lat); lon = float(lon)
+        old = self.pts.get(cs)
+        if old == (lat, lon):
+            return False
+        if old is not None:
+            k = self._key(*old)
+            b = self.cells.get(k)
+            if b is not None:
+                b.discard(cs)
+                if not b:
+                    del self.cells[k]
+        self.pts[cs] = (lat, lon)
+        self.cells.setdefault(self._key(lat, lon), set()).add(cs)
+        return True
+
+    def remove(self, cs):
+        old = self.pts.pop(cs, None)
+        if old is None:
+            return False
+        k = self._key(*old)
+        b = self.cells.get(k)
+        if b is not None:
+            b.discard(cs)
+            if not b:
+                del self.cells[k]
+        return True
+
+    def bbox(self, south, west, north, east):
+        '''Callsigns inside the box (no antimeridian wrap).'''
+        (i0, j0), (i1, j1) = self._key(south, west), self._key(north, east)
+        out = []
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self.cells):
+            keys = [k for k in self.cells if i0 <= k[0] <= i1 and j0 <= k[1] <= j1]
+        else:
+            keys = [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+        for k in keys:
+            for cs in self.cells.get(k, ()):
+                la, lo = self.pts[cs]
+                if south <= la <= north and west <= lo <= east:
+                    out.append(cs)
+        return out
+
+    def within_km(self, lat, lon, km):
+        '''[(km, cs), ...] sorted by distance for stations within km of (lat, lon).'''
+        dlat = km / 111.32
+        dlon = km / max(1e-6, 111.32 * math.cos(math.radians(min(89.9, abs(lat)))))
+        cand = self.bbox(lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+        out = []
+        for cs in cand:
+            d = _geo_haversine_km(lat, lon, *self.pts[cs])
+            if d <= km:
+                out.append((d, cs))
+        out.sort()
+        return out
+
+    def nearest(self, lat, lon, n=5):
+        '''[(km, cs), ...] for the n closest stations; grows the search ring until satisfied.'''
+        if not self.pts or n <= 0:
+            return []
+        ci, cj = self._key(lat, lon)
+        seen, found, r = set(), [], 0
+        max_r = 1 + max(max(abs(k[0] - ci), abs(k[1] - cj)) for k in self.cells)
+        while r <= max_r:
+            for i in range(ci - r, ci + r + 1):
+                for j in range(cj - r, cj + r + 1):
+                    if max(abs(i - ci), abs(j - cj)) != r:
+                        continue
+                    for cs in self.cells.get((i, j), ()):
+                        if cs not in seen:
+                            seen.add(cs)
+                            found.append((_geo_haversine_km(lat, lon, *self.pts[cs]), cs))
+            # Anything beyond ring r is at least r cells away; longitude cells shrink with latitude
+            reach = r * self.cell * 111.32 * math.cos(math.radians(min(89.9, abs(lat) + r * self.cell)))
+            if len(found) >= n and sorted(found)[n - 1][0] <= reach:
+                break
+            r += 1
+        found.sort()
+        return found[:n]
+
+def _geo_metrics_batch(lat0, lon0, pts):
+    '''Distance (km) and bearing (deg) from one origin to many (lat, lon) points. NumPy when available.'''
+    if not pts:
+        return [], []
+    if NUMPY_AVAILABLE:
+        a = _np.radians(_np.asarray(pts, dtype=float))
+        p1 = math.radians(lat0); l1 = math.radians(lon0)
+        p2 = a[:, 0]; dl = a[:, 1] - l1
+        h = _np.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * _np.cos(p2) * _np.sin(dl / 2) ** 2
+        km = 2 * 6371.0 * _np.arctan2(_np.sqrt(h), _np.sqrt(1 - h))
+        x = _np.sin(dl) * _np.cos(p2)
+        y = math.cos(p1) * _np.sin(p2) - math.sin(p1) * _np.cos(p2) * _np.cos(dl)
+        deg = (_np.degrees(_np.arctan2(x, y)) + 360.0) % 360.0
+        return km.tolist(), deg.tolist()
+    km = [_geo_haversine_km(lat0, lon0, la, lo) for la, lo in pts]
+    deg = [_geo_initial_bearing_deg(lat0, lon0, la, lo) for la, lo in pts]
+    return km, deg
+
+def _geo_metric_dict(km, deg):
+    mi = km * 0.621371
+    def _fmt(x): return f"{x:.1f}" if x < 100 else f"{x:.0f}"
+    return {"km": km, "mi": mi, "deg": deg, "card": _geo_cardinal16(deg),
+            "km_str": _fmt(km), "mi_str": _fmt(mi),
+            "deg_str": f"{int(round(deg))%360:03d}"}
+
+def _geo_metric_text(m):
+    return f"{m['km_str']} km / {m['mi_str']} mi  {m['deg_str']}\u00b0 {m['card']}"
+
 def diag_log(msg: str):
     try:
         base = app_base_dir()
@@ -329,6 +596,551 @@ class FleetManager:
                 return True
         return False
 
+# --------- Link graph model ---------
+import heapq
+
+class LinkEdge:
+    '''parent -> child link, last heard (epoch seconds).'''
+    __slots__ = ('parent', 'child', 'last')
+
+    def __init__(self, parent: str, child: str, last: int = 0):
+        self.parent = parent; self.child = child; self.last = int(last or 0)
+
+class LinkNode:
+    '''A parent beacon with its children edges.'''
+    __slots__ = ('call', 'last', 'children')
+
+    def __init__(self, call: str, last: int = 0):
+        self.call = call; self.last = int(last or 0); self.children = {}
+
+class LinkGraphEvent:
+    '''One batch of changes: callsigns added, removed or updated (re-heard).'''
+    __slots__ = ('added', 'removed', 'updated')
+
+    def __init__(self):
+        self.added = set(); self.removed = set(); self.updated = set()
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.updated)
+
+class LinkGraph:
+    '''In-memory parent/child link graph.
+
+    Expiry is driven by a min-heap of (last_heard, parent, child) entries; stale
+    heap entries are skipped lazily. Subscribers get a LinkGraphEvent per change.
+    '''
+
+    def __init__(self):
+        self.parents = {}       # call -> LinkNode
+        self._refs = {}         # call -> number of places it appears (as parent or child)
+        self._heap = []         # (last, parent, child or '')
+        self._subs = []
+        self.version = 0
+        self._view = None
+
+    # ---- subscribers ----
+    def subscribe(self, fn):
+        if fn not in self._subs:
+            self._subs.append(fn)
+
+    def unsubscribe(self, fn):
+        try: self._subs.remove(fn)
+        except ValueError: pass
+
+    def _emit(self, ev):
+        if not ev:
+            return ev
+        self.version += 1
+        self._view = None
+        for fn in list(self._subs):
+            try:
+                fn(ev)
+            except Exception as e:
+                diag_log(f"LinkGraph subscriber failed: {e}")
+        return ev
+
+    # ---- node refcounts ----
+    def _ref(self, call, ev):
+        n = self._refs.get(call, 0)
+        self._refs[call] = n + 1
+        if n == 0:
+            ev.added.add(call)
+            ev.removed.discard(call)
+
+    def _unref(self, call, ev):
+        n = self._refs.get(call, 0) - 1
+        if n <= 0:
+            self._refs.pop(call, None)
+            ev.removed.add(call)
+            ev.added.discard(call); ev.updated.discard(call)
+        else:
+            self._refs[call] = n
+
+    # ---- queries ----
+    def has_node(self, call: str) -> bool:
+        return call in self._refs
+
+    def nodes(self):
+        return self._refs.keys()
+
+    def children_of(self, parent: str):
+        node = self.parents.get(parent)
+        return list(node.children.keys()) if node else []
+
+    def edges(self):
+        for p, node in self.parents.items():
+            for c in node.children:
+                yield (p, c)
+
+    def next_expiry(self):
+        '''Oldest live last-heard timestamp, or None.'''
+        self._drop_stale_heap_top()
+        return self._heap[0][0] if self._heap else None
+
+    # ---- mutation ----
+    def update(self, parent: str, children=(), ts: int = None, _ev=None):
+        '''Parent heard (optionally with children) at ts.'''
+        ev = _ev if _ev is not None else LinkGraphEvent()
+        if not parent:
+            return ev
+        ts = int(ts or time.time())
+        node = self.parents.get(parent)
+        if node is None:
+            node = self.parents[parent] = LinkNode(parent, ts)
+            self._ref(parent, ev)
+        elif ts >= node.last:
+            node.last = ts
+            if parent not in ev.added:
+                ev.updated.add(parent)
+        heapq.heappush(self._heap, (node.last, parent, ''))
+        for c in children or ():
+            self._touch_edge(node, c, ts, ev)
+        self._compact_heap()
+        return ev if _ev is not None else self._emit(ev)
+
+    def _touch_edge(self, node, c, ts, ev):
+        if not c or c == node.call:
+            return
+        edge = node.children.get(c)
+        if edge is None:
+            edge = node.children[c] = LinkEdge(node.call, c, ts)
+            self._ref(c, ev)
+        elif ts >= edge.last:
+            edge.last = ts
+            if c not in ev.added:
+                ev.updated.add(c)
+        heapq.heappush(self._heap, (edge.last, node.call, c))
+
+    def remove_parent(self, parent: str, _ev=None):
+        ev = _ev if _ev is not None else LinkGraphEvent()
+        node = self.parents.pop(parent, None)
+        if node is not None:
+            for c in node.children:
+                self._unref(c, ev)
+            self._unref(parent, ev)
+        return ev if _ev is not None else self._emit(ev)
+
+    def remove_edge(self, parent: str, child: str, _ev=None):
+        ev = _ev if _ev is not None else LinkGraphEvent()
+        node = self.parents.get(parent)
+        if node is not None and node.children.pop(child, None) is not None:
+            self._unref(child, ev)
+        return ev if _ev is not None else self._emit(ev)
+
+    def remove_call(self, call: str):
+        '''Drop call everywhere it appears (e.g. MYCALL purge).'''
+        ev = LinkGraphEvent()
+        self.remove_parent(call, ev)
+        for p in [p for p, n in self.parents.items() if call in n.children]:
+            self.remove_edge(p, call, ev)
+        return self._emit(ev)
+
+    def clear(self):
+        ev = LinkGraphEvent()
+        ev.removed.update(self._refs.keys())
+        self.parents.clear(); self._refs.clear(); self._heap = []
+        return self._emit(ev)
+
+    def expire(self, cutoff: int):
+        '''Remove parents/edges last heard before cutoff. Cost is proportional to what expires.'''
+        ev = LinkGraphEvent()
+        heap = self._heap
+        while heap and heap[0][0] < cutoff:
+            last, p, c = heapq.heappop(heap)
+            node = self.parents.get(p)
+            if node is None:
+                continue
+            if not c:
+                if node.last == last:
+                    self.remove_parent(p, ev)
+            else:
+                edge = node.children.get(c)
+                if edge is not None and edge.last == last:
+                    self.remove_edge(p, c, ev)
+        return self._emit(ev)
+
+    def _drop_stale_heap_top(self):
+        heap = self._heap
+        while heap:
+            last, p, c = heap[0]
+            node = self.parents.get(p)
+            if node is not None:
+                if not c and node.last == last:
+                    return
+                edge = node.children.get(c) if c else None
+                if edge is not None and edge.last == last:
+                    return
+            heapq.heappop(heap)
+
+    def _compact_heap(self):
+        live = len(self.parents) + sum(len(n.children) for n in self.parents.values()) \
+            if len(self._heap) > 256 else 0
+        if live and len(self._heap) > 4 * live:
+            self._heap = [(n.last, p, '') for p, n in self.parents.items()]
+            self._heap += [(e.last, p, c) for p, n in self.parents.items() for c, e in n.children.items()]
+            heapq.heapify(self._heap)
+
+    # ---- persistence / legacy dict view ----
+    def to_dict(self):
+        '''{parent: {'last': ts, 'children': {child: {'last': ts}}}} (cached until the next change).'''
+        if self._view is None:
+            self._view = {p: {'last': n.last, 'children': {c: {'last': e.last} for c, e in n.children.items()}}
+                          for p, n in self.parents.items()}
+        return self._view
+
+    def load_dict(self, parents):
+        '''Replace contents from either stored shape: {p: [kids]} or {p: {'last', 'children'}}.'''
+        before = set(self._refs.keys())
+        scratch = LinkGraphEvent()
+        self.parents.clear(); self._refs.clear(); self._heap = []
+        for p, v in (parents.items() if isinstance(parents, dict) else []):
+            p = str(p)
+            if isinstance(v, dict):
+                try: last = int(v.get('last') or 0)
+                except Exception: last = 0
+                kids = v.get('children') if isinstance(v.get('children'), dict) else {}
+                self.update(p, (), last, scratch)
+                node = self.parents[p]
+                for c, meta in kids.items():
+                    try: cl = int((meta or {}).get('last') or 0) if isinstance(meta, dict) else 0
+                    except Exception: cl = 0
+                    self._touch_edge(node, str(c), cl or node.last, scratch)
+            elif isinstance(v, (list, tuple)):
+                # legacy list shape has no timestamps: treat as heard now
+                self.update(p, [str(x) for x in v if isinstance(x, str)], 0, scratch)
+            else:
+                self.update(p, (), 0, scratch)
+        after = set(self._refs.keys())
+        ev = LinkGraphEvent()
+        ev.added = after - before; ev.removed = before - after; ev.updated = after & before
+        return self._emit(ev)
+
+# --------- Routing over the link graph ---------
+ROUTE_MAX_AGE_SEC = 3600     # edges older than this get the full freshness penalty
+ROUTE_FRESH_WEIGHT = 1.0     # extra cost for a stale edge (a fresh edge costs 1.0)
+ROUTE_SNR_WEIGHT = 1.5       # extra cost for a weak edge
+ROUTE_SNR_GOOD_DB = 3.0      # at or above: no SNR penalty
+ROUTE_SNR_BAD_DB = -18.0     # at or below: full SNR penalty
+ROUTE_SNR_UNKNOWN = 0.5      # penalty fraction when no SNR history exists
+
+class Route:
+    '''Best path to one destination: first hop, total cost, hop count and predecessor.'''
+    __slots__ = ('dest', 'next_hop', 'cost', 'hops', 'prev')
+
+    def __init__(self, dest, next_hop, cost, hops, prev):
+        self.dest = dest; self.next_hop = next_hop; self.cost = cost; self.hops = hops; self.prev = prev
+
+class LinkRouter:
+    '''Dijkstra from origin (MYCALL) over a LinkGraph.
+
+    Edges: origin -> every parent (we heard its beacon) and parent <-> child
+    (the parent lists the child as heard). metric='quality' weighs edges by
+    freshness and SNR (quality_fn(src, dst) -> mean dB or None); metric='hops'
+    counts hops. Freshness is an edge's age relative to the newest beacon in the
+    graph, so costs only move when the graph does: the routing table is rebuilt
+    lazily after a graph event or invalidate(); between changes next_hop()/route()
+    are dict lookups.
+    '''
+
+    def __init__(self, graph, origin: str = '', metric: str = 'quality', quality_fn=None):
+        self.graph = graph
+        self.origin = origin or ''
+        self.metric = metric
+        self.quality_fn = quality_fn
+        self._routes = {}
+        self._dirty = True
+        self.version = 0
+        graph.subscribe(self._on_graph_event)
+
+    def _on_graph_event(self, ev):
+        self._dirty = True
+
+    def invalidate(self):
+        self._dirty = True
+
+    def set_origin(self, origin: str):
+        origin = origin or ''
+        if origin != self.origin:
+            self.origin = origin
+            self._dirty = True
+
+    def set_metric(self, metric: str):
+        if metric != self.metric:
+            self.metric = metric
+            self._dirty = True
+
+    # ---- weights ----
+    def _edge_cost(self, src, dst, last, now):
+        if self.metric == 'hops':
+            return 1.0
+        age = max(0, now - int(last or 0))
+        cost = 1.0 + ROUTE_FRESH_WEIGHT * min(1.0, age / float(ROUTE_MAX_AGE_SEC))
+        snr = None
+        if self.quality_fn is not None:
+            try: snr = self.quality_fn(src, dst)
+            except Exception: snr = None
+        if snr is None:
+            pen = ROUTE_SNR_UNKNOWN
+        else:
+            pen = (ROUTE_SNR_GOOD_DB - float(snr)) / (ROUTE_SNR_GOOD_DB - ROUTE_SNR_BAD_DB)
+            pen = min(1.0, max(0.0, pen))
+        return cost + ROUTE_SNR_WEIGHT * pen
+
+    def _newest(self):
+        '''Last-heard time of the newest parent or edge: the "now" edge ages are measured from.'''
+        newest = 0
+        for node in self.graph.parents.values():
+            newest = max(newest, int(node.last or 0), *(int(e.last or 0) for e in node.children.values()))
+        return newest
+
+    def _adjacency(self, now):
+        adj = {}
+        g = self.graph
+        o = self.origin
+        for p, node in g.parents.items():
+            if p == o:
+                continue
+            adj.setdefault(o, []).append((p, self._edge_cost(o, p, node.last, now)))
+            for c, edge in node.children.items():
+                if c == o:
+                    continue
+                # only the parent's P>C SNR is ever logged: the link costs the same both ways
+                w = self._edge_cost(p, c, edge.last, now)
+                adj.setdefault(p, []).append((c, w))
+                adj.setdefault(c, []).append((p, w))
+        return adj
+
+    def _rebuild(self):
+        routes = {}
+        o = self.origin
+        if o:
+            adj = self._adjacency(self._newest())
+            dist = {o: 0.0}
+            heap = [(0.0, 0, o, '', '')]   # (cost, hops, call, first hop, predecessor)
+            while heap:
+                d, h, u, first, prev = heapq.heappop(heap)
+                if u in routes or d > dist.get(u, float('inf')):
+                    continue
+                if u != o:
+                    routes[u] = Route(u, first, d, h, prev)
+                for v, w in adj.get(u, ()):
+                    nd = d + w
+                    if v != o and v not in routes and nd < dist.get(v, float('inf')):
+                        dist[v] = nd
+                        heapq.heappush(heap, (nd, h + 1, v, first or v, u))
+        self._routes = routes
+        self._dirty = False
+        self.version += 1
+
+    # ---- queries ----
+    def routes(self):
+        '''dest -> Route (shared dict; do not mutate).'''
+        if self._dirty:
+            self._rebuild()
+        return self._routes
+
+    def route(self, dest: str):
+        return self.routes().get(dest)
+
+    def next_hop(self, dest: str):
+        r = self.routes().get(dest)
+        return r.next_hop if r is not None else None
+
+    def hops(self, dest: str):
+        r = self.routes().get(dest)
+        return r.hops if r is not None else None
+
+    def path(self, dest: str):
+        '''[origin, ..., dest] or [] when unreachable.'''
+        routes = self.routes()
+        if dest not in routes:
+            return []
+        out = [dest]
+        while out[-1] in routes:
+            out.append(routes[out[-1]].prev)
+        out.reverse()
+        return out
+
+# --------- Relay gate: TTL dedupe + token buckets ---------
+from collections import OrderedDict
+
+RELAY_DEDUPE_TTL_SEC = 30
+RELAY_TARGET_RATE = (1.0 / 10.0, 3)   # per target: tokens/sec, burst
+RELAY_GLOBAL_RATE = (1.0 / 3.0, 5)    # all relays: tokens/sec, burst
+RELAY_MAX_TARGETS = 256               # per-target buckets kept (LRU)
+TX_QUEUE_GAP_MS = 200                 # spacing between queued TX lines (PTT keying)
+TX_QUEUE_MAX = 64
+
+class TTLCache:
+    '''Keys expire ttl seconds after insertion. One TTL for every key keeps the
+    OrderedDict in expiry order, so expiry pops from the front in O(1) each.'''
+
+    def __init__(self, ttl: float, max_items: int = 4096):
+        self.ttl = float(ttl)
+        self.max_items = int(max_items)
+        self._d = OrderedDict()   # key -> expiry time
+
+    def expire(self, now: float):
+        d = self._d
+        while d:
+            k, exp = next(iter(d.items()))
+            if exp > now:
+                break
+            d.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._d
+
+    def add(self, key, now: float) -> bool:
+        '''Insert key; False if it was already present (and not yet expired).'''
+        self.expire(now)
+        if key in self._d:
+            return False
+        self._d[key] = now + self.ttl
+        while len(self._d) > self.max_items:
+            self._d.popitem(last=False)
+        return True
+
+    def __len__(self):
+        return len(self._d)
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'ts')
+
+    def __init__(self, rate: float, burst: float, now: float = 0.0):
+        self.rate = float(rate); self.burst = float(burst)
+        self.tokens = float(burst); self.ts = now
+
+    def _refill(self, now: float):
+        if now > self.ts:
+            self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+
+    def ready(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= 1.0
+
+    def take(self, now: float) -> bool:
+        self._refill(now)
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+# Relay header: ' [RLY:<hops>/<ttl>:<digest>]' placed before any [ACK:...] tag, so
+# plain 'TO DE FROM msg [ACK:id]' parsers (and older clients) keep working.
+RELAY_DEFAULT_TTL = 3
+# Message bodies that are protocol frames between two other stations, not chat: never relayed
+RELAY_SKIP_PREFIXES = ('FILE ', '[FRG:', '[ZNAK:', '~Z')
+RELAY_SEEN_MAX = 2048
+RELAY_HDR_RE = re.compile(r"\s*\[RLY:(\d{1,2})/(\d{1,2}):([0-9A-F]{6})\]", re.I)
+
+def relay_digest(line: str) -> str:
+    '''6-hex digest of a chat line with any relay header removed and whitespace collapsed.'''
+    import hashlib
+    core = " ".join(RELAY_HDR_RE.sub("", line or "").split()).upper()
+    return hashlib.sha1(core.encode('utf-8', 'ignore')).hexdigest()[:6]
+
+def relay_parse(line: str):
+    '''(line without header, hops, ttl, digest). Lines without a header get hops=0 and the default TTL.'''
+    m = RELAY_HDR_RE.search(line or "")
+    if not m:
+        return (line or ""), 0, RELAY_DEFAULT_TTL, relay_digest(line)
+    plain = (line[:m.start()] + line[m.end():]).strip()
+    return plain, int(m.group(1)), int(m.group(2)), m.group(3).lower()
+
+def relay_stamp(plain: str, hops: int, ttl: int, digest: str) -> str:
+    '''Insert the relay header before a trailing [ACK:...] tag (or at the end).'''
+    hdr = f" [RLY:{int(hops)}/{int(ttl)}:{digest}]"
+    m = None
+    for m in ACK_TAG_RE.finditer(plain):
+        pass
+    if m is not None and not plain[m.end():].strip():
+        return plain[:m.start()].rstrip() + hdr + " " + plain[m.start():]
+    return plain.rstrip() + hdr
+
+class RelayGate:
+    '''Decides whether a heard line may be relayed: loop check against the seen-digest
+    LRU, hop limit, dedupe, then the per-target and global buckets (a token is
+    spent only if both allow).'''
+
+    def __init__(self, ttl=RELAY_DEDUPE_TTL_SEC, target_rate=RELAY_TARGET_RATE, global_rate=RELAY_GLOBAL_RATE):
+        self.seen = TTLCache(ttl)
+        self.digests = OrderedDict()    # digest -> None (LRU, RELAY_SEEN_MAX)
+        self.target_rate = target_rate
+        self.global_bucket = TokenBucket(global_rate[0], global_rate[1], time.time())
+        self._targets = OrderedDict()   # target -> TokenBucket (LRU)
+        self.stats = {'relayed': 0, 'dup': 0, 'limited': 0, 'loop': 0, 'ttl': 0}
+
+    def note_digest(self, digest: str):
+        d = self.digests
+        if digest in d:
+            d.move_to_end(digest)
+        else:
+            d[digest] = None
+            while len(d) > RELAY_SEEN_MAX:
+                d.popitem(last=False)
+
+    def check_relay(self, target: str, line: str, hops: int, ttl: int, digest: str, now: float = None) -> str:
+        '''Like check(), but also drops loops (digest already relayed) and expired hop counts.'''
+        if digest in self.digests:
+            self.digests.move_to_end(digest)
+            self.stats['loop'] += 1
+            return 'loop'
+        if hops >= ttl:
+            self.stats['ttl'] += 1
+            return 'ttl'
+        why = self.check(target, line, now)
+        if not why:
+            self.note_digest(digest)
+        return why
+
+    def _bucket(self, target, now):
+        b = self._targets.get(target)
+        if b is None:
+            b = self._targets[target] = TokenBucket(self.target_rate[0], self.target_rate[1], now)
+            while len(self._targets) > RELAY_MAX_TARGETS:
+                self._targets.popitem(last=False)
+        else:
+            self._targets.move_to_end(target)
+        return b
+
+    def check(self, target: str, line: str, now: float = None) -> str:
+        '''"" if the line may be relayed now, else the reason ("dup" or "limited").'''
+        now = time.time() if now is None else now
+        self.seen.expire(now)
+        if line in self.seen:
+            self.stats['dup'] += 1
+            return 'dup'
+        b = self._bucket(target, now)
+        if not (b.ready(now) and self.global_bucket.ready(now)):
+            self.stats['limited'] += 1
+            return 'limited'
+        b.take(now); self.global_bucket.take(now)
+        self.seen.add(line, now)   # only relayed lines count as seen; a limited one may go later
+        self.stats['relayed'] += 1
+        return ''
+
 # --------- Serial thread (stub) ---------
 class SerialReaderThread(QThread):
     line_received = pyqtSignal(str)
@@ -656,65 +1468,2277 @@ class ThemeManager:
 ACK_TAG_RE = re.compile(r"\[ACK:([A-Za-z0-9]{4,10})\]")
 DE_MSG_RE = re.compile(r"^\s*([A-Z0-9]{1,6}(?:-[0-9]{1,2})?)\s+DE\s+([A-Z0-9]{1,6}(?:-[0-9]{1,2})?)\s+(.+?)(?:\s+\[ACK[:\s]?([A-Z0-9]{1,10})\])?\s*$", re.I)
 
+# --------- ACK tracking: one timer wheel for every in-flight message ---------
+ACK_WHEEL_TICK_MS = 250
+ACK_WHEEL_SLOTS = 256
+ACK_KEEP_DONE = 512          # completed ack ids remembered (late/duplicate ACKs)
+
+class TimerWheel:
+    '''Hashed timer wheel. schedule()/cancel() are O(1); advance() fires what is due.
+    One periodic tick drives every deadline instead of one QTimer per entry.'''
+
+    def __init__(self, tick_s: float = ACK_WHEEL_TICK_MS / 1000.0, slots: int = ACK_WHEEL_SLOTS):
+        self.tick_s = float(tick_s)
+        self.n = int(slots)
+        self._slots = [dict() for _ in range(self.n)]   # key -> (due tick, fn)
+        self._where = {}                                # key -> slot index
+        self._t0 = time.monotonic()
+        self._cur = 0                                   # last tick processed
+
+    def _tick_at(self, now=None):
+        return int(((time.monotonic() if now is None else now) - self._t0) / self.tick_s)
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def schedule(self, key, delay_s: float, fn, now=None):
+        '''Call fn(key) after delay_s; replaces any earlier deadline for key.'''
+        self.cancel(key)
+        if not self._where:
+            self._cur = self._tick_at(now)   # idle wheel: nothing to catch up on
+        due = max(self._cur + 1, self._tick_at(now) + max(1, int(math.ceil(float(delay_s) / self.tick_s))))
+        i = due % self.n
+        self._slots[i][key] = (due, fn)
+        self._where[key] = i
+
+    def cancel(self, key):
+        i = self._where.pop(key, None)
+        if i is not None:
+            self._slots[i].pop(key, None)
+
+    def advance(self, now=None) -> int:
+        '''Fire everything due up to now; visits each slot at most once per call.'''
+        target = self._tick_at(now)
+        fired = []
+        for t in range(self._cur + 1, self._cur + 1 + min(target - self._cur, self.n)):
+            slot = self._slots[t % self.n]
+            for k in [k for k, (due, _) in slot.items() if due <= target]:
+                fired.append((k, slot.pop(k)[1]))
+                self._where.pop(k, None)
+        self._cur = max(self._cur, target)
+        for k, fn in fired:
+            try:
+                fn(k)
+            except Exception as e:
+                diag_log(f"TimerWheel callback failed for {k}: {e}")
+        return len(fired)
+
+# --------- Per-peer ACK round-trip estimation (RFC 6298 style) ---------
+ACK_RTO_MIN_S = 4.0
+ACK_RTO_MAX_S = 60.0
+ACK_RTT_FILE = 'ack_rtt.json'
+
+class PeerRtt:
+    __slots__ = ('srtt', 'rttvar', 'rto', 'samples', 'acks', 'retries', 'avoided', 'fails', 'last')
+
+    def __init__(self):
+        self.srtt = None; self.rttvar = None; self.rto = None
+        self.samples = 0; self.acks = 0; self.retries = 0; self.avoided = 0; self.fails = 0; self.last = 0
+
+    def to_json(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    @classmethod
+    def from_json(cls, d):
+        p = cls()
+        for k in cls.__slots__:
+            if k in d:
+                setattr(p, k, d[k])
+        return p
+
+class PeerRttTable:
+    '''SRTT/RTTVAR per peer from first-attempt ACK round trips (Karn: retransmitted
+    messages are not sampled). RTO = SRTT + 4*RTTVAR, clamped; doubled per retry and
+    after a failed message. Peers without samples use the manual ACK pause, unchanged
+    from try to try.'''
+
+    def __init__(self):
+        self.peers = {}
+
+    def _peer(self, call):
+        call = base_callsign((call or '').upper())
+        p = self.peers.get(call)
+        if p is None:
+            p = self.peers[call] = PeerRtt()
+        return p
+
+    def get(self, call):
+        return self.peers.get(base_callsign((call or '').upper()))
+
+    def retry_delay(self, call, attempt: int, default_s: float) -> float:
+        '''Seconds to wait after sending attempt n (1-based) before retrying: the fixed
+        default_s until the peer has an RTT sample, then its RTO doubled per retry.'''
+        p = self.get(call)
+        if p is None or not p.rto:
+            return float(default_s)
+        return min(ACK_RTO_MAX_S, p.rto * (2 ** max(0, int(attempt) - 1)))
+
+    def sample(self, call, rtt: float):
+        p = self._peer(call)
+        rtt = max(0.0, float(rtt))
+        if p.srtt is None:
+            p.srtt = rtt; p.rttvar = rtt / 2.0
+        else:
+            p.rttvar = 0.75 * p.rttvar + 0.25 * abs(p.srtt - rtt)
+            p.srtt = 0.875 * p.srtt + 0.125 * rtt
+        p.rto = min(ACK_RTO_MAX_S, max(ACK_RTO_MIN_S, p.srtt + 4.0 * p.rttvar))
+        p.samples += 1
+
+    def note_ack(self, call, attempts: int, rtt_first: float, fixed_pause: float):
+        '''ACK arrived attempts tries after rtt_first seconds from the first send.'''
+        p = self._peer(call)
+        p.acks += 1; p.last = int(time.time())
+        if attempts == 1:
+            self.sample(call, rtt_first)
+            if rtt_first > fixed_pause:
+                p.avoided += 1   # a fixed pause timer would have retransmitted
+
+    def note_retry(self, call):
+        self._peer(call).retries += 1
+
+    def note_fail(self, call):
+        p = self._peer(call)
+        p.fails += 1; p.last = int(time.time())
+        if p.rto:
+            p.rto = min(ACK_RTO_MAX_S, p.rto * 2.0)
+
+    def totals(self):
+        t = {'peers': len(self.peers), 'acks': 0, 'retries': 0, 'avoided': 0, 'fails': 0}
+        for p in self.peers.values():
+            t['acks'] += p.acks; t['retries'] += p.retries; t['avoided'] += p.avoided; t['fails'] += p.fails
+        return t
+
+    def load(self):
+        try:
+            d = load_json(ACK_RTT_FILE) or {}
+            self.peers = {str(k): PeerRtt.from_json(v) for k, v in d.items() if isinstance(v, dict)}
+        except Exception:
+            self.peers = {}
+        return self
+
+    def save(self):
+        try:
+            save_json(ACK_RTT_FILE, {k: p.to_json() for k, p in self.peers.items()})
+        except Exception:
+            pass
+
+class AckManager:
+    '''All outgoing messages awaiting [ACK:id]: O(1) lookup by id, retries on a shared
+    TimerWheel, a bounded record of finished ids, and events for subscribers:
+    fn(kind, state) with kind 'attempt', 'ack' or 'fail'.'''
+
+    def __init__(self, tick_ms: int = ACK_WHEEL_TICK_MS, keep_done: int = ACK_KEEP_DONE):
+        self.wheel = TimerWheel(tick_ms / 1000.0)
+        self.rtt = None               # optional PeerRttTable for adaptive timeouts
+        self.states = {}              # ack_id -> AckState (in flight only)
+        self.done = OrderedDict()     # ack_id -> 'ack' | 'fail' (oldest first)
+        self.keep_done = int(keep_done)
+        self._subs = []
+        self._timer = QTimer()
+        self._timer.setInterval(int(tick_ms))
+        self._timer.timeout.connect(self._tick)
+
+    def subscribe(self, fn):
+        if fn not in self._subs:
+            self._subs.append(fn)
+
+    def unsubscribe(self, fn):
+        try: self._subs.remove(fn)
+        except ValueError: pass
+
+    def _emit(self, kind, st):
+        for fn in list(self._subs):
+            try:
+                fn(kind, st)
+            except Exception as e:
+                diag_log(f"AckManager subscriber failed: {e}")
+
+    # ---- queries ----
+    def get(self, ack_id: str):
+        return self.states.get((ack_id or '').upper())
+
+    def status(self, ack_id: str):
+        '''"pending", "ack", "fail" or None if unknown (or long forgotten).'''
+        aid = (ack_id or '').upper()
+        if aid in self.states:
+            return 'pending'
+        return self.done.get(aid)
+
+    def __len__(self):
+        return len(self.states)
+
+    # ---- lifecycle ----
+    def start(self, st):
+        self.states[st.ack_id] = st
+        self.done.pop(st.ack_id, None)
+        st.mgr = self
+        st._send_attempt()
+        return st
+
+    def ack(self, ack_id: str) -> bool:
+        st = self.get(ack_id)
+        if st is None:
+            return False
+        st.on_ack_received()
+        return True
+
+    def cancel(self, ack_id: str):
+        aid = (ack_id or '').upper()
+        self.wheel.cancel(aid)
+        self.states.pop(aid, None)
+
+    def cancel_all(self):
+        for aid in list(self.states):
+            self.cancel(aid)
+        self._timer.stop()
+
+    def _arm(self, st, delay_s: float):
+        self.wheel.schedule(st.ack_id, delay_s, self._on_due)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def _on_due(self, ack_id):
+        st = self.states.get(ack_id)
+        if st is not None:
+            st._on_retry()
+
+    def _finish(self, st, kind: str):
+        self.wheel.cancel(st.ack_id)
+        self.states.pop(st.ack_id, None)
+        self.done[st.ack_id] = kind
+        while len(self.done) > self.keep_done:
+            self.done.popitem(last=False)
+        self._emit(kind, st)
+
+    def _tick(self):
+        self.wheel.advance()
+        if not len(self.wheel):
+            self._timer.stop()
+
 class AckState:
-    def __init__(self, app, ack_id: str, base_text: str, pause_s: int):
-        from PyQt5.QtCore import QTimer
+    '''One outgoing message awaiting its ACK; retries are scheduled on the AckManager wheel.'''
+
+    def __init__(self, app, ack_id: str, base_text: str, pause_s: int, target: str = ''):
         self.app = app
-        self.ack_id = ack_id
+        self.mgr = None
+        self.ack_id = (ack_id or '').upper()
         self.base_text = base_text
+        self.target = (target or '').strip().upper()
         self.pause_s = max(1, int(pause_s))
         self.max_attempts = 3
         self.attempts = 0
         self.done = False
-        self.timer = QTimer()
-        self.timer.setSingleShot(True)
-        self.timer.timeout.connect(self._on_retry)
+        self.last_line = ''
+        self.first_tx_time = None
+        self.last_tx_time = None
         self.echo_texts = set()
+        self.frags = None          # (header, [(k, text)]) for a fragmented message, False if not
+        self.need = None           # fragments the receiver asked for (next attempt sends only these)
+        self.sent_frames = 1
+        self.wire_text = None      # base_text as sent: the message may be compressed for the target
 
     def start(self):
+        mgr = self.mgr or self.app._ack_manager()
+        mgr.start(self)
+
+    def _wire(self) -> str:
+        if self.wire_text is None:
+            try:
+                self.wire_text = self.app._chat_z_wire(self.base_text, self.target)
+            except Exception:
+                self.wire_text = self.base_text
+        return self.wire_text
+
+    def _fragments(self):
+        '''(header, [(k, text)]) when the message is longer than the chat MTU, else None.'''
+        if self.frags is None:
+            self.frags = False
+            m = re.match(r'^\s*(\S+\s+DE\s+\S+)\s+(.*?)\s*\[ACK:[0-9A-Z]+\]\s*$', self._wire(), re.I)
+            try:
+                mtu = self.app._chat_mtu()
+            except Exception:
+                mtu = 0
+            if m and mtu and len(m.group(2)) > mtu and self.app._chat_frag_ok(self.target):
+                self.frags = (m.group(1), list(enumerate(chat_fragments(m.group(2), mtu), 1)))
+        return self.frags or None
+
+    def on_need(self, parts):
+        '''The receiver is missing these fragments: resend them now if attempts remain.'''
+        if self.done or not self._fragments() or self.attempts >= self.max_attempts:
+            return
+        self.need = set(parts)
         self._send_attempt()
 
+    def on_plain(self):
+        '''The receiver could not expand the compressed text: go back to plain text.'''
+        if self.done or self._wire() == self.base_text:
+            return
+        self.wire_text = self.base_text
+        self.frags = None; self.need = None
+        if self.attempts < self.max_attempts:
+            self._send_attempt()
+
+    def _send_frags(self) -> bool:
+        hdr, frags = self._fragments()
+        n = len(frags)
+        todo = [f for f in frags if f[0] in self.need] if self.need else frags
+        self.need = None
+        try:
+            self.app._pending_outbox[self.ack_id] = {'target': self.target, 'ts': time.time()}
+        except Exception:
+            pass
+        ok = True
+        for k, text in todo:
+            frame = f"{hdr} [FRG:{self.ack_id} {k}/{n} {chat_frag_crc(text)}] {text}"
+            ok = self.app.send_user_text(frame) and ok
+            self.echo_texts.add(self._norm(frame))
+        self.sent_frames = len(todo)
+        return ok
+
     def _send_attempt(self):
         if self.done: return
         self.attempts += 1
-        line = f"{self.base_text} (attempt {self.attempts}/3)"
-        if self.app.send_user_text(line):
+        if self.attempts == self.max_attempts and self.wire_text != self.base_text and not self._fragments():
+            self.wire_text = self.base_text    # last try in plain text, in case the peer cannot expand it
+            self.frags = None
+        suffix = f" (attempt {self.attempts}/{self.max_attempts})"
+        line = self._wire() + suffix
+        if (self._send_frags() if self._fragments() else self.app.send_user_text(line)):
             self.echo_texts.add(self._norm(line))
-            import time
             self.last_tx_time = time.monotonic()
-            self.app._ack_update_ui(self.ack_id, line, status=f"attempt {self.attempts}/3")
-            import random
-            delay = self.pause_s + random.uniform(0.2, 0.7)
-            self.timer.start(int(delay*1000))
+            if self.first_tx_time is None:
+                self.first_tx_time = self.last_tx_time
+            self.last_line = self.base_text + suffix    # Messages shows the plain text
+            rtt = self.mgr.rtt
+            if rtt is not None and self.target:
+                if self.attempts > 1:
+                    rtt.note_retry(self.target)
+                base = rtt.retry_delay(self.target, self.attempts, self.pause_s)
+            else:
+                base = self.pause_s
+            delay = base + random.uniform(0.2, 0.7)
+            if self.sent_frames > 1:
+                try:   # the reply cannot start before the last fragment is on the air
+                    delay += (self.sent_frames - 1) * self.app._file_frame_s()
+                except Exception:
+                    pass
+            self.mgr._arm(self, delay)
             self.app._diag(f"[ACK] arming retry in {delay:.2f}s for {self.ack_id}")
+            self.mgr._emit('attempt', self)
         else:
             try:
-                self.app._diag(f"[ACK] send failed on attempt {self.attempts}/3 (serial closed?)")
+                self.app._diag(f"[ACK] send failed on attempt {self.attempts}/{self.max_attempts} (serial closed?)")
             except Exception:
                 pass
-            self.timer.start(1000)
+            self.mgr._arm(self, 1.0)
 
     def _on_retry(self):
         if self.done: return
         if self.attempts < self.max_attempts:
-            self.app._diag(f"[RETRY] {self.ack_id} {self.attempts+1}/3")
+            self.app._diag(f"[RETRY] {self.ack_id} {self.attempts+1}/{self.max_attempts}")
             self._send_attempt()
         else:
             self.done = True
-            text = f"{self.base_text} (FAILED after 3/3)"
-            self.app._ack_update_ui(self.ack_id, text, status="failed")
-            self.app._diag(f"[ACK] giving up {self.ack_id} after 3/3")
+            self.app._diag(f"[ACK] giving up {self.ack_id} after {self.attempts}/{self.max_attempts}")
+            if self.mgr.rtt is not None and self.target:
+                self.mgr.rtt.note_fail(self.target)
+            self.mgr._finish(self, 'fail')
 
     def on_ack_received(self):
         if self.done: return
         self.done = True
-        self.timer.stop()
-        text = f"{self.base_text} (ACK received {self.ack_id})"
-        self.app._ack_update_ui(self.ack_id, text, status="ack")
+        if self.mgr is not None:
+            if self.mgr.rtt is not None and self.target and self.first_tx_time is not None:
+                self.mgr.rtt.note_ack(self.target, self.attempts, time.monotonic() - self.first_tx_time,
+                                      self.pause_s + 0.45)
+            self.mgr._finish(self, 'ack')
+        try:
+            self.app._chat_z_acked(self)
+        except Exception:
+            pass
 
     def _norm(self, s: str) -> str:
         return re.sub(r"[\r\n]+", "", s).strip()
 
+# --------- Chat message fragmentation ---------
+# A message whose text is longer than the chat_mtu setting goes out as numbered fragments,
+# "TO DE FROM [FRG:<ack id> k/n <crc16>] text", each short enough to survive an HF frame on
+# its own. The receiver checks each CRC (CRC-CCITT of the fragment text), keeps the good ones
+# and, once the fragments stop coming, asks for the rest: "FROM DE TO [FRG:<ack id> NEED 2,5-6]".
+# The sender's AckState resends just those. A whole message is shown as one line and ACKed
+# with the usual [ACK:<id>], so retries, the outbox and the tick marks work unchanged.
+# Only peers heard with a [Z0]/[Z1] capability tag on their ACK replies (see Chat text
+# compression) reassemble fragments; everyone else gets the message as one line.
+import binascii
+CHAT_MTU_DEFAULT = 120          # characters of message text per frame; 0 = never fragment
+CHAT_FRAG_QUIET_MS = 3000       # receiver: ask for missing fragments after this much silence
+CHAT_FRAG_TTL_S = 600           # receiver: unfinished messages are dropped after this
+CHAT_FRAG_KEEP_DONE = 64        # receiver: finished messages remembered (repeats are ACKed again)
+CHAT_FRAG_RE = re.compile(r'^\[FRG:([0-9A-Z]{2,12}) (\d{1,3})/(\d{1,3}) ([0-9A-F]{4})\] ?(.*)$', re.I)
+CHAT_FRAG_NEED_RE = re.compile(r'^\[FRG:([0-9A-Z]{2,12}) NEED ([0-9,\-]+)\]$', re.I)
+
+def chat_frag_crc(text: str) -> str:
+    return f"{binascii.crc_hqx(text.encode('utf-8'), 0xFFFF):04X}"
+
+def chat_fragments(text: str, mtu: int):
+    '''Split text into pieces of at most mtu characters, at a space where there is one.'''
+    out = []
+    while len(text) > mtu:
+        cut = text.rfind(' ', mtu // 2, mtu + 1)
+        if cut <= 0:
+            cut = mtu
+        out.append(text[:cut]); text = text[cut:]
+    out.append(text)
+    return out
+
+class ChatFragments:
+    '''Receiver: fragments of long messages, by (sender, ack id), until each is whole.'''
+
+    def __init__(self, ttl_s: float = CHAT_FRAG_TTL_S, keep_done: int = CHAT_FRAG_KEEP_DONE):
+        self.ttl_s = ttl_s
+        self.keep_done = keep_done
+        self.msgs = {}              # (frm, id) -> {"n", "parts": {k: text}, "t"}
+        self.done = OrderedDict()   # (frm, id) -> None, most recent last
+
+    def add(self, frm: str, mid: str, k: int, n: int, crc: str, text: str, now: float = None) -> bool:
+        '''Keep fragment k of n if its CRC matches; False if it was damaged.'''
+        key = (frm, mid)
+        if key in self.done or not 1 <= k <= n:
+            return key in self.done
+        if chat_frag_crc(text) != crc.upper():
+            return False
+        m = self.msgs.get(key)
+        if m is None or m["n"] != n:
+            m = self.msgs[key] = {"n": n, "parts": {}, "t": 0.0}
+        m["parts"][k] = text
+        m["t"] = time.time() if now is None else now
+        return True
+
+    def missing(self, frm: str, mid: str):
+        m = self.msgs.get((frm, mid))
+        return [] if m is None else [k for k in range(1, m["n"] + 1) if k not in m["parts"]]
+
+    def is_done(self, frm: str, mid: str) -> bool:
+        return (frm, mid) in self.done
+
+    def complete(self, frm: str, mid: str):
+        '''The whole text once every fragment is in (and the message is then marked done), else None.'''
+        key = (frm, mid)
+        m = self.msgs.get(key)
+        if m is None or len(m["parts"]) < m["n"]:
+            return None
+        del self.msgs[key]
+        self.done[key] = None
+        while len(self.done) > self.keep_done:
+            self.done.popitem(last=False)
+        return ''.join(m["parts"][k] for k in range(1, m["n"] + 1))
+
+    def expire(self, now: float = None):
+        now = time.time() if now is None else now
+        for key in [k for k, m in self.msgs.items() if now - m["t"] > self.ttl_s]:
+            del self.msgs[key]
+
+# --------- Chat text compression ---------
+# Message text to a peer that supports it goes on air as "~Z1<dict id><basE91>", raw deflate
+# against a preset dictionary both ends rebuild: ham phrases and Q-codes (CHAT_ZDICT), the
+# active fleet's callsigns when both stations are in it, the last few messages this receiver
+# has ACKed from the sender, and the two callsigns. The dict id (CRC-CCITT of the dictionary)
+# lets a receiver whose fleet list or history differs try its variants; if none fits it answers
+# "[ZNAK:<ack id>]" and the sender resends plain text and keeps to the static part for that
+# peer. Support is announced by a [Z1] tag after our ACK replies ([Z0] with chat_compress off:
+# fragments are reassembled but text is not expanded); peers never heard with it get plain
+# text, and a compressed frame is only sent when it is shorter.
+import zlib
+CHAT_Z_TAG = '[Z1]'
+CHAT_Z_TAG_OFF = '[Z0]'
+CHAT_Z_MARK = '~Z1'
+CHAT_Z_HISTORY = 3              # recent messages (per peer and direction) in the dictionary
+CHAT_Z_MIN_SAVE = 4             # characters a compressed frame must save over the plain text
+CHAT_Z_FILE = 'chat_codec.json'
+CHAT_Z_RE = re.compile(r'^~Z1(\S{3})(\S+)$')
+CHAT_Z_NAK_RE = re.compile(r'^\[ZNAK:([0-9A-Z]{2,12})\]$', re.I)
+CHAT_Z_CAP_RE = re.compile(r'^(?:ACK[:\s]+[0-9A-Z]{4,8}|\[ACK:[0-9A-Z]{2,12}\])\s+\[Z(\d)\]\s*$', re.I)
+CHAT_Z_BODY_RE = re.compile(r'^(.*?)\s*\[ACK:([0-9A-Z]{2,12})\](?:\s*\(attempt \d+/\d+\))?\s*$', re.I)
+# Dictionary v1: deflate finds the closest matches cheapest, so the commonest strings come last.
+# Changing it is a protocol change (bump the 1 in CHAT_Z_TAG/CHAT_Z_MARK).
+CHAT_ZDICT = (
+    "antenna analyzer  dipole  vertical  beam  tuner  SWR  coax  battery  solar  generator  "
+    "frequency  propagation  the band is open  the band is dead  grey line  skip  noise  "
+    "emergency  traffic  net control  check in  checking in  all stations  stand by  "
+    "please repeat  say again  roger that  copy that  negative  affirmative  over  out  "
+    "weather here is  sunny  rain  snow  wind  cold  warm  temp  "
+    "my name is  location  grid square  on the way  arrived  leaving  home  "
+    "meeting  repeater  tomorrow  tonight  today  morning  evening  local  UTC  "
+    "thanks for the contact  see you later  good morning  good evening  how copy?  "
+    "Thanks  Good morning  Please  Roger  Copy  Yes  No  OK  "
+    "the  you  and  for  with  have  will  this  that  are  here  there  what  when  "
+    "QRL? QRM QRN QRO QRP QRQ QRS QRT QRU QRV QRX QRZ? QSB QSK QSO QSP QSY QTC QTR QSL? "
+    "BURO LOTW eQSL QSL VIA  DX  NR  ANT  PWR  RIG  WX HR  HR  "
+    "UR RST 599 5NN 579 559 57 59  UR SIG  RPT  "
+    "CQ CQ CQ DE  K  KN  SK  BK  AR  PSE K  R R  RR  HI HI  CUL  "
+    "GM GA GE GN  OM  YL  XYL  OP  NAME  QTH IS  FB OM  GUD  CPY  HW?  HW CPY?  "
+    "PSE QSL  TNX FER QSO  TNX FER CALL  TNX ES 73  GL ES 73  73  "
+)
+
+def chat_z_dict(calls, fleet=(), history=()) -> bytes:
+    '''Preset dictionary: the static phrases, then fleet callsigns, history and the two calls.'''
+    parts = [CHAT_ZDICT]
+    if fleet:
+        parts.append(' '.join(sorted(fleet)))
+    parts.extend(history)
+    parts.append(' '.join(calls))
+    return ' '.join(parts).encode('utf-8')[-32768:]
+
+def chat_z_id(zdict: bytes) -> str:
+    return _b91_encode(binascii.crc_hqx(zdict, 0xFFFF).to_bytes(2, 'big'))
+
+def chat_z_eligible(text: str) -> bool:
+    '''Tagged text ([ENC], [RLY:..], ...) and FILE frames stay readable on the wire.'''
+    return bool(text) and '[' not in text and not text.startswith(('FILE ', '~Z'))
+
+def chat_z_pack(text: str, zdict: bytes):
+    '''"~Z1<id><payload>" if that saves at least CHAT_Z_MIN_SAVE characters, else None.'''
+    raw = text.encode('utf-8')
+    c = zlib.compressobj(9, zlib.DEFLATED, -15, 9, zlib.Z_DEFAULT_STRATEGY, zdict)
+    z = CHAT_Z_MARK + chat_z_id(zdict) + _b91_encode(c.compress(raw) + c.flush())
+    return z if len(z) + CHAT_Z_MIN_SAVE <= len(raw) else None
+
+def chat_z_unpack(frame: str, zdicts):
+    '''The text of a "~Z1..." frame, using whichever candidate dictionary it names; None if none fits.'''
+    m = CHAT_Z_RE.match(frame or '')
+    if not m:
+        return None
+    for zd in zdicts:
+        if chat_z_id(zd) != m.group(1):
+            continue
+        try:
+            d = zlib.decompressobj(-15, zdict=zd)
+            out = d.decompress(_b91_decode(m.group(2)), 8192)
+            if d.eof:
+                return out.decode('utf-8')
+        except Exception:
+            continue
+    return None
+
+class ChatCodecPeers:
+    '''Which peers take compressed text (and fragments), and the recent messages each
+    direction's dictionary uses.'''
+
+    def __init__(self, history: int = CHAT_Z_HISTORY):
+        self.history = history
+        self.peers = {}     # call -> {"z": 0 or 1, "lite": bool, "t": epoch}
+        self.sent = {}      # call -> [[ack id, text]] our messages that call has ACKed, oldest first
+        self.heard = {}     # call -> [[ack id, text]] messages from call to us, oldest first
+
+    def supports(self, call: str) -> bool:
+        return bool(self.peers.get(base_callsign(call), {}).get('z'))
+
+    def reassembles(self, call: str) -> bool:
+        '''The peer has sent a capability tag, so it puts [FRG:] fragments back together.'''
+        return 'z' in self.peers.get(base_callsign(call), {})
+
+    def note_support(self, call: str, level: int = 1) -> bool:
+        '''True when this is news (the caller saves).'''
+        p = self.peers.setdefault(base_callsign(call), {})
+        new = p.get('z') != level
+        p['z'] = level; p['t'] = int(time.time())
+        return new
+
+    def note_lite(self, call: str):
+        '''The peer could not rebuild our full dictionary: static phrases and callsigns only.'''
+        self.peers.setdefault(base_callsign(call), {})['lite'] = True
+
+    def _remember(self, book: dict, call: str, mid: str, text: str) -> bool:
+        if not chat_z_eligible(text):
+            return False
+        rows = book.setdefault(base_callsign(call), [])
+        if any(r[0] == mid for r in rows):
+            return False
+        rows.append([mid, text])
+        del rows[:-(self.history + 2)]   # the receiver keeps two spare to match a lagging sender
+        return True
+
+    def note_sent(self, call: str, mid: str, text: str) -> bool:
+        return self._remember(self.sent, call, mid, text)
+
+    def note_heard(self, call: str, mid: str, text: str) -> bool:
+        return self._remember(self.heard, call, mid, text)
+
+    def pack(self, me: str, call: str, text: str, fleet=()):
+        '''Compressed frame for text from me to call, or None (no support, or not worth it).'''
+        call = base_callsign(call)
+        if not self.supports(call) or not chat_z_eligible(text):
+            return None
+        calls = (base_callsign(me), call)
+        if self.peers[call].get('lite'):
+            return chat_z_pack(text, chat_z_dict(calls))
+        hist = [t for _, t in self.sent.get(call, [])[-self.history:]]
+        return chat_z_pack(text, chat_z_dict(calls, fleet, hist))
+
+    def unpack(self, frm: str, me: str, mid: str, frame: str, fleet=()):
+        '''Expand a frame from frm. The sender may lack one or two of the messages we ACKed
+        (the ACK was lost), so the history is also tried without them.'''
+        from itertools import combinations
+        calls = (base_callsign(frm), base_callsign(me))
+        hist = [t for i, t in self.heard.get(base_callsign(frm), []) if i != mid][-(self.history + 2):]
+        cands = []
+        for fl in ((fleet, ()) if fleet else ((),)):
+            for r in range(min(2, len(hist)) + 1):
+                for drop in combinations(range(len(hist)), r):
+                    zd = chat_z_dict(calls, fl, [t for k, t in enumerate(hist) if k not in drop][-self.history:])
+                    if zd not in cands:
+                        cands.append(zd)
+        zd = chat_z_dict(calls)
+        if zd not in cands:
+            cands.append(zd)
+        return chat_z_unpack(frame, cands)
+
+    def load(self):
+        try:
+            d = load_json(CHAT_Z_FILE) or {}
+            self.peers = {str(k): v for k, v in (d.get('peers') or {}).items() if isinstance(v, dict)}
+            self.sent = {str(k): list(v) for k, v in (d.get('sent') or {}).items() if isinstance(v, list)}
+            self.heard = {str(k): list(v) for k, v in (d.get('heard') or {}).items() if isinstance(v, list)}
+        except Exception:
+            self.peers, self.sent, self.heard = {}, {}, {}
+        return self
+
+    def save(self):
+        try:
+            save_json(CHAT_Z_FILE, {'peers': self.peers, 'sent': self.sent, 'heard': self.heard})
+        except Exception:
+            pass
+
+def chat_codec_benchmark(entries, history: int = CHAT_Z_HISTORY):
+    '''Characters on air for the chat lines in messages_v1.json entries: plain, zlib alone, the
+    static dictionary (+ callsigns) and the full one with each direction's earlier messages as
+    history (as if every one was ACKed). A message is only counted compressed where that is shorter.'''
+    modes = ('plain', 'zlib', 'static', 'history')
+    tot = {k: 0 for k in modes}
+    text_tot = {k: 0 for k in modes}
+    hist = {}; seen = set(); n = packed = 0
+    for e in entries:
+        line = e if isinstance(e, str) else str((e or {}).get('line') or (e or {}).get('text') or '')
+        m = OUTBOX_CHAT_RE.match(line.strip())
+        if not m:
+            continue
+        to, frm, rest = base_callsign(m.group(1).upper()), base_callsign(m.group(2).upper()), m.group(3)
+        mb = CHAT_Z_BODY_RE.match(rest)
+        body, mid = (mb.group(1), mb.group(2).upper()) if mb else (re.sub(r'\s*\(attempt \d+/\d+\)\s*$', '', rest), None)
+        if mid and (frm, to, mid) in seen:
+            continue      # the same message persisted again (retry, status update)
+        seen.add((frm, to, mid))
+        if not chat_z_eligible(body):
+            continue
+        h = hist.setdefault((frm, to), [])
+        cost = {'plain': len(body.encode('utf-8'))}
+        frame = len(line.strip().encode('utf-8')) - cost['plain']     # header, [ACK:..] and attempt
+        for k, zd in (('zlib', b''), ('static', chat_z_dict((frm, to))),
+                      ('history', chat_z_dict((frm, to), (), h[-history:]))):
+            z = chat_z_pack(body, zd)
+            cost[k] = len(z) if z else cost['plain']
+        for k in modes:
+            text_tot[k] += cost[k]; tot[k] += frame + cost[k]
+        n += 1; packed += cost['history'] < cost['plain']
+        h.append(body)
+    return {'messages': n, 'compressed': packed, 'text': text_tot, 'line': tot}
+
+def _chat_codec_bench_main(argv):
+    '''python Robust_Chat_v1.6.py --bench-chat-codec [messages_v1.json...] [--baud N]'''
+    baud = 300
+    if '--baud' in argv:
+        i = argv.index('--baud'); baud = int(argv[i + 1]); argv = argv[:i] + argv[i + 2:]
+    for p in argv or [store_path('messages_v1.json')]:
+        with open(p, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        msgs = data.get('messages', []) if isinstance(data, dict) else data
+        r = chat_codec_benchmark(msgs)
+        pt, pl = r['text']['plain'], r['line']['plain']
+        print(f"{os.path.basename(p)}: {r['messages']} chat messages, {pt} chars of text, "
+              f"{pl} chars on air ({pl * 10.0 / baud:.1f}s @ {baud} bd); {r['compressed']} worth compressing")
+        for k in ('zlib', 'static', 'history'):
+            t, l = r['text'][k], r['line'][k]
+            print(f"    {k:<8} text {t:>7}  saves {pt - t:>6} ({100.0 * (1 - t / float(pt or 1)):5.1f}%)   "
+                  f"on air {l:>7}  saves {pl - l:>6} ({100.0 * (1 - l / float(pl or 1)):5.1f}%)")
+
+# --------- Durable outbox (store-and-forward for unacknowledged messages) ---------
+OUTBOX_FILE = 'outbox.jsonl'
+OUTBOX_MAX_PER_DEST = 20
+OUTBOX_MAX_TOTAL = 200
+OUTBOX_MAX_AGE_SEC = 24 * 3600
+OUTBOX_CHAT_RE = re.compile(r'^\s*([A-Z0-9/\-]+)\s+DE\s+([A-Z0-9/\-]+)\s*(.*)$', re.I)
+OUTBOX_ACK_REPLY_RE = re.compile(r'^(?:ACK[:\s]+([0-9A-Z]{4,8})|\[ACK:([0-9A-Z]{4,10})\])(?:\s+\[Z\d\])?\s*$', re.I)
+
+class DurableOutbox:
+    '''Unacknowledged messages per destination, journaled to store/outbox.jsonl.
+
+    Each change appends one JSON line ({"op": "add"|"ack"|"hold"|"drop", "id": ...});
+    load() replays the journal and compact() rewrites it when it gets long. Entries
+    are 'inflight' (an AckState is running) or 'held' (waiting for the peer to be heard).
+    '''
+
+    def __init__(self, path: str = None):
+        self.path = path or store_path(OUTBOX_FILE)
+        self.by_dest = {}      # dest -> OrderedDict(id -> entry), oldest first
+        self.index = {}        # id -> dest
+        self._journal_lines = 0
+
+    # ---- queries ----
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, ack_id):
+        return ack_id in self.index
+
+    def get(self, ack_id):
+        d = self.index.get(ack_id)
+        return self.by_dest[d].get(ack_id) if d else None
+
+    def pending(self, dest: str):
+        q = self.by_dest.get(dest)
+        return list(q.values()) if q else []
+
+    def inflight(self, dest: str) -> bool:
+        return any(e['state'] == 'inflight' for e in self.by_dest.get(dest, {}).values())
+
+    def next_held(self, dest: str):
+        for e in self.by_dest.get(dest, {}).values():
+            if e['state'] == 'held':
+                return e
+        return None
+
+    # ---- journal ----
+    def _append(self, rec):
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(rec, separators=(',', ':')) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_lines += 1
+        except Exception as e:
+            diag_log(f"outbox journal write failed: {e}")
+        if self._journal_lines > 4 * len(self.index) + 100:
+            self.compact()
+
+    def _apply(self, rec):
+        op = rec.get('op'); aid = rec.get('id')
+        if not aid:
+            return None
+        if op == 'add':
+            dest = rec.get('to') or ''
+            q = self.by_dest.setdefault(dest, OrderedDict())
+            q[aid] = {'id': aid, 'to': dest, 'line': rec.get('line') or '', 'ts': int(rec.get('ts') or 0),
+                      'state': rec.get('state') or 'inflight', 'tries': int(rec.get('tries') or 0)}
+            self.index[aid] = dest
+            return q[aid]
+        e = self.get(aid)
+        if e is None:
+            return None
+        if op == 'hold':
+            e['state'] = 'held'; e['tries'] = e.get('tries', 0) + 1
+        elif op == 'send':
+            e['state'] = 'inflight'
+        elif op in ('ack', 'drop'):
+            dest = self.index.pop(aid)
+            q = self.by_dest[dest]; q.pop(aid, None)
+            if not q:
+                self.by_dest.pop(dest, None)
+        return e
+
+    def load(self):
+        self.by_dest = {}; self.index = {}; self._journal_lines = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for ln in f:
+                    self._journal_lines += 1
+                    try:
+                        self._apply(json.loads(ln))
+                    except Exception:
+                        continue   # torn last line after a crash
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            diag_log(f"outbox load failed: {e}")
+        # nothing is in flight after a restart: everything waits to be released again
+        for q in self.by_dest.values():
+            for e in q.values():
+                e['state'] = 'held'
+        self.expire()
+        self.compact()
+        return self
+
+    def compact(self):
+        '''Rewrite the journal as one 'add' per live entry (atomic replace).'''
+        try:
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for q in self.by_dest.values():
+                    for e in q.values():
+                        f.write(json.dumps(dict(e, op='add'), separators=(',', ':')) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._journal_lines = len(self.index)
+        except Exception as e:
+            diag_log(f"outbox compact failed: {e}")
+
+    # ---- mutation ----
+    def add(self, ack_id: str, dest: str, line: str, ts: int = None):
+        '''Track a new outgoing message; oldest entries for dest (or overall) are dropped past the limits.'''
+        if not ack_id or not dest or ack_id in self.index:
+            return None
+        rec = {'op': 'add', 'id': ack_id, 'to': dest, 'line': line, 'ts': int(ts or time.time()),
+               'state': 'inflight', 'tries': 0}
+        self._append(rec)
+        e = self._apply(rec)
+        q = self.by_dest[dest]
+        while len(q) > OUTBOX_MAX_PER_DEST:
+            self.drop(next(iter(q)))
+        while len(self.index) > OUTBOX_MAX_TOTAL:
+            oldest = min((next(iter(q2.values())) for q2 in self.by_dest.values()), key=lambda x: x['ts'])
+            self.drop(oldest['id'])
+        return e
+
+    def _op(self, op, ack_id):
+        if ack_id in self.index:
+            rec = {'op': op, 'id': ack_id}
+            self._append(rec)
+            return self._apply(rec)
+        return None
+
+    def ack(self, ack_id):
+        return self._op('ack', ack_id)
+
+    def hold(self, ack_id):
+        return self._op('hold', ack_id)
+
+    def mark_sent(self, ack_id):
+        return self._op('send', ack_id)
+
+    def drop(self, ack_id):
+        return self._op('drop', ack_id)
+
+    def expire(self, now: float = None) -> int:
+        cutoff = (now or time.time()) - OUTBOX_MAX_AGE_SEC
+        old = [e['id'] for q in self.by_dest.values() for e in q.values() if e['ts'] < cutoff]
+        for aid in old:
+            self.drop(aid)
+        return len(old)
+
+# --------- Per-peer sequence numbers (ack ids / file ids) ---------
+# Id = _to_base36(seq, 4) + 2-char tag of the receiving call, e.g. "002K7Q". The tag keeps
+# our ids to different peers apart and lets a receiver tell sequence ids from legacy
+# random 4-digit ones.
+SEQ_FILE = 'seq_state.json'
+SEQ_WIDTH = 4
+SEQ_WINDOW = 1024          # receive bitmap span; older gaps are written off
+
+def _seq_tag(call: str) -> str:
+    import zlib
+    return _to_base36(zlib.crc32(base_callsign((call or '').upper()).encode('ascii', 'ignore')) % 1296, 2)
+
+def seq_make_id(seq: int, to: str) -> str:
+    return _to_base36(int(seq) % (36 ** SEQ_WIDTH), SEQ_WIDTH) + _seq_tag(to)
+
+def seq_parse_id(ack_id: str, mycall: str):
+    '''Sequence number from an id addressed to mycall, or None (legacy/other format).'''
+    aid = (ack_id or '').upper()
+    if len(aid) != SEQ_WIDTH + 2 or aid[SEQ_WIDTH:] != _seq_tag(mycall):
+        return None
+    try:
+        return int(aid[:SEQ_WIDTH], 36)
+    except ValueError:
+        return None
+
+class SeqWindow:
+    '''Receive state for one peer: everything <= base has arrived; bit i of bits
+    means base+1+i arrived. accept() is O(1) amortized.'''
+    __slots__ = ('base', 'hi', 'bits')
+
+    def __init__(self, base: int = 0, hi: int = 0, bits: int = 0):
+        self.base = int(base); self.hi = max(int(hi), self.base); self.bits = int(bits)
+
+    def accept(self, seq: int):
+        '''("new"|"dup"|"reset", newly detected gap size).'''
+        seq = int(seq)
+        if seq < self.base - SEQ_WINDOW:
+            # far behind: the sender lost its counter; start over from here
+            self.base, self.hi, self.bits = seq, seq, 0
+            return 'reset', 0
+        if seq <= self.base:
+            return 'dup', 0
+        off = seq - self.base - 1
+        if (self.bits >> off) & 1:
+            return 'dup', 0
+        gap = max(0, seq - self.hi - 1)
+        self.bits |= (1 << off)
+        self.hi = max(self.hi, seq)
+        # slide: consume contiguous arrivals; write off anything older than the window
+        while self.bits & 1:
+            self.bits >>= 1; self.base += 1
+        if self.hi - self.base > SEQ_WINDOW:
+            shift = self.hi - self.base - SEQ_WINDOW
+            self.bits >>= shift; self.base += shift
+            while self.bits & 1:
+                self.bits >>= 1; self.base += 1
+        return 'new', gap
+
+    def missing(self, limit: int = 32):
+        '''Sequence numbers between base and hi that have not arrived (oldest first).'''
+        out = []
+        for s in range(self.base + 1, self.hi):
+            if not (self.bits >> (s - self.base - 1)) & 1:
+                out.append(s)
+                if len(out) >= limit:
+                    break
+        return out
+
+    def cumulative(self) -> int:
+        return self.base
+
+    def to_json(self):
+        return [self.base, self.hi, format(self.bits, 'x')]
+
+    @classmethod
+    def from_json(cls, v):
+        return cls(v[0], v[1], int(v[2] or '0', 16))
+
+class SeqSpace:
+    '''Persistent per-peer counters: tx[peer] = last seq sent, rx[peer] = SeqWindow.'''
+
+    def __init__(self):
+        self.tx = {}
+        self.rx = {}
+
+    def next(self, peer: str) -> int:
+        n = self.tx.get(peer, 0) + 1
+        self.tx[peer] = n
+        return n
+
+    def rx_accept(self, peer: str, seq: int):
+        w = self.rx.get(peer)
+        if w is None:
+            # first contact: history before now is not ours to report as missing
+            w = self.rx[peer] = SeqWindow(seq - 1, seq - 1)
+        return w.accept(seq)
+
+    def load(self):
+        try:
+            d = load_json(SEQ_FILE) or {}
+            self.tx = {str(k): int(v) for k, v in (d.get('tx') or {}).items()}
+            self.rx = {str(k): SeqWindow.from_json(v) for k, v in (d.get('rx') or {}).items()}
+        except Exception:
+            self.tx, self.rx = {}, {}
+        return self
+
+    def save(self):
+        try:
+            save_json(SEQ_FILE, {'tx': self.tx, 'rx': {k: w.to_json() for k, w in self.rx.items()}})
+        except Exception:
+            pass
+
+# --------- Windowed (selective-repeat) file transfer ---------
+# Sender META carries win=W; a receiver that understands it answers "FILE OK win=W".
+# Parts then go out W at a time without per-part [ACK]; the receiver answers each burst
+# with "FILE SACK <cum> <hex bitmap> [FID:x]": every part <= cum arrived, and bit k of
+# the bitmap means part cum+2+k arrived. Legacy peers keep the stop-and-wait path.
+FILE_WINDOW_DEFAULT = 8
+FILE_WINDOW_MAX = 64          # SACK bitmap width
+FILE_SACK_QUIET_MS = 1500     # receiver: SACK once the burst has gone quiet
+FILE_SACK_WAIT_S = 20         # sender: wait this long for a SACK before probing
+FILE_STALL_PROBES = 3         # PINGs without reply before giving up
+FILE_SACK_RE = re.compile(r'FILE SACK (\d+) ([0-9A-Fa-f]+)(?: got=(\d+))?\s+\[FID:([0-9A-Z]+)\]')
+FILE_WIN_RE = re.compile(r'\bwin=(\d+)')
+
+def file_sack_encode(have, n: int):
+    '''(cum, bitmap) for a receiver holding parts `have` (a set/dict of 1-based indices) of n.'''
+    cum = 0
+    while cum < n and (cum + 1) in have:
+        cum += 1
+    bits = 0
+    for k in range(FILE_WINDOW_MAX):
+        if cum + 2 + k > n:
+            break
+        if (cum + 2 + k) in have:
+            bits |= (1 << k)
+    return cum, bits
+
+class FileTxWindow:
+    '''Sender state for one windowed transfer of parts 1..n.'''
+
+    def __init__(self, n: int, win: int = FILE_WINDOW_DEFAULT):
+        self.n = int(n)
+        self.win = max(1, min(FILE_WINDOW_MAX, int(win)))
+        self.acked = bytearray(self.n + 1)
+        self.n_acked = 0
+        self.inflight = set()      # sent, not yet covered by a SACK
+        self.lost = []             # reported missing; resent before new parts
+        self.next_new = 1
+        self.sent = 0
+        self.resent = 0
+        self.loss = FILE_FEC_PRIOR     # EWMA of raw frame loss, from SACK got= counts
+        self.burst_frames = 0          # parts + parity frames in the last burst
+        self.round_s = None            # EWMA of burst end -> SACK, minus the burst's own airtime
+
+    def note_loss(self, sent: int, got: int):
+        if sent > 0:
+            p = 1.0 - min(got, sent) / float(sent)
+            self.loss += FILE_FEC_ALPHA * (p - self.loss)
+
+    @property
+    def done(self) -> bool:
+        return self.n_acked >= self.n
+
+    def next_burst(self, limit: int = None):
+        '''Part numbers to transmit now: missing ones first, then new ones, up to the window
+        (or limit).'''
+        out = []
+        cap = self.win if limit is None else min(self.win, len(self.inflight) + limit)
+        while self.lost and len(out) + len(self.inflight) < cap:
+            i = self.lost.pop(0)
+            if not self.acked[i] and i not in self.inflight:
+                out.append(i); self.resent += 1
+        while self.next_new <= self.n and len(out) + len(self.inflight) < cap:
+            out.append(self.next_new); self.next_new += 1
+        self.inflight.update(out)
+        self.sent += len(out)
+        return out
+
+    def on_sack(self, cum: int, bits: int) -> int:
+        '''Apply a SACK; in-flight parts it does not cover are treated as lost. Returns parts newly acked.'''
+        newly = 0
+        def mark(i):
+            nonlocal newly
+            if 1 <= i <= self.n and not self.acked[i]:
+                self.acked[i] = 1; self.n_acked += 1; newly += 1
+        for i in range(1, min(int(cum), self.n) + 1):
+            mark(i)
+        k = 0
+        while bits >> k:
+            if (bits >> k) & 1:
+                mark(cum + 2 + k)
+            k += 1
+        # half duplex: by the time a SACK is heard the burst is over, so the rest was lost
+        gone = sorted(i for i in self.inflight if not self.acked[i])
+        self.inflight.clear()
+        self.lost = sorted(set(self.lost) | set(gone))
+        return newly
+
+    def on_timeout(self):
+        '''No SACK: everything in flight is presumed lost.'''
+        self.lost = sorted(set(self.lost) | {i for i in self.inflight if not self.acked[i]})
+        self.inflight.clear()
+
+    def resume(self, missing):
+        '''The receiver reported (FILE NEED) exactly these parts missing; the rest is delivered.'''
+        miss = {i for i in missing if 1 <= i <= self.n}
+        for i in range(1, self.n + 1):
+            self.acked[i] = 0 if i in miss else 1
+        self.n_acked = self.n - len(miss)
+        self.inflight.clear()
+        self.lost = sorted(miss)
+        self.next_new = self.n + 1
+
+# --------- File payload compression + text encodings ---------
+import base64
+# The sender proposes cmp=/enc= in FILE META; a receiver that supports them echoes them in
+# FILE OK. Legacy receivers (plain OK) get uncompressed base64 as before. size/sha1 in META
+# always describe the original file.
+FILE_LINE_CHARS = 180          # encoded payload characters per FILE PART line
+FILE_LINE_OVERHEAD = 44        # "TO DE FROM FILE PART i/N [FID:xxxxxxx] " + CR, roughly
+# basE91 over printable ASCII minus '[', ']' and '"', so payloads never look like [ACK:..]/[FID:..] tags
+_B91_ALPHABET = ''.join(c for c in map(chr, range(33, 127)) if c not in '[]"')
+_B91_DECODE = {c: i for i, c in enumerate(_B91_ALPHABET)}
+
+def _b91_encode(data: bytes) -> str:
+    out = []; b = 0; n = 0
+    for byte in data:
+        b |= byte << n; n += 8
+        if n > 13:
+            v = b & 8191
+            if v > 88:
+                b >>= 13; n -= 13
+            else:
+                v = b & 16383; b >>= 14; n -= 14
+            out.append(_B91_ALPHABET[v % 91]); out.append(_B91_ALPHABET[v // 91])
+    if n:
+        out.append(_B91_ALPHABET[b % 91])
+        if n > 7 or b > 90:
+            out.append(_B91_ALPHABET[b // 91])
+    return ''.join(out)
+
+def _b91_decode(text: str) -> bytes:
+    out = bytearray(); v = -1; b = 0; n = 0
+    for c in text:
+        d = _B91_DECODE[c]
+        if v < 0:
+            v = d
+            continue
+        v += d * 91
+        b |= v << n
+        n += 13 if (v & 8191) > 88 else 14
+        while n > 7:
+            out.append(b & 255); b >>= 8; n -= 8
+        v = -1
+    if v >= 0:
+        out.append((b | v << n) & 255)
+    return bytes(out)
+
+# enc -> (encode, decode, raw bytes per FILE_LINE_CHARS)
+FILE_ENCODINGS = {
+    'b64': (lambda b: base64.b64encode(b).decode('ascii'), lambda s: base64.b64decode(s.encode('ascii'), validate=True),
+            FILE_LINE_CHARS * 3 // 4),
+    'b85': (lambda b: base64.b85encode(b).decode('ascii'), lambda s: base64.b85decode(s.encode('ascii')),
+            FILE_LINE_CHARS * 4 // 5),
+    'b91': (_b91_encode, _b91_decode, (FILE_LINE_CHARS // 2) * 13 // 8),
+}
+
+def file_compress(data: bytes, methods=('zlib', 'lzma')):
+    '''(cmp, payload): the smallest of raw/zlib/lzma; compression must save at least 5%.'''
+    import zlib, lzma
+    best = ('none', data)
+    for m in methods:
+        try:
+            c = zlib.compress(data, 9) if m == 'zlib' else lzma.compress(data, preset=6)
+        except Exception:
+            continue
+        if len(c) < len(best[1]) and len(c) <= 0.95 * len(data):
+            best = (m, c)
+    return best
+
+class _NullDecompressor:
+    def decompress(self, data: bytes) -> bytes:
+        return data
+
+def file_decompressor(cmp: str):
+    '''Streaming decompressor for a cmp= value (zlib.decompressobj / LZMADecompressor).'''
+    import zlib, lzma
+    if cmp == 'zlib':
+        return zlib.decompressobj()
+    if cmp == 'lzma':
+        return lzma.LZMADecompressor()
+    return _NullDecompressor()
+
+def file_encode_parts(payload: bytes, enc: str = 'b64'):
+    '''Split payload into per-line chunks and encode each: list of strings.'''
+    encode, _, raw = FILE_ENCODINGS[enc]
+    return [encode(payload[i:i + raw]) for i in range(0, len(payload), raw)] or [encode(b'')]
+
+def file_offer_chunk(meta: dict) -> int:
+    '''Raw bytes per part of an accepted offer: chunk= from META, else what its encoding implies.'''
+    if not meta.get('enc'):
+        return FILE_LEGACY_CHUNK
+    return int(meta.get('chunk') or FILE_ENCODINGS[meta['enc']][2])
+
+def file_decode_part(enc: str, text: str) -> bytes:
+    return FILE_ENCODINGS.get(enc or 'b64', FILE_ENCODINGS['b64'])[1](text)
+
+def file_airtime_benchmark(paths, baud: int = 1200):
+    '''Rows comparing legacy base64 with each cmp/enc combination: chars on air and seconds at baud.'''
+    rows = []
+    for p in paths:
+        with open(p, 'rb') as f:
+            data = f.read()
+        def cost(payload, enc):
+            lines = file_encode_parts(payload, enc)
+            chars = sum(len(x) for x in lines) + FILE_LINE_OVERHEAD * len(lines)
+            return chars, chars * 10.0 / baud
+        base_chars, base_s = cost(data, 'b64')
+        row = {'file': os.path.basename(p), 'bytes': len(data), 'b64': (base_chars, base_s)}
+        cmp, payload = file_compress(data)
+        for enc in FILE_ENCODINGS:
+            row[f'{cmp}+{enc}'] = cost(payload, enc)
+        rows.append(row)
+    return rows
+
+def _file_bench_main(argv):
+    '''python Robust_Chat_v1.6.py --bench-file-encoding FILE... [--baud N]'''
+    baud = 1200
+    if '--baud' in argv:
+        i = argv.index('--baud'); baud = int(argv[i + 1]); argv = argv[:i] + argv[i + 2:]
+    for row in file_airtime_benchmark(argv, baud):
+        bc, bs = row['b64']
+        print(f"{row['file']}: {row['bytes']} B, legacy b64 {bc} chars / {bs:.1f}s @ {baud} bd")
+        for k in row:
+            if k in ('file', 'bytes', 'b64'):
+                continue
+            c, s = row[k]
+            print(f"    {k:<10} {c:>8} chars  {s:8.1f}s  saves {100.0 * (1 - c / float(bc)):5.1f}%")
+
+# --------- Resumable, streaming file transfers ---------
+# The receiver writes each part straight into a preallocated spool under
+# store/inbox/.partial/<fid>/ (see FilePartial) and says resume=1 in FILE OK. Nothing is
+# held in memory: the file is decompressed and hashed as the parts become contiguous, and
+# the sender reads parts from disk on demand (FilePartSource), so size is a policy setting
+# (file_max_kb, 0 = unlimited). META carries chunk=<raw bytes per part> for the offsets.
+# A sender that stalls or restarts re-offers the same FID + sha1; the receiver answers
+# "FILE NEED 1-4,9,12-40 [FID:x]" ("none" when it has everything) before its OK, and only those
+# parts go out again. FILE END is answered with NEED until complete, then "FILE DONE [FID:x]".
+# The sender keeps unfinished sends in store/file_outgoing.json.
+import shutil, hashlib
+FILE_PARTIAL_DIR = os.path.join('inbox', '.partial')
+FILE_OUTGOING_FILE = 'file_outgoing.json'
+FILE_RESUME_MAX_AGE_S = 7 * 24 * 3600   # partial spools / outgoing records older than this are dropped
+FILE_RESUME_TRIES = 5                   # re-offers without an OK before giving up
+FILE_RESUME_GAP_S = 300                 # at most one re-offer per peer per 5 minutes
+FILE_END_ROUNDS = 16                    # END -> NEED -> resend rounds before pausing
+FILE_NEED_MAX_CHARS = 120
+FILE_NEED_RE = re.compile(r'FILE NEED (none|[0-9,\-]+)\s+\[FID:([0-9A-Z]+)\]')
+FILE_OUTGOING_DIR = 'outgoing'          # sender: compressed payload spools, removed after the send
+FILE_READ_BLOCK = 64 * 1024
+FILE_LEGACY_CHUNK = 135                 # raw bytes per 180-char base64 line (pre-enc= peers)
+FILE_MAX_KB_DEFAULT = 500
+
+def file_ranges_encode(nums, max_chars: int = FILE_NEED_MAX_CHARS) -> str:
+    '''Part numbers -> "1-4,9,12-40", cut at max_chars (the rest is asked for next round).'''
+    nums = sorted(set(nums)); out = []; size = 0; k = 0
+    while k < len(nums):
+        j = k
+        while j + 1 < len(nums) and nums[j + 1] == nums[j] + 1:
+            j += 1
+        r = str(nums[k]) if j == k else f'{nums[k]}-{nums[j]}'
+        if out and size + len(r) + 1 > max_chars:
+            break
+        out.append(r); size += len(r) + 1
+        k = j + 1
+    return ','.join(out)
+
+def file_ranges_decode(text: str, n: int) -> set:
+    got = set()
+    for r in (text or '').split(','):
+        a, _, b = r.partition('-')
+        try:
+            lo = int(a); hi = int(b) if b else lo
+        except ValueError:
+            continue
+        got.update(range(max(1, lo), min(hi, n) + 1))
+    return got
+
+class FilePartSource:
+    '''Encoded FILE PART texts read on demand from a payload file: parts[i - 1] is part i.'''
+
+    def __init__(self, path: str, enc: str = 'b64', raw: int = None):
+        self.path = path
+        self.encode = FILE_ENCODINGS[enc][0]
+        self.raw = int(raw or FILE_ENCODINGS[enc][2])
+        self.size = os.path.getsize(path)
+        self.n = max(1, -(-self.size // self.raw))
+        self._f = None
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, k):
+        return self.encode(self.raw_part(k))
+
+    def raw_part(self, k) -> bytes:
+        if not 0 <= k < self.n:
+            raise IndexError(k)
+        if self._f is None:
+            self._f = open(self.path, 'rb')
+        self._f.seek(k * self.raw)
+        return self._f.read(self.raw)
+
+    def close(self):
+        if self._f is not None:
+            try:
+                self._f.close()
+            except Exception:
+                pass
+            self._f = None
+
+def file_scan(path: str, methods=('zlib', 'lzma'), spool: str = None):
+    '''One streaming pass over path: (sha1, size, cmp, payload_path). Each method runs as a
+    streaming compressor into "<spool>.<method>"; the smallest wins if it saves at least 5%,
+    otherwise the payload is the file itself.'''
+    import zlib, lzma
+    sha = hashlib.sha1(); size = 0; comps = {}
+    for m in (methods if spool else ()):
+        try:
+            c = zlib.compressobj(9) if m == 'zlib' else lzma.LZMACompressor(preset=6)
+            comps[m] = [c, open(f'{spool}.{m}', 'wb'), 0]
+        except Exception:
+            continue
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                blk = f.read(FILE_READ_BLOCK)
+                if not blk:
+                    break
+                sha.update(blk); size += len(blk)
+                for c in comps.values():
+                    out = c[0].compress(blk); c[1].write(out); c[2] += len(out)
+        for c in comps.values():
+            out = c[0].flush(); c[1].write(out); c[2] += len(out)
+    finally:
+        for c in comps.values():
+            c[1].close()
+    best = ('none', path, size)
+    for m, c in comps.items():
+        if c[2] < best[2] and c[2] <= 0.95 * size:
+            best = (m, f'{spool}.{m}', c[2])
+    for m in comps:
+        if m != best[0]:
+            try:
+                os.remove(f'{spool}.{m}')
+            except Exception:
+                pass
+    return sha.hexdigest(), size, best[0], best[1]
+
+class FileScanThread(QThread):
+    '''Runs file_scan (SHA-1 plus the trial compressions, seconds for a few MB) off the GUI
+    thread; done carries (ctx, result tuple or None, error text).'''
+    done = pyqtSignal(object, object, str)
+
+    def __init__(self, ctx: dict, path: str, methods, spool: str):
+        super().__init__()
+        self.ctx = ctx; self.path = path; self.methods = methods; self.spool = spool
+
+    def run(self):
+        try:
+            self.done.emit(self.ctx, file_scan(self.path, self.methods, self.spool), "")
+        except Exception as e:
+            self.done.emit(self.ctx, None, str(e) or e.__class__.__name__)
+
+class FilePartial:
+    '''Receiver spool for one transfer, in store/inbox/.partial/<fid>/:
+    state.json (offer, parts, chunk size), data.bin (payload preallocated to parts*chunk; each
+    part is written at its offset), have.bits (one bit per part) and out.part (the file,
+    decompressed and hashed in order as the parts become contiguous).'''
+
+    def __init__(self, fid: str, root: str = None):
+        self.fid = fid
+        self.dir = os.path.join(root or store_path(FILE_PARTIAL_DIR), fid)
+        self.meta = {}
+        self.n = 0
+        self.chunk = 0
+        self.last_len = 0
+        self.done = False
+        self.bits = bytearray(1)
+        self.count = 0
+        self.bad = False
+        self._sha = None       # incremental sha1 / decompressor over parts 1..fed
+        self._dec = None
+        self.fed = 0
+        self.out_size = 0
+        self.parity = {}       # (part, ...) -> XOR parity not yet used (memory only)
+
+    def _p(self, name: str) -> str:
+        return os.path.join(self.dir, name)
+
+    def __contains__(self, i):
+        return 1 <= i <= self.n and bool(self.bits[i])
+
+    @classmethod
+    def open(cls, fid: str, root: str = None):
+        '''The spool left for fid by an earlier session, or None.'''
+        sp = cls(fid, root)
+        try:
+            with open(sp._p('state.json'), 'r', encoding='utf-8') as f:
+                st = json.load(f)
+            sp.meta = st.get('meta') or {}; sp.n = int(st.get('n') or 0); sp.done = bool(st.get('done'))
+            sp.chunk = int(st.get('chunk') or 0); sp.last_len = int(st.get('last_len') or 0)
+        except Exception:
+            return None
+        if sp.done:
+            return sp
+        if not sp.n or not sp.chunk:
+            return None
+        sp.bits = bytearray(sp.n + 1)
+        try:
+            with open(sp._p('have.bits'), 'rb') as f:
+                packed = f.read()
+        except Exception:
+            packed = b''
+        for i in range(1, sp.n + 1):
+            if (i >> 3) < len(packed) and (packed[i >> 3] >> (i & 7)) & 1:
+                sp.bits[i] = 1; sp.count += 1
+        return sp
+
+    def _save_state(self):
+        try:
+            os.makedirs(self.dir, exist_ok=True)
+            tmp = self._p('state.json.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'fid': self.fid, 'meta': self.meta, 'n': self.n, 'chunk': self.chunk,
+                           'last_len': self.last_len, 'done': self.done, 'ts': int(time.time())}, f)
+            os.replace(tmp, self._p('state.json'))
+        except Exception as e:
+            diag_log(f"file spool {self.fid}: state write failed: {e}")
+
+    def create(self, meta: dict, n: int, chunk: int):
+        self.meta = dict(meta); self.n = int(n or 0); self.chunk = int(chunk)
+        self.last_len = 0; self.done = False; self.bad = False
+        self.bits = bytearray(self.n + 1); self.count = 0
+        self._sha = None; self.fed = 0; self.out_size = 0; self.parity = {}
+        shutil.rmtree(self.dir, ignore_errors=True)
+        try:
+            os.makedirs(self.dir, exist_ok=True)
+            with open(self._p('data.bin'), 'wb') as f:
+                f.truncate(self.n * self.chunk)
+            with open(self._p('have.bits'), 'wb') as f:
+                f.write(bytes((self.n >> 3) + 1))
+        except Exception as e:
+            diag_log(f"file spool {self.fid}: create failed: {e}")
+        self._save_state()
+        return self
+
+    def put(self, i: int, data: bytes) -> bool:
+        '''Write part i at its offset and mark it; the bit goes to disk after the data.'''
+        if not 1 <= i <= self.n or self.bits[i]:
+            return False
+        if len(data) > self.chunk or (i < self.n and len(data) != self.chunk):
+            diag_log(f"file spool {self.fid}: part {i} has {len(data)} bytes, expected {self.chunk}")
+            return False
+        try:
+            with open(self._p('data.bin'), 'r+b') as f:
+                f.seek((i - 1) * self.chunk); f.write(data)
+                f.flush(); os.fsync(f.fileno())
+            if i == self.n:
+                self.last_len = len(data); self._save_state()
+            with open(self._p('have.bits'), 'r+b') as f:
+                f.seek(i >> 3); b = f.read(1)
+                f.seek(i >> 3); f.write(bytes([(b[0] if b else 0) | (1 << (i & 7))]))
+                f.flush(); os.fsync(f.fileno())
+        except Exception as e:
+            diag_log(f"file spool {self.fid}: part {i} write failed: {e}")
+            return False
+        self.bits[i] = 1; self.count += 1
+        self.advance()
+        return True
+
+    def advance(self):
+        '''Decompress + hash the parts that are now contiguous, appending to out.part.'''
+        if self.bad:
+            return
+        try:
+            if self._sha is None:
+                self._sha = hashlib.sha1(); self._dec = file_decompressor(self.meta.get('cmp', 'none'))
+                self.fed = 0; self.out_size = 0
+                open(self._p('out.part'), 'wb').close()
+            if self.fed >= self.n or not self.bits[self.fed + 1]:
+                return
+            with open(self._p('data.bin'), 'rb') as src, open(self._p('out.part'), 'ab') as dst:
+                while self.fed < self.n and self.bits[self.fed + 1]:
+                    i = self.fed + 1
+                    src.seek((i - 1) * self.chunk)
+                    out = self._dec.decompress(src.read(self.last_len if i == self.n else self.chunk))
+                    self._sha.update(out); dst.write(out); self.out_size += len(out)
+                    self.fed = i
+        except Exception as e:
+            self.bad = True
+            diag_log(f"file spool {self.fid}: payload does not decode: {e}")
+
+    def missing(self):
+        return [i for i in range(1, self.n + 1) if not self.bits[i]]
+
+    def fec_add(self, members, parity: bytes) -> int:
+        self.parity[tuple(members)] = parity
+        return self.fec_rebuild()
+
+    def fec_rebuild(self) -> int:
+        '''Rebuild every part that is the only one missing from a parity group. Returns parts rebuilt.'''
+        rebuilt = 0; progress = True
+        while progress:
+            progress = False
+            for key in list(self.parity):
+                miss = [i for i in key if not self.bits[i]]
+                if len(miss) > 1:
+                    continue
+                par = self.parity.pop(key)
+                if not miss:
+                    continue
+                i = miss[0]
+                if i == self.n:
+                    plen = int(self.meta.get('plen') or 0)
+                    if not plen:
+                        continue
+                    size = plen - (self.n - 1) * self.chunk
+                else:
+                    size = self.chunk
+                try:
+                    with open(self._p('data.bin'), 'rb') as f:
+                        blocks = []
+                        for j in key:
+                            if j != i:
+                                f.seek((j - 1) * self.chunk); blocks.append(f.read(self.chunk))
+                except Exception:
+                    continue
+                if self.put(i, fec_parity(blocks + [par], self.chunk)[:size]):
+                    rebuilt += 1; progress = True
+        return rebuilt
+
+    def complete(self):
+        '''All parts in: (ok, path of the reassembled file); ok checks sha1 and size.'''
+        self.advance()
+        if self.bad or self.count < self.n or self.fed < self.n:
+            return False, None
+        try:
+            tail = getattr(self._dec, 'flush', lambda: b'')()
+        except Exception:
+            return False, None
+        if tail:
+            with open(self._p('out.part'), 'ab') as dst:
+                dst.write(tail)
+            self._sha.update(tail); self.out_size += len(tail)
+        ok = (self._sha.hexdigest() == (self.meta.get('sha1') or '').lower()
+              and self.out_size == int(self.meta.get('size', self.out_size)))
+        return ok, self._p('out.part')
+
+    def finish(self):
+        '''Keep only a done marker so a late re-offer is answered with FILE DONE.'''
+        self.done = True; self.bits = bytearray(1)
+        for name in ('data.bin', 'have.bits', 'out.part'):
+            try:
+                os.remove(self._p(name))
+            except Exception:
+                pass
+        self._save_state()
+
+    def discard(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    @staticmethod
+    def sweep(root: str = None, max_age: float = FILE_RESUME_MAX_AGE_S):
+        root = root or store_path(FILE_PARTIAL_DIR)
+        try:
+            names = os.listdir(root)
+        except Exception:
+            return
+        now = time.time()
+        for name in names:
+            d = os.path.join(root, name)
+            try:
+                ts = max(os.path.getmtime(os.path.join(d, f)) for f in os.listdir(d))
+            except Exception:
+                ts = 0
+            if now - ts > max_age:
+                shutil.rmtree(d, ignore_errors=True)
+
+# --------- Content-addressed inbox ---------
+# A received file is kept once per content, as store/inbox/.objects/<sha1[:2]>/<sha1> (the
+# sha1 FilePartial.complete() verified), and appears under its offered name in store/inbox/
+# as a hardlink to that object (a symlink, or a copy, where the filesystem has no links).
+# store/inbox/.index.json maps sha1 -> {name, size, from, t, names, seen}. An offer of a sha1
+# already held is answered "FILE DONE [FID:x]" at once, which every sender takes as "have it".
+FILE_OBJECTS_DIR = '.objects'
+FILE_INDEX_NAME = '.index.json'
+
+class FileInbox:
+    '''Received files by sha1, with readable links and a small index.'''
+
+    def __init__(self, root: str = None):
+        self.root = root or os.path.dirname(store_path(FILE_PARTIAL_DIR))
+        self.index = {}
+        try:
+            with open(os.path.join(self.root, FILE_INDEX_NAME), 'r', encoding='utf-8') as f:
+                d = json.load(f)
+            self.index = d if isinstance(d, dict) else {}
+        except Exception:
+            pass
+
+    def _save(self):
+        p = os.path.join(self.root, FILE_INDEX_NAME)
+        try:
+            with open(p + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(self.index, f, ensure_ascii=False, indent=2)
+            os.replace(p + '.tmp', p)
+        except Exception as e:
+            diag_log(f"inbox index: {e}")
+
+    def object_path(self, sha1: str) -> str:
+        return os.path.join(self.root, FILE_OBJECTS_DIR, sha1[:2], sha1)
+
+    def have(self, sha1: str):
+        '''The index entry for sha1 if its content is still here, else None.'''
+        e = self.index.get(sha1)
+        if e is not None and not os.path.exists(self.object_path(sha1)):
+            self.index.pop(sha1, None); self._save()
+            return None
+        return e
+
+    def link(self, sha1: str, name: str) -> str:
+        '''A readable path in the inbox for the object: an existing link to it under name (or
+        name(k)), otherwise a new one.'''
+        obj = self.object_path(sha1)
+        name = os.path.basename(name or '') or sha1
+        stem, ext = os.path.splitext(name); k = 0
+        while True:
+            out = os.path.join(self.root, name if not k else f"{stem}({k}){ext}")
+            if not os.path.lexists(out):
+                break
+            try:
+                if os.path.samefile(out, obj):
+                    return out
+            except Exception:
+                pass
+            k += 1
+        try:
+            os.link(obj, out)
+        except Exception:
+            try:
+                os.symlink(os.path.relpath(obj, self.root), out)
+            except Exception:
+                shutil.copyfile(obj, out)
+        return out
+
+    def add(self, src: str, meta: dict, frm: str) -> str:
+        '''File src (verified against meta["sha1"]) received from frm: keep it as its object,
+        index it and return the readable path.'''
+        sha1 = meta["sha1"]
+        obj = self.object_path(sha1)
+        os.makedirs(os.path.dirname(obj), exist_ok=True)
+        if os.path.exists(obj):
+            os.remove(src)
+        else:
+            shutil.move(src, obj)
+        out = self.link(sha1, meta.get("name"))
+        e = self.index.setdefault(sha1, {"name": os.path.basename(out), "size": meta.get("size"),
+                                         "from": frm, "t": int(time.time()), "names": [], "seen": 0})
+        if os.path.basename(out) not in e["names"]:
+            e["names"].append(os.path.basename(out))
+        self._save()
+        return out
+
+    def seen(self, sha1: str, name: str, frm: str) -> str:
+        '''A repeat offer of held content: count it and make sure its name is in the inbox.'''
+        e = self.index[sha1]
+        out = self.link(sha1, name)
+        if os.path.basename(out) not in e.setdefault("names", []):
+            e["names"].append(os.path.basename(out))
+        e["seen"] = e.get("seen", 0) + 1; e["last_from"] = frm; e["last_t"] = int(time.time())
+        self._save()
+        return out
+
+# --------- Forward error correction for file parts ---------
+# Windowed transfers can carry XOR parity: META offers fec=xor plen=<payload bytes>, a receiver
+# that agrees echoes fec=xor in FILE OK. Parity only goes on a tail burst, one that can finish
+# the transfer (fec_plan); mid-transfer a lost part just rides in the next burst. After a tail
+# burst the sender adds one "FILE FEC <ranges> [FID:x] <parity>" per group of k parts (XOR of
+# the raw parts, zero-padded to chunk); a receiver missing exactly one part of a group rebuilds
+# it without asking. Its SACKs carry got=<frames heard this burst>, which gives the sender the
+# raw channel loss (rebuilt parts hide it from the bitmap). fec_group_size picks k from
+# {0 (none), 1 (send twice), 2, 3, 4, 6, 8, 12, 16} by expected cost: parity frames plus the
+# chance another SACK round is still needed times what that round costs (air_bps prices it).
+# Below 2% loss no parity is sent.
+FILE_FEC_MIN_LOSS = 0.02        # below this no parity is sent
+FILE_FEC_PRIOR = 0.05           # loss assumed before the first SACK from a peer
+FILE_FEC_ALPHA = 0.3            # EWMA weight of each burst's measured loss
+FILE_FEC_RE = re.compile(r'FILE FEC ([0-9,\-]+)\s+\[FID:([0-9A-Z]+)\]\s+(\S+)')
+FILE_AIR_BPS_DEFAULT = 600      # on-air rate used to price a SACK round in frames (air_bps setting)
+
+def fec_parity(blocks, size: int) -> bytes:
+    '''XOR of blocks, each zero-padded to size.'''
+    acc = 0
+    for b in blocks:
+        acc ^= int.from_bytes(bytes(b).ljust(size, b'\0'), 'big')
+    return acc.to_bytes(size, 'big')
+
+def fec_group_size(loss: float, n: int, round_frames: float) -> int:
+    '''Parts per parity frame for a tail of n parts: the k (0 = none, 1 = send twice) that
+    minimises parity frames + P(another round is still needed) * round_frames, where
+    round_frames is what one more SACK round costs, in frame times.'''
+    if loss < FILE_FEC_MIN_LOSS or n <= 0:
+        return 0
+    q = 1.0 - loss
+    best_k, best = 0, (1.0 - q ** n) * round_frames
+    for k in (1, 2, 3, 4, 6, 8, 12, 16):
+        if k > n and k != 1:
+            break
+        ok = 1.0; groups = 0
+        for j in range(0, n, k):
+            m = min(k, n - j); groups += 1
+            ok *= q ** m * (1.0 + m * loss)      # no loss, or one loss + parity heard
+        cost = groups + (1.0 - ok) * round_frames
+        if cost < best:
+            best_k, best = k, cost
+    return best_k
+
+def fec_groups(burst, k: int):
+    '''Parity groups of up to k for one burst of part numbers.'''
+    if not k:
+        return []
+    return [burst[j:j + k] for j in range(0, len(burst), k)]
+
+def fec_plan(W, loss: float, round_frames: float):
+    '''(burst, parity groups) for the next windowed burst. Mid-transfer a lost part simply
+    rides in the next burst, so parity is only added to the tail (a burst that can finish the
+    transfer), where each loss would otherwise cost a whole extra SACK round.'''
+    left = (W.n - W.next_new + 1) + sum(1 for i in set(W.lost) if not W.acked[i])
+    if left > W.win - len(W.inflight):
+        return W.next_burst(), []
+    burst = W.next_burst()
+    return burst, fec_groups(burst, fec_group_size(loss, len(burst), round_frames))
+
+def file_fec_simulate(n: int, loss: float, fec: bool = True, win: int = FILE_WINDOW_DEFAULT,
+                      baud: int = 1200, turnaround_s: float = 2.0, seed: int = 1) -> float:
+    '''Seconds to deliver n parts with the windowed protocol over a half-duplex channel that
+    loses each frame (parts, parity, SACKs) independently with probability loss.'''
+    rng = random.Random(seed)
+    frame_s = (FILE_LINE_CHARS + FILE_LINE_OVERHEAD) * 10.0 / baud
+    sack_s = 2 * turnaround_s + 60 * 10.0 / baud
+    round_frames = 1 + (sack_s + FILE_SACK_QUIET_MS / 1000.0 + loss * FILE_SACK_WAIT_S) / frame_s
+    W = FileTxWindow(n, win); have = set(); t = 0.0
+    while not W.done:
+        tail = n - len(have) <= win
+        burst, groups = fec_plan(W, W.loss, round_frames) if fec else (W.next_burst(), [])
+        frames = [('p', i) for i in burst] + [('f', g) for g in groups]
+        heard = [f for f in frames if rng.random() >= loss]
+        for kind, x in heard:
+            if kind == 'p':
+                have.add(x)
+            else:
+                miss = [i for i in x if i not in have]
+                if len(miss) == 1:
+                    have.add(miss[0])
+        t += len(frames) * frame_s
+        if len(have) < n and (len(heard) < win or (fec and tail)):
+            t += FILE_SACK_QUIET_MS / 1000.0      # no count trigger: receiver waits for quiet
+        while rng.random() < loss:                # SACK lost: sender waits, then PINGs
+            t += FILE_SACK_WAIT_S + frame_s
+        t += sack_s
+        if fec:
+            W.note_loss(len(frames), len(heard))
+        W.on_sack(*file_sack_encode(have, n))
+    return t
+
+def _file_fec_bench_main(argv):
+    '''python Robust_Chat_v1.6.py --bench-file-fec [PARTS] [--baud N] [--runs N]'''
+    opts = {'--baud': 1200, '--runs': 200}
+    for flag in list(opts):
+        if flag in argv:
+            i = argv.index(flag); opts[flag] = int(argv[i + 1]); argv = argv[:i] + argv[i + 2:]
+    baud, runs = opts['--baud'], opts['--runs']
+    for n in ([int(argv[0])] if argv else [20, 100]):
+        print(f"{n} parts, window {FILE_WINDOW_DEFAULT}, {baud} bd, mean of {runs} runs")
+        for turn in (2.0, 8.0):
+            for loss in (0.05, 0.10, 0.20):
+                plain = sum(file_fec_simulate(n, loss, False, baud=baud, turnaround_s=turn, seed=s)
+                            for s in range(runs)) / runs
+                xor = sum(file_fec_simulate(n, loss, True, baud=baud, turnaround_s=turn, seed=s)
+                          for s in range(runs)) / runs
+                print(f"  turnaround {turn:3.0f}s loss {loss:4.0%}: retransmit only {plain:7.1f}s   "
+                      f"adaptive xor {xor:7.1f}s   ({100.0 * (plain - xor) / plain:+5.1f}%)")
+
+# --------- Event-driven file transfer engine ---------
+# Outbound transfers are FileSendJob state machines (offer -> send -> end) advanced by RX
+# events (OK/SACK/PONG/NEED/DONE/NO) and by one shared FileTransferEngine QTimer that fires
+# their deadlines, so several transfers in and out can run at once without blocking the GUI.
+# The engine reports progress/finished for both directions and garbage-collects inbound
+# offers and transfers that went quiet (their spools stay on disk for a later resume).
+# A sender that gives up says "FILE ABORT [FID:x]"; a receiver that cancels says FILE NO.
+from PyQt5.QtCore import QObject
+FILE_TICK_MS = 250
+FILE_OFFER_WAIT_S = 30          # sender: wait this long for FILE OK
+FILE_PONG_INTERVAL_S = 3        # stop-and-wait: PING every 3 s ...
+FILE_PONG_WAIT_S = 30           # ... for up to 30 s before the next part
+FILE_OFFER_TTL_S = 30 * 60      # receiver: unanswered offers leave the list
+FILE_RX_IDLE_S = 10 * 60        # receiver: silent transfers leave memory (spool kept)
+FILE_GC_EVERY_S = 5
+FILE_MC_JOIN_S = 60            # multicast: how long an offer collects receivers
+FILE_MC_POLL_TRIES = 3         # multicast: unanswered FILE END polls before a receiver is dropped
+
+def fmt_eta(sec: float) -> str:
+    if sec is None or sec < 0:
+        return '—'
+    sec = int(sec)
+    return f'{sec // 3600}h{sec // 60 % 60:02d}m' if sec >= 3600 else f'{sec // 60}m{sec % 60:02d}s'
+
+class FileSendJob:
+    '''One outbound transfer. Windowed when the receiver agreed (bursts + SACKs, PING when a
+    SACK is overdue), else stop-and-wait ([ACK]ed parts with a PING/PONG probe before each).'''
+
+    def __init__(self, app, fid, to, path, name, nbytes, sha1, cmp, enc, parts, spool, win, resume=False):
+        self.app, self.fid, self.to, self.path, self.name = app, fid, to, path, name
+        self.nbytes, self.sha1, self.cmp, self.enc = nbytes, sha1, cmp, enc
+        self.parts, self.spool, self.win, self.resume = parts, spool, win, bool(resume)
+        self.phase = 'offer'
+        self.deadline = 0.0
+        self.t0 = time.time()
+        self.W = None              # FileTxWindow when windowed
+        self.queue = []            # stop-and-wait: parts still to send
+        self.delivered = 0
+        self.base = 0              # parts already delivered before this session (resume)
+        self.fec = False
+        self.resumable = False
+        self.need_text = None      # FILE NEED that came with the OK
+        self.probes = 0
+        self.pinged = False
+        self.ponged = False
+        self.probe_t0 = 0.0
+        self.t_burst = 0.0
+        self.end_rounds = 0
+        self.parity = 0
+
+    # ---- helpers ----
+    @property
+    def n(self) -> int:
+        return len(self.parts)
+
+    @property
+    def done_parts(self) -> int:
+        return self.W.n_acked if self.W is not None else self.delivered
+
+    def _send(self, line: str):
+        self.app._send_protocol_line(line, self.to)
+
+    def _status(self, text: str):
+        try:
+            self.app._status(text)
+        except Exception:
+            pass
+
+    def rate(self):
+        '''(bytes/s, ETA s or -1) over this session.'''
+        dt = max(0.001, time.time() - self.t0)
+        moved = self.done_parts - self.base
+        if moved <= 0:
+            return 0.0, -1.0
+        return self.nbytes * moved / float(self.n) / dt, (self.n - self.done_parts) * dt / moved
+
+    # ---- phases ----
+    def begin(self):
+        fec = f'fec=xor plen={self.parts.size} ' if self.app._file_fec_enabled() else ''
+        self._send(f'FILE META name="{self.name}" size={self.nbytes} sha1={self.sha1} parts={self.n} '
+                   f'win={self.win} cmp={self.cmp} enc={self.enc} chunk={self.parts.raw} {fec}[FID:{self.fid}]')
+        self.deadline = time.time() + FILE_OFFER_WAIT_S
+        self._status(f"{'Re-offered' if self.resume else 'Offered'} file: {self.name} ({self.nbytes} bytes) — waiting for OK…")
+
+    def hears(self, frm: str) -> bool:
+        '''Only the peer this transfer goes to may drive it.'''
+        return not frm or base_callsign(frm) == base_callsign(self.to)
+
+    def on_ok(self, frm: str, msg: str):
+        if self.phase != 'offer':
+            return
+        mw = FILE_WIN_RE.search(msg)
+        peer_win = int(mw.group(1)) if mw else 0
+        mc = re.search(r'\bcmp=(\w+) enc=(\w+)', msg)
+        agreed = bool(mc) and (mc.group(1), mc.group(2)) == (self.cmp, self.enc)
+        if not agreed:
+            # receiver did not echo cmp=/enc=: plain base64 of the original bytes
+            self.parts.close()
+            self.parts = FilePartSource(self.path, 'b64', FILE_LEGACY_CHUNK)
+        self.resumable = agreed and bool(re.search(r'\bresume=1\b', msg))
+        self.fec = agreed and bool(peer_win) and bool(re.search(r'\bfec=xor\b', msg))
+        need = None
+        if self.resumable:
+            self.app._file_outgoing_note(self.fid, {"path": os.path.abspath(self.path), "to": self.to, "name": self.name,
+                                                    "sha1": self.sha1, "cmp": self.cmp, "enc": self.enc})
+            if self.need_text is not None:
+                need = file_ranges_decode(self.need_text, self.n)
+                self._status(f"Resuming {self.name}: receiver needs {len(need)}/{self.n} parts.")
+        self.phase = 'send'; self.t0 = time.time()
+        if peer_win:
+            self.W = FileTxWindow(self.n, min(self.win, peer_win))
+            self.W.loss = self.app._file_loss.get(self.to, FILE_FEC_PRIOR)
+            if need is not None:
+                self.W.resume(need)
+            self.base = self.W.n_acked
+            self._burst()
+        else:
+            self.queue = sorted(need) if need is not None else list(range(1, self.n + 1))
+            self.delivered = self.base = self.n - len(self.queue)
+            self._saw_send()
+
+    def _burst(self):
+        W = self.W
+        if self.fec:
+            burst, groups = fec_plan(W, W.loss, self.app._file_round_frames(W))
+        else:
+            burst, groups = W.next_burst(), []
+        for i in burst:
+            self._send(f'FILE PART {i}/{self.n} [FID:{self.fid}] {self.parts[i - 1]}')
+        for g in groups:
+            par = self.parts.encode(fec_parity([self.parts.raw_part(i - 1) for i in g], self.parts.raw))
+            self._send(f'FILE FEC {file_ranges_encode(g)} [FID:{self.fid}] {par}')
+        W.burst_frames = len(burst) + len(groups); self.parity += len(groups)
+        self.pinged = self.ponged = False
+        self.t_burst = time.time(); self.deadline = self.t_burst + FILE_SACK_WAIT_S
+
+    def on_sack(self, frm: str, cum: int, bits: int, got=None):
+        W = self.W
+        if W is None or self.phase not in ('send', 'end'):
+            return
+        if got is not None:
+            W.note_loss(W.burst_frames, got)
+        if not self.pinged:
+            wait = max(0.0, time.time() - self.t_burst - W.burst_frames * self.app._file_frame_s())
+            W.round_s = wait if W.round_s is None else W.round_s + 0.25 * (wait - W.round_s)
+        W.on_sack(cum, bits); self.probes = 0
+        self.app._file_emit_progress(self)
+        if self.phase == 'send':
+            if W.done:
+                self._end()
+            else:
+                self._burst()
+
+    def _saw_send(self):
+        if not self.queue:
+            self._end()
+            return
+        i = self.queue.pop(0)
+        self.app._send_with_ack(f'FILE PART {i}/{self.n} [FID:{self.fid}] {self.parts[i - 1]}',
+                                self.to, self.app._next_ack_id(self.to))
+        self.delivered += 1
+        self.app._file_emit_progress(self)
+        if not self.queue:
+            self._end()
+        else:
+            self.probe_t0 = time.time(); self._ping(self.probe_t0)
+
+    def _ping(self, now: float):
+        self.pinged = True; self.ponged = False
+        self._send(f"FILE PING [FID:{self.fid}]")
+        self.deadline = now + (FILE_PONG_INTERVAL_S if self.W is None else FILE_SACK_WAIT_S)
+
+    def on_pong(self, frm: str):
+        if self.phase != 'send' or not self.pinged:
+            return
+        if self.W is None:
+            self._saw_send()
+        else:
+            # the receiver's SACK follows its PONG; give it a moment before resending
+            self.ponged = True
+            self.deadline = min(self.deadline, time.time() + FILE_PONG_INTERVAL_S)
+
+    def _end(self):
+        if not self.resumable:
+            self._send(f'FILE END [FID:{self.fid}]')
+            self._succeed()
+            return
+        self.end_rounds += 1
+        if self.end_rounds > FILE_END_ROUNDS:
+            self._fail(f"{self.name}: receiver still missing parts after {FILE_END_ROUNDS} rounds.")
+            return
+        self.phase = 'end'
+        self._send(f'FILE END [FID:{self.fid}]')
+        self.deadline = time.time() + FILE_SACK_WAIT_S
+
+    def on_need(self, frm: str, text: str):
+        if self.phase == 'offer':
+            self.need_text = text
+            return
+        if self.phase != 'end':
+            return
+        miss = sorted(file_ranges_decode(text, self.n))
+        if not miss:
+            self._end()
+            return
+        self.phase = 'send'
+        if self.W is not None:
+            self.W.resume(miss); self._burst()
+        else:
+            self.queue = miss; self.delivered = self.n - len(miss); self._saw_send()
+
+    def on_done(self, frm: str):
+        if self.phase == 'offer':
+            self._status(f"{self.name}: {self.to} already has this file.")
+        self._succeed()
+
+    def on_no(self, frm: str):
+        self.app._file_outgoing_drop(self.fid)
+        self._fail("File offer declined." if self.phase == 'offer' else f"{self.name}: receiver cancelled the transfer.",
+                   paused=False)
+
+    def cancel(self):
+        if self.phase != 'offer':
+            self._send(f"FILE ABORT [FID:{self.fid}]")
+        self.app._file_outgoing_drop(self.fid)
+        self._fail(f"{self.name}: transfer cancelled.", paused=False)
+
+    def tick(self, now: float):
+        if now < self.deadline:
+            return
+        if self.phase == 'offer':
+            self._fail("File offer declined or timed out.", paused=False)
+        elif self.phase == 'end':
+            self._fail(f"{self.name}: no reply to FILE END.")
+        elif self.W is None:
+            # stop-and-wait: keep probing before the next part
+            if now - self.probe_t0 >= FILE_PONG_WAIT_S:
+                self._fail("Receiver unresponsive (no PONG) — aborting file send.")
+            else:
+                self._ping(now)
+        elif not self.pinged:
+            self._ping(now)               # SACK overdue: a live receiver answers PONG + SACK
+        else:
+            self.W.on_timeout()
+            self.probes = 0 if self.ponged else self.probes + 1
+            if self.probes >= FILE_STALL_PROBES:
+                self._fail(f"Receiver unresponsive — aborting file send ({self.W.n_acked}/{self.n} parts delivered).")
+            else:
+                self._burst()
+
+    # ---- outcome ----
+    def _succeed(self):
+        dt = max(0.001, time.time() - self.t0)
+        if self.W is not None:
+            fs = f", {self.parity} parity, loss {self.W.loss:.0%}" if self.fec else ""
+            msg = (f"File sent: {self.name} ({self.nbytes} bytes, {self.n} parts, {self.W.resent} resent{fs}) "
+                   f"in {dt:.0f}s · {self.nbytes / dt:.0f} B/s")
+        else:
+            msg = f"File sent: {self.name} ({self.nbytes} bytes) in {self.n} parts."
+        self.app._file_outgoing_drop(self.fid)
+        self.phase = 'done'
+        self.app._file_engine().finish(self, True, msg)
+
+    def _fail(self, msg: str, paused: bool = True):
+        if paused and self.resumable:
+            msg += f" Paused — it resumes when {self.to} is heard again."
+        self.phase = 'failed'
+        self.app._file_engine().finish(self, False, msg)
+
+    def close(self):
+        if self.fec and self.W is not None:
+            self.app._file_loss[self.to] = self.W.loss
+        try:
+            self.parts.close()
+        except Exception:
+            pass
+        if self.spool:
+            # compressed payload is rebuilt from the file on resume
+            for m in ('zlib', 'lzma'):
+                try:
+                    os.remove(f"{self.spool}.{m}")
+                except Exception:
+                    pass
+
+class FileMulticastJob(FileSendJob):
+    '''One file to many receivers: a fleet roster, or anyone who answers (CQ). Each round sends
+    the parts once, addressed to CQ and paced at the on-air rate; then every receiver is polled
+    in turn with FILE END and answers FILE NEED (what it still lacks) or FILE DONE. The next round
+    carries only the union of those gaps. One poll at a time keeps the NACKs from colliding.'''
+
+    def __init__(self, app, fid, roster, path, name, nbytes, sha1, cmp, enc, parts, spool, win):
+        super().__init__(app, fid, 'CQ', path, name, nbytes, sha1, cmp, enc, parts, spool, win)
+        self.roster = sorted({base_callsign(c) for c in roster or () if c})   # empty: open (CQ)
+        self.rx = {}               # callsign -> {"ok", "need", "done", "miss"}
+        self.todo = []             # parts still to go out this round
+        self.need = set()          # union of parts reported missing this round
+        self.poll = []             # receivers still to poll this round
+        self.rounds = 0
+        self.frames = 0            # PART frames sent (airtime, in part-frames)
+
+    @property
+    def done_parts(self) -> int:
+        return self.n - len(set(self.todo) | self.need)
+
+    def hears(self, frm: str) -> bool:
+        return not self.roster or base_callsign(frm or '') in self.roster
+
+    def _rx(self, frm: str) -> dict:
+        return self.rx.setdefault(frm, {"ok": False, "need": None, "done": False, "miss": 0})
+
+    def _live(self):
+        return [c for c, r in self.rx.items() if r["ok"] and not r["done"]]
+
+    def begin(self):
+        grp = ','.join(self.roster) or '*'
+        self._send(f'FILE META name="{self.name}" size={self.nbytes} sha1={self.sha1} parts={self.n} '
+                   f'cmp={self.cmp} enc={self.enc} chunk={self.parts.raw} mc={grp} [FID:{self.fid}]')
+        self.deadline = time.time() + FILE_MC_JOIN_S
+        who = f"{len(self.roster)} fleet members" if self.roster else "CQ"
+        self._status(f"Offered file: {self.name} ({self.nbytes} bytes) to {who} — waiting for receivers…")
+
+    def on_ok(self, frm: str, msg: str):
+        if self.phase != 'offer' or self._rx(frm)["ok"]:
+            return
+        r = self.rx[frm]
+        mc = re.search(r'\bcmp=(\w+) enc=(\w+)', msg)
+        if not mc or (mc.group(1), mc.group(2)) != (self.cmp, self.enc) or not re.search(r'\bresume=1\b', msg):
+            self.rx.pop(frm, None)     # cannot report NEED: not a multicast receiver
+            return
+        r["ok"] = True
+        self._status(f"{self.name}: {frm} joined ({len(self.rx)} receivers).")
+        self._maybe_start()
+
+    def _maybe_start(self):
+        if self.roster and {base_callsign(c) for c, r in self.rx.items() if r["ok"]} >= set(self.roster):
+            self._start()
+
+    def _start(self):
+        live = self._live()
+        if not live:
+            if any(r["done"] for r in self.rx.values()):
+                self._succeed()
+            else:
+                self._fail("No receivers joined the multicast.")
+            return
+        self.phase = 'send'; self.t0 = time.time()
+        if all(self.rx[c]["need"] is not None for c in live):
+            first = set().union(*(self.rx[c]["need"] for c in live))   # every receiver is resuming
+        else:
+            first = range(1, self.n + 1)
+        self._round(first)
+
+    def _round(self, parts):
+        self.rounds += 1
+        if self.rounds > FILE_END_ROUNDS:
+            self._fail(f"{self.name}: receivers still missing parts after {FILE_END_ROUNDS} rounds.")
+            return
+        self.phase = 'send'
+        self.todo = sorted(parts); self.need = set()
+        self.poll = self._live()
+        self._pump()
+
+    def _pump(self):
+        chunk, self.todo = self.todo[:self.win], self.todo[self.win:]
+        for i in chunk:
+            self._send(f'FILE PART {i}/{self.n} [FID:{self.fid}] {self.parts[i - 1]}')
+        self.frames += len(chunk)
+        self.app._file_emit_progress(self)
+        self.deadline = time.time() + len(chunk) * self.app._file_frame_s()
+
+    def _poll_next(self):
+        self.phase = 'end'
+        if self.poll:
+            self.app._send_protocol_line(f'FILE END [FID:{self.fid}]', self.poll[0])
+            self.deadline = time.time() + FILE_SACK_WAIT_S
+            return
+        if not self._live():
+            if any(r["done"] for r in self.rx.values()):
+                self._succeed()
+            else:
+                self._fail(f"{self.name}: every receiver dropped out.")
+            return
+        self._round(self.need)
+
+    def _answered(self, frm: str):
+        if self.poll and self.poll[0] == frm:
+            self.poll.pop(0)
+            self._poll_next()
+
+    def on_need(self, frm: str, text: str):
+        if self.phase != 'offer' and frm not in self.rx:
+            return
+        r = self._rx(frm)
+        r["need"] = set(file_ranges_decode(text, self.n)); r["miss"] = 0
+        if self.phase == 'end':
+            self.need |= r["need"]
+            self._answered(frm)
+
+    def on_done(self, frm: str):
+        if self.phase != 'offer' and frm not in self.rx:
+            return
+        r = self._rx(frm)
+        r["done"] = True
+        if self.phase == 'offer':
+            self._status(f"{self.name}: {frm} already has this file.")
+            r["ok"] = True; self._maybe_start()
+        else:
+            self._answered(frm)
+
+    def on_no(self, frm: str):
+        self.rx.pop(frm, None)
+        self._status(f"{self.name}: {frm} left the multicast.")
+        if self.poll and self.poll[0] == frm:
+            self.poll.pop(0); self._poll_next()
+        elif frm in self.poll:
+            self.poll.remove(frm)
+
+    def cancel(self):
+        self._send(f"FILE ABORT [FID:{self.fid}]")
+        self._fail(f"{self.name}: transfer cancelled.", paused=False)
+
+    def tick(self, now: float):
+        if now < self.deadline:
+            return
+        if self.phase == 'offer':
+            self._start()
+        elif self.phase == 'send':
+            if self.todo:
+                self._pump()
+            else:
+                self._poll_next()
+        elif self.poll:
+            c = self.poll[0]; r = self.rx[c]
+            r["miss"] += 1
+            if r["miss"] >= FILE_MC_POLL_TRIES:
+                self._status(f"{self.name}: {c} stopped answering — dropped.")
+                self.rx.pop(c, None); self.poll.pop(0)
+            self._poll_next()
+
+    def _succeed(self):
+        dt = max(0.001, time.time() - self.t0)
+        got = sum(1 for r in self.rx.values() if r["done"])
+        msg = (f"Multicast sent: {self.name} ({self.nbytes} bytes) to {got} receivers — "
+               f"{self.frames} part frames for {self.n} parts ({self.frames / max(1, self.n):.2f}×), "
+               f"{self.rounds} rounds in {dt:.0f}s")
+        self.phase = 'done'
+        self.app._file_engine().finish(self, True, msg)
+
+class FileTransferEngine(QObject):
+    '''Runs every FileSendJob off one QTimer and reports progress for both directions.'''
+    progress = pyqtSignal(str, str, int, int, float, float)   # fid, 'tx'|'rx', parts done, parts total, B/s, ETA s (-1 unknown)
+    finished = pyqtSignal(str, str, bool, str)                # fid, 'tx'|'rx', ok, message
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.jobs = {}             # fid -> FileSendJob
+        self._gc_at = 0.0
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self._tick)
+
+    def start(self, job: FileSendJob):
+        self.jobs[job.fid] = job
+        job.begin()
+        self.wake()
+
+    def wake(self):
+        if not self.timer.isActive():
+            self.timer.start(FILE_TICK_MS)
+
+    def busy_with(self, dest: str) -> bool:
+        return any(base_callsign(j.to) == dest for j in self.jobs.values())
+
+    def finish(self, job: FileSendJob, ok: bool, msg: str):
+        self.jobs.pop(job.fid, None)
+        job.close()
+        try:
+            self.app._status(msg)
+        except Exception:
+            pass
+        self.finished.emit(job.fid, 'tx', bool(ok), msg)
+
+    def cancel(self, fid: str) -> bool:
+        job = self.jobs.get(fid)
+        if job is not None:
+            job.cancel()
+            return True
+        return self.app._file_rx_cancel(fid)
+
+    def event(self, fid: str, kind: str, frm: str, *args) -> bool:
+        '''Route a sender-side RX frame (ok/sack/pong/need/done/no) from frm to its job.'''
+        job = self.jobs.get(fid)
+        if job is None:
+            return False
+        if not job.hears(frm):
+            return True
+        try:
+            getattr(job, 'on_' + kind)(frm, *args)
+        except Exception as e:
+            diag_log(f"file job {fid} {kind}: {e}")
+        return True
+
+    def _tick(self):
+        now = time.time()
+        for job in list(self.jobs.values()):
+            try:
+                job.tick(now)
+            except Exception as e:
+                diag_log(f"file job {job.fid} tick: {e}")
+                self.finish(job, False, f"File send failed: {e}")
+        if now >= self._gc_at:
+            self._gc_at = now + FILE_GC_EVERY_S
+            self.app._file_rx_gc(now)
+        if not self.jobs and not self.app._file_rx and not self.app._file_offers:
+            self.timer.stop()
+
 # --- Network Graph widget (fallback/portable) ---
 # Provides a minimal viewer for the link graph when a full LinkMapWidget isn't provided by modules.
 from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QGraphicsView, QGraphicsScene
@@ -722,7 +3746,7 @@ from PyQt5.QtGui import QPen, QBrush, QColor, QFont
 from PyQt5.QtCore import Qt, QTimer, QPointF
 
 class LinkMapWidget(QWidget):
-    def __init__(self, get_mycall, get_live, get_theme):
+    def __init__(self, get_mycall, get_live, get_theme, get_route_tip=None):
         super().__init__()
         # ACK/Retry + Auto-ACK state
         self.ack_counter = 1
@@ -734,6 +3758,7 @@ class LinkMapWidget(QWidget):
         self.get_mycall = get_mycall
         self.get_live = get_live
         self.get_theme = get_theme
+        self.get_route_tip = get_route_tip
         v = QVBoxLayout(self)
         ctrl = QHBoxLayout()
         self.zoom_in = QPushButton("+")
@@ -750,8 +3775,8 @@ class LinkMapWidget(QWidget):
         self.view.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
         self.view.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
         v.addWidget(self.view, 1)
-        self.zoom_in.clicked.connect(lambda: self.view.scale(1.15, 1.15))
-        self.zoom_out.clicked.connect(lambda: self.view.scale(1/1.15, 1/1.15))
+        self.zoom_in.clicked.connect(lambda: self._user_scale(1.15))
+        self.zoom_out.clicked.connect(lambda: self._user_scale(1/1.15))
         self.reset_btn.clicked.connect(self.reset_view)
         self.draw_graph()
 
@@ -760,6 +3785,12 @@ class LinkMapWidget(QWidget):
         r = self.scene.itemsBoundingRect()
         if r.isValid():
             self.view.fitInView(r.adjusted(-40, -40, 40, 40), Qt.KeepAspectRatio)
+        self._user_view = False
+
+    def _user_scale(self, f):
+        '''Zoom from the +/- buttons; from here on redraws leave the transform alone.'''
+        self.view.scale(f, f)
+        self._user_view = True
 
     def _triangle(self, cx, cy, size):
         h = size
@@ -771,149 +3802,146 @@ class LinkMapWidget(QWidget):
         return QPolygonF(pts)
 
     def draw_graph(self):
-        self.scene.clear()
+        '''Diff the current graph against the scene: items are keyed by node/edge and
+        only added, removed or moved ones are touched. The view transform is kept.'''
+        if not hasattr(self, '_node_items'):
+            self._node_items = {}   # key -> [polygon item, text item, role, label, (x, y), tooltip]
+            self._edge_items = {}   # (src key, dst key) -> [line item, (sx, sy, ex, ey)]
+            self._theme_sig = None
         # theme colors
         t = self.get_theme() if hasattr(self, 'get_theme') else {}
         t_edge = QColor(t.get('map_edge', '#505050'))
         t_text = QColor(t.get('text', '#000000'))
-        self.view.setBackgroundBrush(QBrush(QColor(t.get('panel_bg', '#f5f5f5'))))
-
-        # helper: clipped line to avoid icons/labels at endpoints
-        def draw_edge(ax, ay, bx, by, rA, rB, label_h_src=0.0):
-            dx, dy = (bx-ax), (by-ay)
-            L = (dx*dx + dy*dy) ** 0.5
-            if L < 1e-6:
-                return
-            ux, uy = dx / L, dy / L
-            extra_src = (label_h_src + 6.0) if uy > 0 else 0.0  # if going downward from source, skip label below
-            sx, sy = ax + ux * (rA + 2.0 + extra_src), ay + uy * (rA + 2.0 + extra_src)
-            ex, ey = bx - ux * (rB + 2.0), by - uy * (rB + 2.0)
-            self.scene.addLine(sx, sy, ex, ey, pen_edge)
+        theme_sig = (t.get('map_edge'), t.get('text'), t.get('panel_bg'))
+        theme_changed = theme_sig != self._theme_sig
+        if theme_changed:
+            self._theme_sig = theme_sig
+            self.view.setBackgroundBrush(QBrush(QColor(t.get('panel_bg', '#f5f5f5'))))
 
         my = base_callsign(self.get_mycall() or "MYCALL")
         parents, children, edges = self.get_live()
 
-        # layout constants (half-size, thicker borders)
-        R1, R2 = 220.0, 120.0
-        size_centre = 17.0
-        size_parent = 14.0
-        size_child  = 11.0
-        fm = QFontMetrics(self.font())
-        label_h = fm.height()
-
-        pen_my = QPen(QColor("cyan")); pen_my.setWidthF(4.0)
-        pen_parent = QPen(QColor(0,255,0)); pen_parent.setWidthF(4.0)   # lime
-        pen_child  = QPen(QColor(255,165,0)); pen_child.setWidthF(4.0)  # orange
-        pen_edge   = QPen(t_edge); pen_edge.setWidthF(1.2)
-        brush_transparent = QBrush(Qt.NoBrush)
-
-        pos = {}
-        cx, cy = 0.0, 0.0
-
-        # centre (MYCALL)
-        tri = self._triangle(cx, cy, size_centre)
-        self.scene.addPolygon(tri, pen_my, brush_transparent)
-        titem = self.scene.addText(my); titem.setDefaultTextColor(t_text)
-        tb = titem.boundingRect()
-        titem.setPos(cx - tb.width()/2, cy + size_centre/2 + 6)
-        r_my = size_centre / (3**0.5)
-        pos[my] = (cx, cy, r_my)
+        # layout constants (half-size, thicker borders)
+        R1, R2 = 220.0, 120.0
+        sizes = {'my': 17.0, 'parent': 14.0, 'child': 11.0}
+        fm = QFontMetrics(self.font())
+        label_h = fm.height()
 
-        # parents ring
+        pens = getattr(self, '_pens', None)
+        if pens is None or theme_changed:
+            pen_my = QPen(QColor("cyan")); pen_my.setWidthF(4.0)
+            pen_parent = QPen(QColor(0,255,0)); pen_parent.setWidthF(4.0)   # lime
+            pen_child  = QPen(QColor(255,165,0)); pen_child.setWidthF(4.0)  # orange
+            pen_edge   = QPen(t_edge); pen_edge.setWidthF(1.2)
+            pens = self._pens = {'my': pen_my, 'parent': pen_parent, 'child': pen_child, 'edge': pen_edge}
+        brush_transparent = QBrush(Qt.NoBrush)
+
+        # ---- layout: node key -> (label, role, x, y) ----
+        want = {}
+        cx, cy = 0.0, 0.0
+        want['@MY'] = (my, 'my', cx, cy)
+        want_edges = []
         parent_names = sorted(parents.keys())
         n = max(1, len(parent_names))
         for i, p in enumerate(parent_names):
             ang = (2*math.pi*i)/n
             px = cx + R1*math.cos(ang); py = cy + R1*math.sin(ang)
-            r_src = pos[my][2]; r_dst = size_parent / (3**0.5)
-            draw_edge(cx, cy, px, py, r_src, r_dst, label_h_src=label_h)
-            pt = self._triangle(px, py, size_parent)
-            self.scene.addPolygon(pt, pen_parent, brush_transparent)
-            tt = self.scene.addText(p); tt.setDefaultTextColor(t_text)
-            bb = tt.boundingRect()
-            tt.setPos(px - bb.width()/2, py + size_parent/2 + 6)
-            pos[p] = (px, py, r_dst)
+            want[p] = (p, 'parent', px, py)
+            want_edges.append(('@MY', p))
             kids = sorted(children.get(p, []))
             m = max(1, len(kids))
             for j, c in enumerate(kids):
                 a2 = ang + (2*math.pi*j)/m / 3.0
                 kx = px + R2*math.cos(a2); ky = py + R2*math.sin(a2)
-                r_src = pos[p][2]; r_dst = size_child / (3**0.5)
-                draw_edge(px, py, kx, ky, r_src, r_dst, label_h_src=label_h)
-                kt = self._triangle(kx, ky, size_child)
-                self.scene.addPolygon(kt, pen_child, brush_transparent)
-                tt2 = self.scene.addText(c); tt2.setDefaultTextColor(t_text)
-                bb2 = tt2.boundingRect()
-                tt2.setPos(kx - bb2.width()/2, ky + size_child/2 + 6)
-                pos.setdefault(c, (kx, ky, r_dst))
-
-        # additional edges
+                # a child heard under several parents is drawn under each one
+                want.setdefault(p + '>' + c, (c, 'child', kx, ky))
+                want_edges.append((p, p + '>' + c))
+        # additional edges (parent->child pairs are already covered above)
+        first_key = {}
+        for k, v in want.items():
+            first_key.setdefault(v[0], k)
         for src, dst in edges:
-            if src in pos and dst in pos:
-                x1, y1, _ = pos[src]; x2, y2, _ = pos[dst]
-                r1 = pos[src][2]; r2 = pos[dst][2]
-                draw_edge(x1, y1, x2, y2, r1, r2, label_h_src=label_h)
+            a = first_key.get(src); b = src + '>' + dst if (src + '>' + dst) in want else first_key.get(dst)
+            if a and b and a != b:
+                want_edges.append((a, b))
+
+        # distance/bearing from MYCALL for every station on the map, in one batch
+        gm = getattr(self, 'get_metrics', None)
+        try: metrics = gm({v[0] for v in want.values() if v[1] != 'my'}) if callable(gm) else {}
+        except Exception: metrics = {}
+
+        # ---- nodes ----
+        items = self._node_items
+        layout_changed = want.keys() != items.keys()
+        for k in [k for k in items if k not in want]:
+            poly, txt = items.pop(k)[:2]
+            self.scene.removeItem(poly); self.scene.removeItem(txt)
+        for k, (label, role, x, y) in want.items():
+            size = sizes[role]
+            rec = items.get(k)
+            if rec is not None and rec[2] != role:
+                self.scene.removeItem(rec[0]); self.scene.removeItem(rec[1])
+                rec = None
+            if rec is None:
+                poly = self.scene.addPolygon(self._triangle(0.0, 0.0, size), pens[role], brush_transparent)
+                txt = self.scene.addText(label); txt.setDefaultTextColor(t_text)
+                rec = items[k] = [poly, txt, role, label, None, None]
+            else:
+                if theme_changed:
+                    rec[0].setPen(pens[role]); rec[1].setDefaultTextColor(t_text)
+                if rec[3] != label:
+                    rec[1].setPlainText(label); rec[3] = label; rec[4] = None
+            if rec[4] != (x, y):
+                rec[0].setPos(x, y)
+                bb = rec[1].boundingRect()
+                rec[1].setPos(x - bb.width()/2, y + size/2 + 6)
+                rec[4] = (x, y)
+            if role != 'my':
+                tip = ""
+                if self.get_route_tip is not None:
+                    try: tip = self.get_route_tip(label) or ""
+                    except Exception: tip = ""
+                m = metrics.get(base_callsign(label))
+                if m:
+                    tip = (tip + "\n" if tip else "") + _geo_metric_text(m)
+                if tip != rec[5]:
+                    rec[0].setToolTip(tip); rec[1].setToolTip(tip); rec[5] = tip
+
+        # ---- edges (clipped to avoid icons/labels at endpoints) ----
+        lines = {}
+        for a, b in want_edges:
+            if (a, b) in lines:
+                continue
+            _, ra, ax, ay = want[a]; _, rb, bx, by = want[b]
+            dx, dy = (bx-ax), (by-ay)
+            L = (dx*dx + dy*dy) ** 0.5
+            if L < 1e-6:
+                continue
+            ux, uy = dx / L, dy / L
+            rA = sizes[ra] / (3**0.5); rB = sizes[rb] / (3**0.5)
+            extra_src = (label_h + 6.0) if uy > 0 else 0.0  # if going downward from source, skip label below
+            lines[(a, b)] = (ax + ux * (rA + 2.0 + extra_src), ay + uy * (rA + 2.0 + extra_src),
+                             bx - ux * (rB + 2.0), by - uy * (rB + 2.0))
+        eitems = self._edge_items
+        for k in [k for k in eitems if k not in lines]:
+            self.scene.removeItem(eitems.pop(k)[0])
+        for k, seg in lines.items():
+            rec = eitems.get(k)
+            if rec is None:
+                eitems[k] = [self.scene.addLine(*seg, pens['edge']), seg]
+                continue
+            if theme_changed:
+                rec[0].setPen(pens['edge'])
+            if rec[1] != seg:
+                rec[0].setLine(*seg); rec[1] = seg
 
-        self.reset_view()
+        # auto-fit when nodes come or go, until the user zooms; then keep their view
+        if layout_changed and not getattr(self, '_user_view', False):
+            self.reset_view()
 
 # --------- Theme Manager ---------
 # (Removed duplicate ThemeManager class)
 
-class AckState:
-    def __init__(self, app, ack_id: str, base_text: str, pause_s: int):
-        from PyQt5.QtCore import QTimer
-        self.app = app
-        self.ack_id = ack_id
-        self.base_text = base_text
-        self.pause_s = max(1, int(pause_s))
-        self.max_attempts = 3
-        self.attempts = 0
-        self.done = False
-        self.timer = QTimer()
-        self.timer.setSingleShot(True)
-        self.timer.timeout.connect(self._on_retry)
-        self.echo_texts = set()
-
-    def start(self):
-        self._send_attempt()
-
-    def _send_attempt(self):
-        if self.done: return
-        self.attempts += 1
-        line = f"{self.base_text} (attempt {self.attempts}/3)"
-        if self.app.send_user_text(line):
-            self.echo_texts.add(self._norm(line))
-            import time
-            self.last_tx_time = time.monotonic()
-            self.app._ack_update_ui(self.ack_id, line, status=f"attempt {self.attempts}/3")
-            import random
-            delay = self.pause_s + random.uniform(0.2, 0.7)
-            self.timer.start(int(delay*1000))
-            self.app._diag(f"[ACK] arming retry in {delay:.2f}s for {self.ack_id}")
-        else:
-            self.timer.start(1000)
-
-    def _on_retry(self):
-        if self.done: return
-        if self.attempts < self.max_attempts:
-            self.app._diag(f"[RETRY] {self.ack_id} {self.attempts+1}/3")
-            self._send_attempt()
-        else:
-            self.done = True
-            text = f"{self.base_text} (FAILED after 3/3)"
-            self.app._ack_update_ui(self.ack_id, text, status="failed")
-            self.app._diag(f"[ACK] giving up {self.ack_id} after 3/3")
-
-    def on_ack_received(self):
-        if self.done: return
-        self.done = True
-        self.timer.stop()
-        text = f"{self.base_text} (ACK received {self.ack_id})"
-        self.app._ack_update_ui(self.ack_id, text, status="ack")
-
-    def _norm(self, s: str) -> str:
-        return re.sub(r"[\r\n]+", "", s).strip()
-
 # === Robust Chat Secure Crypto Helpers (AES-256-GCM preferred) ===
 import os, hmac, hashlib, base64
 def _kdf_hkdf_sha256(passphrase: str, salt: bytes, length: int = 32) -> bytes:
@@ -1101,7 +4129,86 @@ class SecurePadDialog(QDialog):
 
 class ChatApp(QMainWindow):
 
-    
+    # Legacy dict view of the link graph: {parent: {'last', 'children': {child: {'last'}}}}.
+    # Reads are cached by LinkGraph until the next change; assigning replaces the graph.
+    @property
+    def _graph_parents(self):
+        lg = self.__dict__.get('link_graph')
+        return lg.to_dict() if lg is not None else {}
+
+    @_graph_parents.setter
+    def _graph_parents(self, value):
+        lg = self.__dict__.get('link_graph')
+        if lg is None:
+            lg = self.link_graph = LinkGraph()
+        lg.load_dict(value if isinstance(value, dict) else {})
+
+    def _on_link_graph_changed(self, ev):
+        '''LinkGraph subscriber: coalesce events and flush once per event-loop turn.'''
+        if getattr(self, '_lg_flush_pending', False):
+            return
+        self._lg_flush_pending = True
+        try:
+            QTimer.singleShot(0, self._link_graph_flush)
+        except Exception:
+            self._link_graph_flush()
+
+    # ---- Routing (LinkRouter over link_graph; table cached until the graph changes) ----
+    def _link_router(self):
+        r = self.__dict__.get('link_router')
+        if r is None or r.graph is not self.link_graph:
+            r = self.link_router = LinkRouter(self.link_graph, quality_fn=self._route_edge_snr)
+        try:
+            r.set_origin(base_callsign(self.mycall_edit.text().strip().upper()))
+        except Exception:
+            pass
+        return r
+
+    def _route_edge_snr(self, src: str, dst: str):
+        '''Mean SNR (dB) over the last ROUTE_MAX_AGE_SEC for src>dst, from Linkmap's quality store.'''
+        st = _rc_link_quality_store(self)
+        if st is None:
+            return None
+        s = st.summary(_RcLinkQuality.key(src, dst), ROUTE_MAX_AGE_SEC)
+        return s['mean'] if s else None
+
+    def _route_next_hop(self, dest: str):
+        '''First hop towards dest, or None if unreachable.'''
+        try:
+            return self._link_router().next_hop(base_callsign((dest or '').strip().upper()))
+        except Exception:
+            return None
+
+    def _route_to(self, dest: str):
+        '''Route (next_hop, cost, hops) to dest, or None.'''
+        try:
+            return self._link_router().route(base_callsign((dest or '').strip().upper()))
+        except Exception:
+            return None
+
+    def _route_tip(self, dest: str) -> str:
+        '''"Route: ME > P1 > X  (2 hops, cost 3.5)" for tooltips, or "".'''
+        try:
+            r = self._route_to(dest)
+            if r is None:
+                return ""
+            path = self._link_router().path(r.dest)
+            return f"Route: {' > '.join(path)}  ({r.hops} hop{'s' if r.hops != 1 else ''}, cost {r.cost:.1f})"
+        except Exception:
+            return ""
+
+    def _link_graph_flush(self):
+        self._lg_flush_pending = False
+        if not getattr(self, '_lg_loading', False):
+            try: self._save_link_graph()
+            except Exception: pass
+        try: self._refresh_beacons_ui()
+        except Exception: pass
+        try:
+            if hasattr(self, 'linkmap') and hasattr(self.linkmap, 'draw_graph'):
+                self.linkmap.draw_graph()
+        except Exception:
+            pass
 
 
 
@@ -1134,7 +4241,8 @@ class ChatApp(QMainWindow):
                 try:
                     with open(src_path, "r", encoding="utf-8") as f:
                         data = json.load(f) or {}
-                        positions = data.get("positions") or {}
+                        # Accept both {"positions": {...}} and the flat store written by _save_positions
+                        positions = data.get("positions") if isinstance(data.get("positions"), dict) else data
                 except Exception:
                     positions = {}
 
@@ -1211,20 +4319,11 @@ class ChatApp(QMainWindow):
                 last_heard = _to_iso(ent.get("last_heard") or ent.get("ts") or ent.get("last_update"))
                 last_update = _to_iso(ent.get("last_update") or ent.get("ts") or ent.get("last_heard"))
                 src = ent.get("src") or ent.get("source") or "beacon"
-                hist = []
                 try:
-                    raw_hist = ent.get("history") or []
-                    if isinstance(raw_hist, list):
-                        for h in raw_hist[-50:]:
-                            if not isinstance(h, dict): continue
-                            try:
-                                hlat = float(h.get("lat")); hlon = float(h.get("lon"))
-                            except Exception:
-                                continue
-                            ht = h.get("t") or h.get("ts") or h.get("time")
-                            hist.append({"t": ht, "lat": hlat, "lon": hlon})
+                    track = ent.get("track") or {}
+                    npts = len(track.get("t") or []) if isinstance(track, dict) else len(ent.get("history") or [])
                 except Exception:
-                    pass
+                    npts = 0
 
                 feats.append({
                     "type": "Feature",
@@ -1236,7 +4335,7 @@ class ChatApp(QMainWindow):
                         "last_heard": last_heard,
                         "last_update": last_update,
                         "source": src,
-                        "history": hist
+                        "track_points": npts
                     }
                 })
 
@@ -1258,6 +4357,17 @@ class ChatApp(QMainWindow):
                 with open(tmp, "w", encoding="utf-8") as f:
                     json.dump(gj, f, ensure_ascii=False)
                 os.replace(tmp, os.path.join(maps_dir, outname))
+
+            # Tracks go to their own file so marker-only map pages keep seeing Points only
+            try:
+                tj = {"type": "FeatureCollection", "features": _pos_tracks_features(positions),
+                      "generated_at": generated_at, "version": version}
+                tmp = os.path.join(maps_dir, "tracks.geojson.tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(tj, f, ensure_ascii=False, separators=(",", ":"))
+                os.replace(tmp, os.path.join(maps_dir, "tracks.geojson"))
+            except Exception as e:
+                diag_log(f"tracks.geojson write failed: {e}")
             return True
         except Exception:
             return False
@@ -1532,56 +4642,9 @@ class ChatApp(QMainWindow):
         return super().showEvent(e)
 
     def _link_graph_prune(self, expiry_sec=3600):
-        '''Prune link graph parents whose last seen timestamp in positions is older than expiry_sec.
-        This removes parent entries from self._graph_parents and persists the link_graph file if changed.'''
+        '''Expire parents/edges not heard for expiry_sec (heap-driven; subscribers persist and redraw).'''
         try:
-            now = int(time.time())
-            pos = getattr(self, '_positions', {}) or {}
-            gp = getattr(self, '_graph_parents', {}) or {}
-            removed = False
-            to_remove = []
-            for parent in list(gp.keys()):
-                p_key = parent
-                # find last_update in positions if present
-                ent = pos.get(p_key) or pos.get(p_key.upper()) or pos.get(p_key.lower()) or {}
-                last = ent.get('last_update')
-                if last is None:
-                    # If there's no position entry for this parent, we treat as stale
-                    to_remove.append(parent)
-                    continue
-                try:
-                    last_ts = int(last)
-                except Exception:
-                    to_remove.append(parent)
-                    continue
-                if last_ts < (now - int(expiry_sec)):
-                    to_remove.append(parent)
-            for p in to_remove:
-                try:
-                    gp.pop(p, None)
-                    removed = True
-                except Exception:
-                    pass
-            if removed:
-                try:
-                    # persist change using existing save routine if available
-                    save_fn = getattr(self, '_save_link_graph', None)
-                    if callable(save_fn):
-                        save_fn()
-                    else:
-                        # fallback: write store/link_graph.json
-                        import json, os
-                        store = os.path.join(os.path.dirname(__file__), 'store')
-                        os.makedirs(store, exist_ok=True)
-                        with open(os.path.join(store, 'link_graph.json'), 'w', encoding='utf-8') as fh:
-                            json.dump({'parents': gp, 'children': gp, 'edges': []}, fh, indent=2)
-                except Exception:
-                    pass
-            # update in-memory
-            try:
-                self._graph_parents = gp
-            except Exception:
-                pass
+            self.link_graph.expire(int(time.time()) - int(expiry_sec))
         except Exception:
             pass
 
@@ -1630,26 +4693,67 @@ class ChatApp(QMainWindow):
             pass
         return (None, None)
 
-    def _metric_from_mycall(self, callsign: str):
-        try:
-            if not callsign:
-                return None
-            my_lat, my_lon = self._my_position()
-            if my_lat is None or my_lon is None:
-                return None
-            st_lat, st_lon = self._station_position(callsign)
-            if st_lat is None or st_lon is None:
-                return None
-            km = _geo_haversine_km(my_lat, my_lon, st_lat, st_lon)
-            mi = km * 0.621371
-            deg = _geo_initial_bearing_deg(my_lat, my_lon, st_lat, st_lon)
-            card = _geo_cardinal16(deg)
-            def _fmt(x): return f"{x:.1f}" if x < 100 else f"{x:.0f}"
-            return {"km": km, "mi": mi, "deg": deg, "card": card,
-                    "km_str": _fmt(km), "mi_str": _fmt(mi),
-                    "deg_str": f"{int(round(deg))%360:03d}"}
-        except Exception:
-            return None
+    def _geo_index(self):
+        '''Grid index over _positions; rebuilt only when _positions is replaced wholesale.'''
+        pos = getattr(self, '_positions', None)
+        if not isinstance(pos, dict):
+            pos = {}
+        if getattr(self, '_geo_idx_src', None) is not pos:
+            idx = _GeoGridIndex()
+            for cs, ent in pos.items():
+                try:
+                    idx.update(cs, float(ent['lat']), float(ent['lon']))
+                except Exception:
+                    continue
+            self._geo_idx = idx
+            self._geo_idx_src = pos
+            self._geo_metric_cache = {}
+        return self._geo_idx
+
+    def _metrics_from_mycall(self, callsigns=None):
+        '''{callsign: metric} for many stations; cache misses are computed in one batch.'''
+        out = {}
+        try:
+            my = self._my_position()
+            if my[0] is None or my[1] is None:
+                return out
+            idx = self._geo_index()
+            cache = self._geo_metric_cache
+            calls = idx.pts.keys() if callsigns is None else [base_callsign(c) for c in callsigns]
+            miss = []
+            for cs in calls:
+                st = idx.pts.get(cs)
+                if st is None:
+                    continue
+                hit = cache.get(cs)
+                if hit is not None and hit[0] == my and hit[1] == st:
+                    out[cs] = hit[2]
+                else:
+                    miss.append((cs, st))
+            km, deg = _geo_metrics_batch(my[0], my[1], [st for _, st in miss])
+            for (cs, st), k, d in zip(miss, km, deg):
+                m = _geo_metric_dict(k, d)
+                cache[cs] = (my, st, m)
+                out[cs] = m
+        except Exception:
+            pass
+        return out
+
+    def _stations_within_km(self, km: float):
+        '''[(km, callsign), ...] within km of MYCALL, nearest first.'''
+        my = self._my_position()
+        if my[0] is None or my[1] is None:
+            return []
+        return self._geo_index().within_km(my[0], my[1], float(km))
+
+    def _stations_nearest(self, n: int = 5):
+        my = self._my_position()
+        if my[0] is None or my[1] is None:
+            return []
+        return self._geo_index().nearest(my[0], my[1], int(n))
+
+    def _stations_in_bbox(self, south, west, north, east):
+        return self._geo_index().bbox(float(south), float(west), float(north), float(east))
     def _apply_tx_color_for_theme(self, theme_name: str = ''):
         try:
             from PyQt5.QtGui import QColor
@@ -1725,15 +4829,17 @@ class ChatApp(QMainWindow):
         except Exception:
             pass
 # ===== File Transfer (Upload → META/OK/PART/END with PING/PONG probes) =====
-    def _file_make_fid(self, width=5):
+    def _file_make_fid(self, width=5, to: str = ''):
+        '''File id: "F" + per-peer sequence id when the target is known, else random.'''
+        peer = base_callsign((to or '').strip().upper())
+        if peer:
+            sp = self._seq_space()
+            fid = 'F' + seq_make_id(sp.next('F>' + peer), peer)
+            sp.save()
+            return fid
         import random, string
         return ''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(width))
 
-    def _file_chunks(self, data: bytes, max_b64_per_line=180):
-        raw = (max_b64_per_line * 3) // 4
-        for i in range(0, len(data), raw):
-            yield data[i:i+raw]
-
     def _get_target_call(self):
         try:
             t = (self.to_edit.text() or "").strip().upper()
@@ -1757,118 +4863,582 @@ class ChatApp(QMainWindow):
             return False
 
     def _send_with_ack(self, payload: str, to: str, ack_id: str):
-        # Step 3: track who is allowed to ACK this id
+        # Step 3: track who is allowed to ACK this id (entry dropped when the ACK manager finishes it)
         try:
             if not hasattr(self, '_pending_outbox'):
                 self._pending_outbox = {}
             self._pending_outbox[ack_id] = {'target': (to or '').strip().upper(), 'ts': _time_ack.monotonic()}
-            # prune >15 minutes
-            for k, v in list(self._pending_outbox.items()):
-                if (_time_ack.monotonic() - v.get('ts', 0)) > 900:
-                    self._pending_outbox.pop(k, None)
         except Exception:
             pass
         msg = f"{payload} [ACK:{ack_id}]"
         try:
-            a = AckState(self, ack_id, f"{to} DE " + (self.mycall_edit.text().strip().upper() if hasattr(self, "mycall_edit") else "MYCALL") + " " + msg, int(getattr(self, "_ack_pause", 12)))
-            if getattr(self, "_ack_states", None) is None:
-                self._ack_states = {}
-            self._ack_states[ack_id] = a
+            a = AckState(self, ack_id, f"{to} DE " + (self.mycall_edit.text().strip().upper() if hasattr(self, "mycall_edit") else "MYCALL") + " " + msg, int(getattr(self, "_ack_pause", 12)), target=to)
             a.start()
         except Exception:
             self._send_protocol_line(msg, to)
 
-    # --- Sender-side: wait for FILE OK and between-part PING/PONG probe ---
-    def _wait_file_ok(self, fid: str, timeout=30):
-        import time
-        self._file_last_ok = ""
-        t0 = time.time()
-        while time.time() - t0 < timeout:
-            # Check flag set by RX on 'FILE OK [FID:fid]'
-            if getattr(self, "_file_last_ok", "") == fid:
-                return True
-            QApplication.processEvents()
-            time.sleep(0.1)
+    # ---- ACK manager (one timer wheel for all in-flight messages) ----
+    def _ack_manager(self):
+        m = self.__dict__.get('ack_mgr')
+        if m is None:
+            m = self.ack_mgr = AckManager()
+            m.rtt = PeerRttTable().load()
+            m.subscribe(self._on_ack_event)
+            self._ack_states = m.states   # in-flight AckStates, same dict
+        return m
+
+    def _on_ack_event(self, kind: str, st):
+        aid = st.ack_id
+        try:
+            if kind == 'attempt':
+                if st.attempts == 1:
+                    try: self._outbox_track(st)
+                    except Exception as e: diag_log(f"outbox add failed: {e}")
+                self._ack_update_ui(aid, st.last_line, status=f"attempt {st.attempts}/{st.max_attempts}")
+                return
+            if kind == 'ack':
+                self._ack_update_ui(aid, f"{st.base_text} (ACK received {aid})", status="ack")
+            else:
+                self._ack_update_ui(aid, f"{st.base_text} (FAILED after {st.attempts}/{st.max_attempts})", status="failed")
+        except Exception:
+            pass
+        # finished: drop the per-id bookkeeping so these maps stay bounded
+        try: self._pending_outbox.pop(aid, None)
+        except Exception: pass
+        try: self._ack_items.pop(aid, None)
+        except Exception: pass
+        try:
+            self.ack_mgr.rtt.save()
+            self._refresh_ack_rtt_label()
+        except Exception:
+            pass
+        try:
+            self._outbox_on_finished(kind, st)
+        except Exception as e:
+            diag_log(f"outbox update failed: {e}")
+
+    # ---- Durable outbox (store-and-forward) ----
+    def _outbox(self):
+        ob = self.__dict__.get('outbox')
+        if ob is None:
+            ob = self.outbox = DurableOutbox().load()
+        return ob
+
+    def _outbox_track(self, st):
+        '''First attempt of a new message: journal it until it is ACKed.'''
+        if st.target and st.ack_id not in self._outbox():
+            self.outbox.add(st.ack_id, base_callsign(st.target), st.base_text)
+
+    def _outbox_on_finished(self, kind: str, st):
+        ob = self._outbox()
+        if st.ack_id not in ob:
+            return
+        dest = ob.get(st.ack_id)['to']
+        if kind == 'ack':
+            ob.ack(st.ack_id)
+            self._outbox_release(dest)   # peer is answering: send the next queued one
+        else:
+            ob.hold(st.ack_id)
+            self._diag(f"[OUTBOX] {st.ack_id} held for {dest} until heard ({len(ob.pending(dest))} queued)")
+
+    def _outbox_release(self, dest: str):
+        '''Start the oldest held message for dest, one at a time (in order).'''
+        ob = self._outbox()
+        if ob.inflight(dest):
+            return False
+        e = ob.next_held(dest)
+        if e is None or not self._serial_is_open():
+            return False
+        ob.mark_sent(e['id'])
+        try:
+            pause = int(getattr(self, 'manual_ack_pause', 12))
+        except Exception:
+            pause = 12
+        self._diag(f"[OUTBOX] releasing {e['id']} to {dest}")
+        AckState(self, e['id'], e['line'], pause, target=dest).start()
+        return True
+
+    def _outbox_peer_heard(self, call: str):
+        dest = base_callsign((call or '').strip().upper())
+        ob = self._outbox()
+        if dest and dest in ob.by_dest:
+            ob.expire()
+            self._outbox_release(dest)
+        if dest and self._file_outgoing():
+            self._file_resume_pending(dest)
+
+    def _outbox_resume(self):
+        '''After (re)opening the port: restart one queued message per destination.'''
+        ob = self._outbox()
+        ob.expire()
+        for dest in list(ob.by_dest):
+            self._outbox_release(dest)
+
+    def _outbox_on_rx(self, line: str):
+        '''Any chat line from a peer releases its queue; an ACK reply ("ACK <id>" or a
+        lone "[ACK:<id>]") settles a running or held message to that peer.'''
+        m = OUTBOX_CHAT_RE.match(line or '')
+        if not m:
+            return
+        frm = base_callsign(m.group(2).upper())
+        ar = OUTBOX_ACK_REPLY_RE.match((m.group(3) or '').strip())
+        if ar:
+            aid = (ar.group(1) or ar.group(2)).upper()
+            st = self._ack_manager().get(aid)
+            if st is not None and base_callsign(st.target) == frm:
+                st.on_ack_received()
+            else:
+                e = self._outbox().get(aid)
+                if e is not None and e['to'] == frm and e['state'] == 'held':
+                    self.outbox.ack(aid)
+        self._outbox_peer_heard(frm)
+
+    def _rx_protocol_line(self, line: str) -> bool:
+        '''Protocol work for one received line: outbox release, auto-relay, FILE frames,
+        message fragments and compressed text. True when the line was handled here (Messages
+        shows what the frame carried, if anything, instead of the frame itself).'''
+        s = (line or '').strip()
+        self._relay_on_rx(re.sub(r"[\r\n]+", "", s))
+        # The relay decision has read hops/ttl; payload parsers below never see the header
+        if '[RLY:' in s:
+            s = RELAY_HDR_RE.sub('', s, count=1).strip()
+        # Store-and-forward: a peer on the air releases its queued messages
+        try:
+            self._outbox_on_rx(s)
+        except Exception:
+            pass
+        m = OUTBOX_CHAT_RE.match(s)
+        if not m:
+            return False
+        to, frm, msg = m.group(1).upper(), m.group(2).upper(), (m.group(3) or '').strip()
+        mine = base_callsign(to) == self._mycall_base()
+        if mine:
+            self._chat_z_rx(frm, msg)
+            self._seq_rx_line(frm, msg)
+        # File transfer frames addressed to us go straight to the file handler
+        if msg.startswith('FILE ') and (mine or (to == 'CQ' and self._file_mc_frame(frm, msg))):
+            return self._rx_handle_file_line(to, frm, msg)
+        if msg.startswith('[FRG:') and mine:
+            return self._rx_handle_frag(to, frm, msg)
+        if mine and (msg.startswith(CHAT_Z_MARK) or msg.startswith('[ZNAK:')):
+            return self._rx_handle_z(to, frm, msg)
         return False
 
-    def _wait_probe_pong(self, fid: str, to: str, timeout=30, interval=3):
-        import time
-        t0 = time.time()
-        tries = 0
-        while time.time() - t0 < timeout:
-            # Send PING
-            self._send_protocol_line(f"FILE PING [FID:{fid}]", to)
-            tries += 1
-            # Wait interval, look for PONG flag
-            t1 = time.time()
-            while time.time() - t1 < interval:
-                if getattr(self, "_file_last_pong", "") == fid:
+    # ---- Long messages: fragments in, whole message out ----
+    def _chat_mtu(self) -> int:
+        '''Message text per frame before a message is fragmented (chat_mtu setting, 0 = off).'''
+        try:
+            return max(0, int(self._settings_get().get('chat_mtu', CHAT_MTU_DEFAULT)))
+        except Exception:
+            return CHAT_MTU_DEFAULT
+
+    def _chat_frag_ok(self, call: str) -> bool:
+        '''Fragments only go to peers that have told us they reassemble them.'''
+        try:
+            return bool(call) and self._chat_z().reassembles(call)
+        except Exception:
+            return False
+
+    def _chat_frags(self) -> 'ChatFragments':
+        cf = self.__dict__.get('chat_frags')
+        if cf is None:
+            cf = self.chat_frags = ChatFragments()
+            self._chat_frag_timers = {}
+        return cf
+
+    def _rx_handle_frag(self, to: str, frm: str, msg: str) -> bool:
+        '''A fragment of a long message to us, or a NEED for fragments of one of ours.'''
+        mn = CHAT_FRAG_NEED_RE.match(msg)
+        if mn:
+            st = self._ack_manager().get(mn.group(1))
+            if st is not None and base_callsign(st.target) == base_callsign(frm) and st._fragments():
+                st.on_need(file_ranges_decode(mn.group(2), len(st._fragments()[1])))
+            return True
+        mf = CHAT_FRAG_RE.match(msg)
+        if not mf:
+            return True
+        cf = self._chat_frags(); cf.expire()
+        mid, k, n = mf.group(1).upper(), int(mf.group(2)), int(mf.group(3))
+        if not cf.add(frm, mid, k, n, mf.group(4), mf.group(5)):
+            self._diag(f"[FRG] {mid} {k}/{n} from {frm}: bad CRC, dropped")
+        text = cf.complete(frm, mid)
+        if text is not None:
+            self._chat_frag_timer(frm, mid).stop()
+            if text.startswith(CHAT_Z_MARK):
+                text = self._chat_z_expand(frm, mid, text)
+                if text is None:
+                    cf.done.pop((frm, mid), None)   # the plain-text resend starts over
                     return True
-                QApplication.processEvents()
-                time.sleep(0.05)
-        return False
+            else:
+                self._chat_z_heard(frm, mid, text)
+            self._send_protocol_line(self._chat_ack_reply(mid), frm)
+            self._append_rx(f"{to} DE {frm} {text} [ACK:{mid}]")
+        elif k == n and not cf.is_done(frm, mid):
+            self._chat_frag_report(frm, mid)
+        else:
+            self._chat_frag_timer(frm, mid).start(CHAT_FRAG_QUIET_MS)
+        return True
+
+    def _chat_frag_timer(self, frm: str, mid: str) -> QTimer:
+        self._chat_frags()
+        t = self._chat_frag_timers.get((frm, mid))
+        if t is None:
+            t = self._chat_frag_timers[(frm, mid)] = QTimer(self)
+            t.setSingleShot(True)
+            t.timeout.connect(lambda f=frm, m=mid: self._chat_frag_report(f, m))
+        return t
+
+    def _chat_frag_report(self, frm: str, mid: str):
+        '''Fragments stopped coming: ask for what is missing (or ACK again if it is all here).'''
+        cf = self._chat_frags()
+        t = self._chat_frag_timers.get((frm, mid))
+        if t is not None:
+            t.stop()
+        if cf.is_done(frm, mid):
+            self._send_protocol_line(self._chat_ack_reply(mid), frm)
+        else:
+            miss = cf.missing(frm, mid)
+            if miss:
+                self._send_protocol_line(f"[FRG:{mid} NEED {file_ranges_encode(miss)}]", frm)
+        if t is not None and (cf.is_done(frm, mid) or not cf.missing(frm, mid)):
+            self._chat_frag_timers.pop((frm, mid), None)
+            t.deleteLater()
+
+    # ---- Compressed chat text (negotiated per peer) ----
+    def _chat_z(self) -> 'ChatCodecPeers':
+        cz = self.__dict__.get('chat_z')
+        if cz is None:
+            cz = self.chat_z = ChatCodecPeers().load()
+        return cz
+
+    def _chat_z_enabled(self) -> bool:
+        try:
+            return bool(self._settings_get().get('chat_compress', True))
+        except Exception:
+            return True
+
+    def _chat_z_tag(self) -> str:
+        return f" {CHAT_Z_TAG if self._chat_z_enabled() else CHAT_Z_TAG_OFF}"
+
+    def _chat_ack_reply(self, mid: str) -> str:
+        return f"[ACK:{mid}]{self._chat_z_tag()}"
+
+    def _chat_z_fleet(self, call: str) -> list:
+        '''Active fleet callsigns when call is one of them (both ends then share the list).'''
+        try:
+            name = (self.fleet.active_fleets or ["Default"])[0]
+            members = sorted({m[:-2] if m.endswith("-*") else m for m in self.fleet.list_members(name)})
+        except Exception:
+            return []
+        return members if base_callsign(call) in members else []
+
+    def _chat_z_wire(self, base_text: str, target: str) -> str:
+        '''base_text with its message compressed for target, when target takes that and it is shorter.'''
+        m = re.match(r'^\s*(\S+)\s+DE\s+(\S+)\s+(.*?)\s*(\[ACK:[0-9A-Z]+\])\s*$', base_text or '', re.I)
+        if not m or not target or not self._chat_z_enabled():
+            return base_text
+        z = self._chat_z().pack(m.group(2), target, m.group(3), self._chat_z_fleet(target))
+        return f"{m.group(1)} DE {m.group(2)} {z} {m.group(4)}" if z else base_text
+
+    def _chat_z_acked(self, st):
+        '''An ACKed message joins the history our next dictionary for that peer is built from.'''
+        m = re.match(r'^\s*\S+\s+DE\s+\S+\s+(.*?)\s*\[ACK:[0-9A-Z]+\]\s*$', st.base_text or '', re.I)
+        if m and st.target and self._chat_z().note_sent(st.target, st.ack_id, m.group(1)):
+            self._chat_z().save()
+
+    def _chat_z_rx(self, frm: str, msg: str):
+        '''A [Z1] tag on an ACK reply from frm: it takes compressed text ([Z0]: fragments only).'''
+        try:
+            mc = CHAT_Z_CAP_RE.match(msg)
+            if mc and self._chat_z().note_support(frm, int(mc.group(1))):
+                self._chat_z().save()
+        except Exception:
+            pass
+
+    def _chat_z_heard(self, frm: str, mid: str, text: str):
+        '''A message from frm that we ACK joins the history frm's dictionary is built from.'''
+        try:
+            if self._chat_z().note_heard(frm, mid, text):
+                self._chat_z().save()
+        except Exception:
+            pass
+
+    def _chat_z_expand(self, frm: str, mid: str, frame: str):
+        '''Text of a compressed message from frm, or None after asking frm for plain text.'''
+        cz = self._chat_z()
+        text = cz.unpack(frm, self._mycall_base(), mid, frame, self._chat_z_fleet(frm))
+        if text is None:
+            self._diag(f"[ZIP] {mid} from {frm}: no matching dictionary, asking for plain text")
+            self._send_protocol_line(f"[ZNAK:{mid}]", frm)
+            return None
+        cz.note_support(frm); cz.note_heard(frm, mid, text); cz.save()
+        return text
+
+    def _rx_handle_z(self, to: str, frm: str, msg: str) -> bool:
+        '''A compressed message to us (shown and ACKed as plain text), or a ZNAK for one of ours.'''
+        mn = CHAT_Z_NAK_RE.match(msg)
+        if mn:
+            st = self._ack_manager().get(mn.group(1))
+            if st is not None and base_callsign(st.target) == base_callsign(frm):
+                self._diag(f"[ZIP] {st.ack_id}: {frm} cannot expand it, resending as plain text")
+                cz = self._chat_z(); cz.note_lite(frm); cz.save()
+                st.on_plain()
+            return True
+        mb = CHAT_Z_BODY_RE.match(msg)
+        if not mb:
+            return False
+        mid = mb.group(2).upper()
+        if any(r[0] == mid for r in self._chat_z().heard.get(base_callsign(frm), [])):
+            self._send_protocol_line(self._chat_ack_reply(mid), frm)   # a retry: our ACK was lost
+            return True
+        text = self._chat_z_expand(frm, mid, mb.group(1))
+        if text is not None:
+            self._send_protocol_line(self._chat_ack_reply(mid), frm)
+            self._append_rx(f"{to} DE {frm} {text} [ACK:{mid}]")
+        return True
+
+    def _refresh_ack_rtt_label(self):
+        '''Manual ACK tab: adaptive timeout summary; per-peer detail in the tooltip.'''
+        lbl = getattr(self, 'ack_rtt_label', None)
+        rtt = getattr(self.__dict__.get('ack_mgr'), 'rtt', None)
+        if lbl is None or rtt is None:
+            return
+        t = rtt.totals()
+        lbl.setText(f"Adaptive RTO: {t['peers']} peers · {t['acks']} acks · "
+                    f"{t['retries']} retries · {t['avoided']} retries avoided")
+        rows = []
+        for call, p in sorted(rtt.peers.items()):
+            if p.srtt is None:
+                rows.append(f"{call}: no samples, {p.fails} failed")
+            else:
+                rows.append(f"{call}: SRTT {p.srtt:.1f}s ±{p.rttvar:.1f}  RTO {p.rto:.1f}s  "
+                            f"({p.samples} samples, {p.retries} retries, {p.avoided} avoided, {p.fails} failed)")
+        lbl.setToolTip("\n".join(rows) or "No ACKs measured yet")
+
+    # --- Sender-side: each transfer is a FileSendJob driven by the FileTransferEngine ---
+    def _file_engine(self) -> 'FileTransferEngine':
+        eng = getattr(self, "_file_eng", None)
+        if eng is None:
+            self._ensure_file_state()
+            eng = self._file_eng = FileTransferEngine(self)
+            eng.progress.connect(self._file_on_progress)
+            eng.finished.connect(self._file_on_finished)
+        return eng
+
+    def send_file_path(self, path: str, resume: dict = None, fleet: list = None):
+        '''Prepare a file and start sending it; returns at once (the FID, or None). The file is
+        hashed and trial-compressed on a FileScanThread and the job starts when that finishes;
+        from then on the engine drives the transfer from RX events and its timer. The size cap is
+        the file_max_kb setting (default 500 KB). resume: a store/file_outgoing.json record; the
+        same FID is offered again and only the parts the receiver reports in FILE NEED are sent.
+        fleet: member callsigns for a multicast; a Target of CQ multicasts to whoever accepts.'''
+        import os
+        self._ensure_file_state()
+        eng = self._file_engine()
+        scans = self.__dict__.setdefault("_file_scans", {})   # fid -> FileScanThread
+        try:
+            to = "CQ" if fleet else ((resume or {}).get("to") or self._get_target_call())
+            if not to:
+                QMessageBox.information(self, "Send File", "Please set a Target/TO callsign first.")
+                return None
+            nbytes = os.path.getsize(path)
+
+            # Sender-side cap (operator policy)
+            cap = self._file_max_bytes()
+            if cap and nbytes > cap:
+                try: self._status(f"File too large: {nbytes} bytes (limit {cap} bytes).")
+                except Exception: pass
+                if not resume:
+                    QMessageBox.warning(self, "Send File", f"File too large: {nbytes} bytes (limit {cap} bytes).")
+                return None
+
+            name = os.path.basename(path)
+            if resume:
+                fid = resume["fid"]
+                if fid in eng.jobs or fid in scans:
+                    return None
+                cmp = resume.get("cmp") or "none"
+                methods = () if cmp == "none" else (cmp,)
+                enc = resume.get("enc") or "b64"
+            else:
+                fid = self._file_make_fid(to=to)
+                methods = ('zlib', 'lzma') if self._file_compress_enabled() else ()
+                enc = self._file_encoding()
+            spool = os.path.join(store_path(FILE_OUTGOING_DIR), fid)
+            os.makedirs(os.path.dirname(spool), exist_ok=True)
+            ctx = {"fid": fid, "to": to, "path": path, "name": name, "enc": enc, "spool": spool,
+                   "resume": resume, "fleet": fleet}
+            th = scans[fid] = FileScanThread(ctx, path, methods, spool)
+            th.done.connect(self._file_scan_done)
+            th.finished.connect(lambda fid=fid: scans.pop(fid, None))   # held until the thread exits
+            th.finished.connect(th.deleteLater)
+            self._file_row(fid, f"↑ {name} → {to} (preparing…)")
+            th.start()
+            return fid
+        except Exception as e:
+            try: self._status(f"File send failed: {e}")
+            except Exception: pass
+            return None
+
+    def _file_scan_done(self, ctx: dict, result, error: str):
+        '''GUI thread: the scan for ctx finished; build the part source and start the job.'''
+        import os
+        fid, name, to, resume, fleet = ctx["fid"], ctx["name"], ctx["to"], ctx["resume"], ctx["fleet"]
+        eng = self._file_engine()
+        parts = None; started = False
+        try:
+            if result is None:
+                raise RuntimeError(error or "scan failed")
+            sha1, nbytes, cmp, ppath = result
+            if resume and sha1 != resume.get("sha1"):
+                self._file_outgoing_drop(fid)
+                try: self._status(f"{name} changed since it was offered — not resuming [FID:{fid}].")
+                except Exception: pass
+                return
+            parts = FilePartSource(ppath, ctx["enc"])
+            if to == "CQ" and not resume:
+                job = FileMulticastJob(self, fid, fleet, ctx["path"], name, nbytes, sha1, cmp, ctx["enc"],
+                                       parts, ctx["spool"], self._file_window_size())
+                to = f"fleet ({len(job.roster)})" if job.roster else "CQ"
+            else:
+                job = FileSendJob(self, fid, to, ctx["path"], name, nbytes, sha1, cmp, ctx["enc"], parts,
+                                  ctx["spool"], self._file_window_size(), resume=bool(resume))
+            self._file_row_label(fid, f"↑ {name} → {to}")
+            eng.start(job); started = True
+        except Exception as e:
+            try: self._status(f"File send failed: {e}")
+            except Exception: pass
+        finally:
+            if not started:
+                self._file_row_label(fid, f"↑ {name} → {to} (not sent)")
+                if parts is not None:
+                    parts.close()
+                for m in ('zlib', 'lzma'):
+                    try: os.remove(f"{ctx['spool']}.{m}")
+                    except Exception: pass
+
+    # --- Transfers list (both directions): one row per FID ---
+    def _file_row(self, fid: str, label: str):
+        rows = self.__dict__.setdefault("_file_rows", {})
+        rows[fid] = label
+        lst = getattr(self, "transfers_list", None)
+        if lst is None:
+            return None
+        for r in range(lst.count()):
+            it = lst.item(r)
+            if it.data(Qt.UserRole) == fid:
+                return it
+        it = QListWidgetItem(f"[{fid}] {label}")
+        it.setData(Qt.UserRole, fid)
+        lst.addItem(it)
+        return it
+
+    def _file_row_label(self, fid: str, label: str):
+        it = self._file_row(fid, label)
+        if it is not None:
+            it.setText(f"[{fid}] {label}")
+
+    def _file_on_progress(self, fid: str, way: str, done: int, total: int, rate: float, eta: float):
+        label = self.__dict__.get("_file_rows", {}).get(fid) or ("↑" if way == "tx" else "↓")
+        it = self._file_row(fid, label)
+        if it is not None:
+            it.setText(f"[{fid}] {label}  {done}/{total} · {rate:.0f} B/s · ETA {fmt_eta(eta)}")
+
+    def _file_on_finished(self, fid: str, way: str, ok: bool, msg: str):
+        label = self.__dict__.get("_file_rows", {}).get(fid) or ("↑" if way == "tx" else "↓")
+        it = self._file_row(fid, label)
+        if it is not None:
+            it.setText(f"[{fid}] {label}  {'done' if ok else 'stopped'} — {msg}")
+            it.setData(Qt.UserRole, None)
+        self.__dict__.get("_file_rows", {}).pop(fid, None)
+        lst = getattr(self, "transfers_list", None)
+        if it is not None and lst is not None:
+            QTimer.singleShot(60000, lambda: lst.row(it) >= 0 and lst.takeItem(lst.row(it)))
+
+    def _file_cancel_selected(self):
+        it = self.transfers_list.currentItem() if hasattr(self, "transfers_list") else None
+        fid = it.data(Qt.UserRole) if it is not None else None
+        if not fid:
+            self._status("No running transfer selected.")
+            return
+        if not self._file_engine().cancel(fid):
+            self._status(f"Transfer [FID:{fid}] is no longer running.")
+
+    def _file_window_size(self) -> int:
+        try:
+            st = self._settings_get()
+            return max(1, min(FILE_WINDOW_MAX, int(st.get('file_window', FILE_WINDOW_DEFAULT))))
+        except Exception:
+            return FILE_WINDOW_DEFAULT
 
-    def send_file_path(self, path: str):
-        '''Upload-only file send with strict accept (FILE OK) + PING/PONG between parts. Sender cap 500 KB.'''
-        import os, hashlib, base64, time
+    def _file_max_bytes(self) -> int:
+        '''Sender size cap from the file_max_kb setting; 0 means no limit.'''
         try:
-            to = self._get_target_call()
-            if not to:
-                QMessageBox.information(self, "Send File", "Please set a Target/TO callsign first.")
-                return False
-            with open(path, "rb") as f:
-                data = f.read()
+            return max(0, int(self._settings_get().get('file_max_kb', FILE_MAX_KB_DEFAULT))) * 1024
+        except Exception:
+            return FILE_MAX_KB_DEFAULT * 1024
 
-            # Sender-side cap
-            MAX_FILE_SIZE = 500 * 1024
-            if len(data) > MAX_FILE_SIZE:
-                try: self._status(f"File too large: {len(data)} bytes (limit {MAX_FILE_SIZE} bytes).")
-                except Exception: pass
-                QMessageBox.warning(self, "Send File", f"File too large: {len(data)} bytes (limit {MAX_FILE_SIZE} bytes).")
-                return False
+    def _file_fec_enabled(self) -> bool:
+        try:
+            return bool(self._settings_get().get('file_fec', True))
+        except Exception:
+            return True
 
-            name = os.path.basename(path)
-            sha1 = hashlib.sha1(data).hexdigest()
-            fid  = self._file_make_fid()
-            parts = list(self._file_chunks(data))
-            N = len(parts)
-
-            # 1) Offer
-            meta = f'FILE META name="{name}" size={len(data)} sha1={sha1} [FID:{fid}]'
-            self._send_protocol_line(meta, to)
-            try: self._status(f"Offered file: {name} ({len(data)} bytes) — waiting for OK…")
-            except Exception: pass
+    def _file_frame_s(self) -> float:
+        '''Airtime of one FILE PART line at the configured on-air rate (air_bps setting).'''
+        try:
+            bps = max(50, int(self._settings_get().get('air_bps', FILE_AIR_BPS_DEFAULT)))
+        except Exception:
+            bps = FILE_AIR_BPS_DEFAULT
+        return (FILE_LINE_CHARS + FILE_LINE_OVERHEAD) * 10.0 / bps
 
-            # 2) Wait for FILE OK
-            if not self._wait_file_ok(fid, timeout=30):
-                try: self._status("File offer declined or timed out.")
-                except Exception: pass
-                return False
+    def _file_round_frames(self, W) -> float:
+        '''Cost of one more SACK round in part-frame times (measured burst-to-SACK wait).'''
+        frame_s = self._file_frame_s()
+        wait_s = W.round_s if W.round_s is not None else 2 * frame_s
+        return 1 + (wait_s + FILE_SACK_QUIET_MS / 1000.0 + W.loss * FILE_SACK_WAIT_S) / frame_s
 
-            # 3) Send parts with inter-chunk PING/PONG
-            for i, chunk in enumerate(parts, start=1):
-                if i > 1:
-                    if not self._wait_probe_pong(fid, to, timeout=30, interval=3):
-                        try: self._status("Receiver unresponsive (no PONG) — aborting file send.")
-                        except Exception: pass
-                        return False
-                b64 = base64.b64encode(chunk).decode("ascii")
-                payload = f'FILE PART {i}/{N} [FID:{fid}] {b64}'
-                ack_id = self._file_make_fid(4)
-                self._send_with_ack(payload, to, ack_id)
-                # brief UI breathing room
-                QApplication.processEvents(); time.sleep(0.05)
-
-            # 4) End
-            end = f'FILE END [FID:{fid}]'
-            self._send_protocol_line(end, to)
-            try: self._status(f"File sent: {name} ({len(data)} bytes) in {N} parts.")
-            except Exception: pass
+    def _file_compress_enabled(self) -> bool:
+        try:
+            return bool(self._settings_get().get('file_compress', True))
+        except Exception:
             return True
-        except Exception as e:
-            try: self._status(f"File send failed: {e}")
-            except Exception: pass
-            return False
+
+    def _file_encoding(self) -> str:
+        '''b64 by default; b85/b91 are denser but need an 8-bit clean, bracket-safe path.'''
+        try:
+            enc = str(self._settings_get().get('file_encoding', 'b64')).lower()
+            return enc if enc in FILE_ENCODINGS else 'b64'
+        except Exception:
+            return 'b64'
+
+    def _file_send_sack(self, fid: str):
+        '''Receiver: report what has arrived for a windowed transfer.'''
+        b = self._file_rx.get(fid)
+        if not b or not b.get("win"):
+            return
+        b["since_sack"] = 0
+        cum, bits = file_sack_encode(b.get("spool") or (), b.get("N") or 0)
+        got = f" got={b.get('got', 0)}" if b.get("fec") else ""
+        b["got"] = 0
+        self._send_protocol_line(f"FILE SACK {cum} {bits:x}{got} [FID:{fid}]", b.get("from", ""))
+
+    def _file_rx_burst_frame(self, fid: str, b: dict):
+        '''Receiver, windowed: SACK after a full burst, or once the channel goes quiet. With FEC
+        the tail burst carries parity after its parts, so there only quiet (or completion) counts.'''
+        sp = b.get("spool"); N = b.get("N") or 0
+        b["since_sack"] = b.get("since_sack", 0) + 1
+        b["got"] = b.get("got", 0) + 1
+        t = b.get("sack_timer")
+        if t is None:
+            t = b["sack_timer"] = QTimer(self)
+            t.setSingleShot(True)
+            t.timeout.connect(lambda f=fid: self._file_send_sack(f))
+        full = b["since_sack"] >= b["win"] and not (b.get("fec") and N - sp.count <= b["win"])
+        if full or sp.count >= N:
+            t.stop(); self._file_send_sack(fid)
+        else:
+            t.start(FILE_SACK_QUIET_MS)
 
     def _on_upload_file_selected(self, path: str):
         return self.send_file_path(path)
@@ -1877,8 +5447,124 @@ class ChatApp(QMainWindow):
     def _ensure_file_state(self):
         if not hasattr(self, "_file_offers"): self._file_offers = {}
         if not hasattr(self, "_file_rx"): self._file_rx = {}
-        if not hasattr(self, "_file_last_ok"): self._file_last_ok = ""
-        if not hasattr(self, "_file_last_pong"): self._file_last_pong = ""
+        if not hasattr(self, "_file_loss"): self._file_loss = {}          # peer -> last measured frame loss
+        if not hasattr(self, "_file_swept"):
+            self._file_swept = True
+            FilePartial.sweep()
+
+    def _file_rx_progress(self, fid: str, b: dict):
+        '''Receiver: note activity and report parts on hand, throughput and ETA.'''
+        import time
+        sp = b.get("spool"); N = b.get("N") or 0
+        if sp is None or not N:
+            return
+        now = time.time(); b["t_last"] = now
+        if "t0" not in b:
+            b["t0"], b["c0"] = now, sp.count
+        moved = sp.count - b["c0"]; dt = max(0.001, now - b["t0"])
+        size = (b.get("meta") or {}).get("size") or 0
+        rate = size * moved / float(N) / dt if moved > 0 else 0.0
+        eta = (N - sp.count) * dt / moved if moved > 0 else -1.0
+        self._file_engine().progress.emit(fid, "rx", sp.count, N, rate, eta)
+
+    def _file_rx_drop(self, fid: str):
+        '''Receiver: forget an offer/transfer in memory (the spool on disk is left alone).'''
+        t = (self._file_rx.get(fid) or {}).get("sack_timer")
+        if t is not None:
+            t.stop(); t.deleteLater()
+        self._file_rx.pop(fid, None)
+        self._file_offers.pop(fid, None)
+        try:
+            for r in range(self.incoming_list.count() - 1, -1, -1):
+                if f"[{fid}]" in (self.incoming_list.item(r).text() or ""):
+                    self.incoming_list.takeItem(r); break
+        except Exception:
+            pass
+
+    def _file_mc_frame(self, frm: str, msg: str) -> bool:
+        '''A FILE frame sent to CQ is ours if it offers a multicast or belongs to one we are in.'''
+        if base_callsign((frm or "").upper()) == self._mycall_base():
+            return False
+        if msg.startswith("FILE META"):
+            return " mc=" in msg
+        mf = re.search(r'\[FID:([0-9A-Z]+)\]', msg)
+        self._ensure_file_state()
+        return bool(mf) and (mf.group(1) in self._file_rx or mf.group(1) in self._file_offers)
+
+    def _file_rx_cancel(self, fid: str, sender_aborted: bool = False) -> bool:
+        '''Receiver: stop an inbound transfer, discard its spool and (unless the sender aborted) tell it FILE NO.'''
+        if fid not in self._file_rx and fid not in self._file_offers:
+            return False
+        b = self._file_rx.get(fid) or {}
+        meta = b.get("meta") or self._file_offers.get(fid) or {}
+        frm = b.get("from") or meta.get("from", "")
+        if not sender_aborted:
+            self._send_protocol_line(f"FILE NO [FID:{fid}]", frm)
+        FilePartial(fid).discard()
+        self._file_rx_drop(fid)
+        msg = f"{meta.get('name', '?')} from {frm}: {'sender' if sender_aborted else 'transfer'} cancelled."
+        self._status(msg)
+        self._file_engine().finished.emit(fid, "rx", False, msg)
+        return True
+
+    def _file_rx_gc(self, now: float):
+        '''Receiver: drop offers nobody answered and transfers that went quiet. A quiet transfer's
+        spool stays on disk, so the sender's next offer resumes it.'''
+        for fid, meta in list(self._file_offers.items()):
+            if fid not in self._file_rx and now - meta.get("t", now) > FILE_OFFER_TTL_S:
+                self._diag(f"[FILE] offer {fid} ({meta.get('name')}) expired")
+                self._file_rx_drop(fid)
+        for fid, b in list(self._file_rx.items()):
+            if now - b.get("t_last", now) > FILE_RX_IDLE_S:
+                name = (b.get("meta") or {}).get("name", "?")
+                self._file_rx_drop(fid)
+                self._file_engine().finished.emit(fid, "rx", False, f"{name}: no parts for {FILE_RX_IDLE_S // 60} min — kept for resume.")
+
+    def _file_outgoing(self) -> dict:
+        '''Unfinished resumable sends: fid -> {path, to, name, sha1, cmp, enc, ts, tries, last}.'''
+        if getattr(self, "_file_out", None) is None:
+            d = load_json(FILE_OUTGOING_FILE)
+            self._file_out = d if isinstance(d, dict) else {}
+        return self._file_out
+
+    def _file_inbox(self) -> 'FileInbox':
+        if getattr(self, "_file_inbox_obj", None) is None:
+            self._file_inbox_obj = FileInbox()
+        return self._file_inbox_obj
+
+    def _file_outgoing_note(self, fid: str, rec: dict):
+        import time
+        out = self._file_outgoing()
+        r = dict(out.get(fid) or {"ts": int(time.time())})
+        r.update(rec); r["tries"] = 0
+        out[fid] = r
+        save_json(FILE_OUTGOING_FILE, out)
+
+    def _file_outgoing_drop(self, fid: str):
+        if self._file_outgoing().pop(fid, None) is not None:
+            save_json(FILE_OUTGOING_FILE, self._file_outgoing())
+
+    def _file_resume_pending(self, dest: str):
+        '''Peer heard again: re-offer the oldest unfinished send to it under the same FID.'''
+        import os, time
+        self._ensure_file_state()
+        if self._file_engine().busy_with(dest):
+            return
+        out = self._file_outgoing(); now = time.time()
+        for fid, r in sorted(out.items(), key=lambda kv: kv[1].get("ts", 0)):
+            if base_callsign(r.get("to", "")) != dest:
+                continue
+            if (now - r.get("ts", 0) > FILE_RESUME_MAX_AGE_S or r.get("tries", 0) >= FILE_RESUME_TRIES
+                    or not os.path.exists(r.get("path", ""))):
+                self._diag(f"[FILE] dropping unfinished send {fid} ({r.get('name')}) to {dest}")
+                self._file_outgoing_drop(fid)
+                continue
+            if now - r.get("last", 0) < FILE_RESUME_GAP_S:
+                return
+            r["tries"] = r.get("tries", 0) + 1; r["last"] = int(now)
+            save_json(FILE_OUTGOING_FILE, out)
+            QTimer.singleShot(0, lambda r=dict(r, fid=fid): self.send_file_path(r["path"], resume=r))
+            return
 
     def _incoming_selected_sid(self):
         it = self.incoming_list.currentItem()
@@ -1891,17 +5577,47 @@ class ChatApp(QMainWindow):
             self._status("No incoming file selected.")
             return
         txt = it.text()
-        m = re.search(r'\[([0-9A-Z]{4,6})\]', txt)
+        m = re.search(r'\[([0-9A-Z]{4,8})\]', txt)
         fid = m.group(1) if m else None
         if not fid or fid not in self._file_offers:
             self._status("Invalid selection.")
             return
         frm = self._file_offers[fid].get("from","")
-        # Send OK back to sender
-        self._send_protocol_line(f"FILE OK [FID:{fid}]", frm)
+        self._file_accept(fid)
         self._status(f"Accepted file [FID:{fid}] from {frm}")
         # Keep in list until END completes
 
+    def _file_accept(self, fid: str) -> int:
+        '''Answer an offer with FILE OK (agreeing to window/codec, resume=1) and open its spool.
+        A re-offer of a transfer already spooled gets FILE NEED first. Returns parts on hand.'''
+        offer = self._file_offers[fid]
+        frm = offer.get("from", "")
+        n = offer.get("parts") or 0
+        chunk = file_offer_chunk(offer)
+        b = self._file_rx.setdefault(fid, {"meta": offer, "N": n, "from": frm})
+        sp = b.get("spool") or FilePartial.open(fid)
+        if (sp is not None and not sp.done and n and sp.n == n and sp.chunk == chunk
+                and all(sp.meta.get(k) == offer.get(k) for k in ("sha1", "size", "cmp", "enc"))):
+            self._send_protocol_line(f"FILE NEED {file_ranges_encode(sp.missing()) or 'none'} [FID:{fid}]", frm)
+        elif n:
+            sp = FilePartial(fid).create(offer, n, chunk)
+        else:
+            sp = None      # no parts= in META: spool opens with the first PART
+        b["spool"] = sp; b["t_last"] = time.time()
+        self._file_row(fid, f"↓ {offer.get('name', '?')} ← {frm}")
+        self._file_engine().wake()
+        # Send OK back to sender (agreeing to a windowed transfer / codec if it was offered)
+        codec = f"cmp={offer['cmp']} enc={offer['enc']} " if offer.get("enc") else ""
+        win = offer.get("win") or 0
+        if win:
+            b["win"] = win = min(win, self._file_window_size())
+            if offer.get("fec") == "xor" and sp is not None:
+                b["fec"] = True; codec += "fec=xor "
+            self._send_protocol_line(f"FILE OK win={win} {codec}resume=1 [FID:{fid}]", frm)
+        else:
+            self._send_protocol_line(f"FILE OK {codec}resume=1 [FID:{fid}]", frm)
+        return sp.count if sp is not None else 0
+
     def _incoming_decline_selected(self):
         self._ensure_file_state()
         it = self.incoming_list.currentItem()
@@ -1909,24 +5625,23 @@ class ChatApp(QMainWindow):
             self._status("No incoming file selected.")
             return
         txt = it.text()
-        m = re.search(r'\[([0-9A-Z]{4,6})\]', txt)
+        m = re.search(r'\[([0-9A-Z]{4,8})\]', txt)
         fid = m.group(1) if m else None
         if not fid or fid not in self._file_offers:
             self._status("Invalid selection.")
             return
         frm = self._file_offers[fid].get("from","")
         self._send_protocol_line(f"FILE NO [FID:{fid}]", frm)
+        FilePartial(fid).discard()
         self._status(f"Declined file [FID:{fid}] from {frm}")
         # Remove from UI and state
-        row = self.incoming_list.row(self.incoming_list.currentItem())
-        self.incoming_list.takeItem(row)
-        try: del self._file_offers[fid]
-        except Exception: pass
+        self._file_rx_drop(fid)
 
     def _incoming_reset_window(self):
         self._ensure_file_state()
-        self.incoming_list.clear()
-        self._file_offers.clear()
+        for fid in list(self._file_offers):
+            if fid not in self._file_rx:
+                self._file_rx_drop(fid)
         self._status("Incoming file window reset.")
 
     def _rx_handle_file_line(self, to: str, frm: str, msg: str) -> bool:
@@ -1942,21 +5657,48 @@ class ChatApp(QMainWindow):
                 mf = re.search(r'\[FID:([0-9A-Z]+)\]', msg)
                 if mf:
                     fid = mf.group(1)
-                    # Reply PONG
+                    # Reply PONG (plus a SACK when a windowed transfer is stalled)
                     self._send_protocol_line(f"FILE PONG [FID:{fid}]", frm)
+                    if (self._file_rx.get(fid) or {}).get("win"):
+                        self._file_send_sack(fid)
                 return True
             if msg.startswith("FILE PONG"):
                 mf = re.search(r'\[FID:([0-9A-Z]+)\]', msg)
                 if mf:
-                    self._file_last_pong = mf.group(1)
+                    self._file_engine().event(mf.group(1), "pong", frm)
                 return True
             if msg.startswith("FILE OK"):
                 mf = re.search(r'\[FID:([0-9A-Z]+)\]', msg)
                 if mf:
-                    self._file_last_ok = mf.group(1)
+                    self._file_engine().event(mf.group(1), "ok", frm, msg)
+                return True
+            if msg.startswith("FILE SACK"):
+                ms = FILE_SACK_RE.search(msg)
+                if ms:
+                    got = int(ms.group(3)) if ms.group(3) is not None else None
+                    self._file_engine().event(ms.group(4), "sack", frm, int(ms.group(1)), int(ms.group(2), 16), got)
+                return True
+            if msg.startswith("FILE NEED"):
+                mn = FILE_NEED_RE.search(msg)
+                if mn:
+                    self._file_engine().event(mn.group(2), "need", frm, mn.group(1))
+                return True
+            if msg.startswith("FILE DONE"):
+                mf = re.search(r'\[FID:([0-9A-Z]+)\]', msg)
+                if mf and not self._file_engine().event(mf.group(1), "done", frm):
+                    self._file_outgoing_drop(mf.group(1))
                 return True
             if msg.startswith("FILE NO"):
-                # Sender can optionally handle this; here we just consume it
+                # Declined: forget any unfinished send under this FID
+                mf = re.search(r'\[FID:([0-9A-Z]+)\]', msg)
+                if mf and not self._file_engine().event(mf.group(1), "no", frm):
+                    self._file_outgoing_drop(mf.group(1))
+                return True
+            if msg.startswith("FILE ABORT"):
+                # Sender gave up: drop the inbound transfer and its spool
+                mf = re.search(r'\[FID:([0-9A-Z]+)\]', msg)
+                if mf:
+                    self._file_rx_cancel(mf.group(1), sender_aborted=True)
                 return True
 
             # From here: META/PART/END
@@ -1971,13 +5713,59 @@ class ChatApp(QMainWindow):
                 msize = re.search(r'size=(\d+)', msg)
                 msha1 = re.search(r'sha1=([0-9a-fA-F]{40})', msg)
                 if mname and msize and msha1:
-                    meta = {"name": os.path.basename(mname.group(1)), "size": int(msize.group(1)), "sha1": msha1.group(1).lower(), "from": frm}
+                    meta = {"name": os.path.basename(mname.group(1)), "size": int(msize.group(1)), "sha1": msha1.group(1).lower(), "from": frm,
+                            "t": time.time()}
+                    mw = FILE_WIN_RE.search(msg); mparts = re.search(r'\bparts=(\d+)', msg)
+                    if mw:
+                        meta["win"] = max(1, min(FILE_WINDOW_MAX, int(mw.group(1))))
+                    if mparts:
+                        meta["parts"] = int(mparts.group(1))
+                    mc = re.search(r'\bcmp=(\w+) enc=(\w+)', msg)
+                    if mc and mc.group(1) in ('none', 'zlib', 'lzma') and mc.group(2) in FILE_ENCODINGS:
+                        meta["cmp"], meta["enc"] = mc.group(1), mc.group(2)
+                        mk = re.search(r'\bchunk=(\d+)', msg)
+                        if mk and 0 < int(mk.group(1)) <= FILE_LINE_CHARS:
+                            meta["chunk"] = int(mk.group(1))
+                        mq = re.search(r'\bfec=xor plen=(\d+)', msg)
+                        if mq:
+                            meta["fec"], meta["plen"] = "xor", int(mq.group(1))
+                    mm = re.search(r'\bmc=([A-Z0-9/,*\-]+)', msg)
+                    if mm:
+                        # multicast: only roster members (or anyone, for mc=*) take part
+                        if mm.group(1) != "*" and self._mycall_base() not in {base_callsign(c) for c in mm.group(1).split(",")}:
+                            return True
+                        meta["mc"] = True
+                    # Content already in the inbox (any name, any sender): "have it", skip the transfer
+                    if self._file_inbox().have(meta["sha1"]) is not None:
+                        held = self._file_inbox().seen(meta["sha1"], meta["name"], frm)
+                        sp = FilePartial.open(fid)
+                        if sp is not None and not sp.done:
+                            sp.discard()
+                        self._send_protocol_line(f"FILE DONE [FID:{fid}]", frm)
+                        self._status(f"{frm} offered {meta['name']} — already in the inbox as {os.path.basename(held)}")
+                        return True
                     self._file_offers[fid] = meta
+                    # Re-offer of something already spooled (or finished): no operator prompt
+                    sp = FilePartial.open(fid)
+                    if sp is not None and sp.meta.get("sha1") == meta["sha1"]:
+                        if sp.done:
+                            self._file_offers.pop(fid, None)
+                            self._send_protocol_line(f"FILE DONE [FID:{fid}]", frm)
+                        else:
+                            have = self._file_accept(fid)
+                            self._status(f"Resuming {meta['name']} from {frm}: {have}/{meta.get('parts', '?')} parts already here")
+                        return True
                     # Add to UI list
                     try:
-                        self.incoming_list.addItem(f"[{fid}] {frm} → {meta['name']} ({meta['size']} B)")
+                        mc = " (multicast)" if meta.get("mc") else ""
+                        self.incoming_list.addItem(f"[{fid}] {frm} → {meta['name']} ({meta['size']} B){mc}")
                     except Exception:
                         pass
+                    self._file_engine().wake()
+                    # a multicast only waits a minute for receivers, so honour auto-accept here
+                    if meta.get("mc") and getattr(self, "auto_accept_files", None) is not None and self.auto_accept_files.isChecked():
+                        self._file_accept(fid)
+                        self._status(f"Auto-accepted multicast file {meta['name']} from {frm}")
                 return True
 
             # Parts
@@ -1987,12 +5775,23 @@ class ChatApp(QMainWindow):
                 mp = re.search(r'FILE PART (\d+)/(\d+)\s+\[FID:[^\]]+\]\s+(.+?)(\s+\[ACK:[0-9A-Za-z]+\])?$', msg)
                 if mp:
                     i = int(mp.group(1)); N = int(mp.group(2)); b64 = mp.group(3).strip()
-                    b = self._file_rx.setdefault(fid, {"meta": self._file_offers.get(fid, {}), "parts": {}, "N": N, "from": frm})
+                    b = self._file_rx.setdefault(fid, {"meta": self._file_offers.get(fid, {}), "N": N, "from": frm})
+                    sp = b.get("spool")
+                    if sp is None and b["meta"]:
+                        sp = b["spool"] = FilePartial(fid).create(b["meta"], N, file_offer_chunk(b["meta"]))
+                    if sp is None or sp.n != N:
+                        return True
+                    b["N"] = N
                     try:
-                        b["parts"][i] = base64.b64decode(b64.encode("ascii"), validate=True)
-                        b["N"] = N
+                        sp.put(i, file_decode_part(b["meta"].get("enc"), b64))
+                        if sp.parity:
+                            sp.fec_rebuild()
                     except Exception:
                         pass
+                    self._file_rx_progress(fid, b)
+                    if b.get("win"):
+                        self._file_rx_burst_frame(fid, b)
+                        return True
                     # If ACK token present, we echo it (so sender's retry engine can stop)
                     mack = re.search(r'\[ACK:([0-9A-Za-z]{4,10})\]', msg)
                     if mack:
@@ -2000,40 +5799,49 @@ class ChatApp(QMainWindow):
                         self._send_protocol_line(f"[ACK:{ack_id}]", frm)
                 return True
 
+            if msg.startswith("FILE FEC"):
+                mq = FILE_FEC_RE.search(msg)
+                b = self._file_rx.get(fid) or {}
+                sp = b.get("spool")
+                if mq and sp is not None and b.get("fec"):
+                    try:
+                        members = sorted(file_ranges_decode(mq.group(1), sp.n))
+                        if members:
+                            sp.fec_add(members, file_decode_part(b["meta"].get("enc"), mq.group(3)))
+                    except Exception:
+                        pass
+                    self._file_rx_progress(fid, b)
+                    self._file_rx_burst_frame(fid, b)
+                return True
+
             if msg.startswith("FILE END"):
                 b = self._file_rx.get(fid, {})
                 meta = b.get("meta") or self._file_offers.get(fid, {})
                 N = b.get("N") or 0
-                if not meta or not N or len(b.get("parts", {})) != N:
+                sp = b.get("spool")
+                if not meta or not N or sp is None:
+                    # already saved (our FILE DONE was lost): say so again
+                    sp = FilePartial.open(fid)
+                    if sp is not None and sp.done:
+                        self._send_protocol_line(f"FILE DONE [FID:{fid}]", frm)
                     return True
-                data = b''.join(b["parts"][i] for i in range(1, N+1))
-                if hashlib.sha1(data).hexdigest().lower() != meta.get("sha1",""):
+                if sp.count < N:
+                    self._send_protocol_line(f"FILE NEED {file_ranges_encode(sp.missing())} [FID:{fid}]", b.get("from") or frm)
                     return True
-                # Save to store/inbox
-                def _rc_store():
-                    try:
-                        base = (os.path.dirname(os.path.abspath(sys.executable)) if getattr(sys, "frozen", False) else os.path.dirname(os.path.abspath(__file__)))
-                        store = os.path.join(base, "store"); os.makedirs(store, exist_ok=True); return store
-                    except Exception:
-                        return "store"
-                inbox = os.path.join(_rc_store(), "inbox"); os.makedirs(inbox, exist_ok=True)
-                out = os.path.join(inbox, meta["name"])
-                basep, ext = os.path.splitext(out); k = 1
-                while os.path.exists(out):
-                    out = f"{basep}({k}){ext}"; k += 1
-                with open(out, "wb") as f:
-                    f.write(data)
+                ok, done_path = sp.complete()
+                if not ok:
+                    # corrupt spool: start over on the next offer
+                    sp.discard(); b.pop("spool", None)
+                    self._send_protocol_line(f"FILE NO [FID:{fid}]", b.get("from") or frm)
+                    self._status(f"File {meta.get('name','?')} from {frm} failed its checksum — discarded.")
+                    return True
+                # Save to store/inbox (content-addressed; a copy we already hold is not stored twice)
+                out = self._file_inbox().add(done_path, meta, b.get("from") or frm)
+                sp.finish()
+                self._send_protocol_line(f"FILE DONE [FID:{fid}]", b.get("from") or frm)
                 # Cleanup + UI
-                try:
-                    if fid in self._file_offers: del self._file_offers[fid]
-                    if fid in self._file_rx: del self._file_rx[fid]
-                except Exception: pass
-                try:
-                    # remove list item
-                    for r in range(self.incoming_list.count()-1, -1, -1):
-                        if f"[{fid}]" in (self.incoming_list.item(r).text() or ""):
-                            self.incoming_list.takeItem(r); break
-                except Exception: pass
+                self._file_rx_drop(fid)
+                self._file_engine().finished.emit(fid, "rx", True, f"saved to {os.path.basename(out)}")
                 self._status(f"Received file from {frm}: {meta.get('name','?')}")
                 return True
 
@@ -2046,21 +5854,34 @@ class ChatApp(QMainWindow):
 
     # ---- Positions store (positions.json) ----
     def _load_positions(self):
+        '''positions.json entries; their tracks go to the packed _pos_tracks, not the dicts.'''
         try:
             d = load_json('positions.json') or {}
             if isinstance(d, dict):
+                tracks = {}
+                for cs, entry in d.items():
+                    if isinstance(entry, dict) and ('track' in entry or 'history' in entry):
+                        tracks[cs] = _PosTrack.from_entry(entry)
+                        entry.pop('track', None); entry.pop('history', None)
+                self._pos_tracks = tracks
                 return d
         except Exception:
             pass
         return {}
 
+    def _positions_for_save(self):
+        '''positions.json shape: each entry with its track serialized from the packed columns.'''
+        tracks = getattr(self, '_pos_tracks', None) or {}
+        out = {}
+        for cs, entry in (getattr(self, '_positions', {}) or {}).items():
+            tr = tracks.get(cs)
+            out[cs] = dict(entry, track=tr.to_json()) if tr is not None and isinstance(entry, dict) else entry
+        return out
+
     def _save_positions(self):
+        self._pos_save_ts = time.time()
         try:
-            save_json('positions.json', getattr(self, '_positions', {}))
-            try:
-                self._mirror_positions_to_geojson_from_store()
-            except Exception:
-                pass
+            save_json('positions.json', self._positions_for_save())
             try:
                 self._mirror_positions_to_geojson_from_store()
             except Exception:
@@ -2068,6 +5889,32 @@ class ChatApp(QMainWindow):
         except Exception:
             pass
 
+    def _save_positions_soon(self):
+        '''Save now, or once POS_SAVE_MIN_SEC has passed since the last save (one pending timer).'''
+        wait = POS_SAVE_MIN_SEC - (time.time() - getattr(self, '_pos_save_ts', 0.0))
+        if wait <= 0:
+            self._save_positions()
+            return
+        if getattr(self, '_pos_save_pending', False):
+            return
+        self._pos_save_pending = True
+        def _fire():
+            self._pos_save_pending = False
+            self._save_positions()
+        try:
+            QTimer.singleShot(int(wait * 1000), _fire)
+        except Exception:
+            _fire()
+
+    def _pos_track(self, cs: str):
+        '''Packed ring-buffer track for cs (empty for a station not seen before).'''
+        if not isinstance(getattr(self, '_pos_tracks', None), dict):
+            self._pos_tracks = {}
+        tr = self._pos_tracks.get(cs)
+        if tr is None:
+            tr = self._pos_tracks[cs] = _PosTrack()
+        return tr
+
     def _positions_upsert(self, callsign: str, lat: float, lon: float, source: str = 'beacon-fixed'):
         try:
             if not callsign:
@@ -2076,15 +5923,18 @@ class ChatApp(QMainWindow):
             lat = float(lat); lon = float(lon)
             now = int(__import__('time').time())
             if not hasattr(self, '_positions') or not isinstance(self._positions, dict):
-                self._positions = {}
+                self._positions = self._load_positions()
             entry = self._positions.get(cs) or {}
-            hist = entry.get('history') or []
-            hist.append({'t': now, 'lat': float(lat), 'lon': float(lon)})
-            if len(hist) > 50:
-                hist = hist[-50:]
-            entry.update({'lat': float(lat), 'lon': float(lon), 'last_update': now, 'source': source, 'history': hist})
+            # Stationary repeats inside the gap window are not recorded; the fix itself always updates
+            self._pos_track(cs).offer(now, lat, lon)
+            entry.update({'lat': float(lat), 'lon': float(lon), 'last_update': now, 'source': source})
             self._positions[cs] = entry
-            self._save_positions()
+            try:
+                if self._geo_index().update(cs, lat, lon):
+                    self._geo_metric_cache.pop(cs, None)
+            except Exception:
+                pass
+            self._save_positions_soon()
         except Exception:
             pass
 
@@ -2100,6 +5950,12 @@ class ChatApp(QMainWindow):
                     if now - last > int(expiry_sec):
                         removed.append(cs)
                         self._positions.pop(cs, None)
+                        getattr(self, '_pos_tracks', {}).pop(cs, None)
+                        try:
+                            self._geo_index().remove(cs)
+                            self._geo_metric_cache.pop(cs, None)
+                        except Exception:
+                            pass
                 except Exception:
                     pass
             if removed:
@@ -2150,19 +6006,8 @@ class ChatApp(QMainWindow):
         except Exception:
             myc = ""
         try:
-            # Parents
-            if hasattr(self, '_graph_parents') and isinstance(self._graph_parents, dict):
-                self._graph_parents.pop(myc, None)
-                for k, v in list(self._graph_parents.items()):
-                    try:
-                        self._graph_parents[k] = [c for c in v if (c or '').upper() != myc]
-                    except Exception:
-                        pass
-            # Save if helper exists
-            try:
-                self._save_link_graph()
-            except Exception:
-                pass
+            if myc:
+                self.link_graph.remove_call(base_callsign(myc))
         except Exception:
             pass
     def _conditional_add_message(self, *args, **kwargs):
@@ -2567,6 +6412,9 @@ class ChatApp(QMainWindow):
         # Sanitize: remove any stray [MON] tags on RX lines
         if isinstance(line, str) and line.startswith('[MON]'):
             line = line.replace('[MON] ', '').replace('[MON]', '')
+        # Relay hop header is transport detail; show the message as originally sent
+        if isinstance(line, str) and '[RLY:' in line:
+            line = RELAY_HDR_RE.sub('', line)
 
         # MESSAGE FILTER ENFORCED
         try:
@@ -2743,6 +6591,13 @@ class ChatApp(QMainWindow):
 
     def _on_serial_thread_line(self, line: str):
 
+        # Outbox release, FILE frames and message fragments (protocol frames stop here)
+        try:
+            if self._rx_protocol_line(line):
+                return
+        except Exception:
+            pass
+
         # PRIORITY: <FROM> DE <TO> <MESSAGE> [ACK nnnn]
         try:
             _s = (line or '').strip()
@@ -2907,38 +6762,6 @@ class ChatApp(QMainWindow):
         except Exception:
             pass
 
-        # --- Auto-Relay (always on, silent) ---
-        try:
-            if " DE " in norm:
-                parts = norm.split(" DE ", 1)
-                if len(parts) >= 2:
-                    target = parts[0].strip().upper()
-                    mycall = self.mycall_edit.text().strip().upper() if hasattr(self, "mycall_edit") else ""
-                    if target and target != mycall:
-                        heard = set()
-                        try:
-                            if hasattr(self, "_graph_parents") and isinstance(self._graph_parents, dict):
-                                heard.update([str(k).upper() for k in self._graph_parents.keys()])
-                                for kids in self._graph_parents.values():
-                                    if isinstance(kids, (list, tuple)):
-                                        heard.update([str(x).upper() for x in kids])
-                        except Exception:
-                            pass
-                        if target in heard:
-                            if not hasattr(self, "_relay_cache"):
-                                self._relay_cache = {}
-                            import time as _time
-                            now = _time.time()
-                            # Purge cache entries older than 30s
-                            self._relay_cache = {k:v for k,v in self._relay_cache.items() if now - v < 30}
-                            if norm not in self._relay_cache:
-                                self._relay_cache[norm] = now
-                                try:
-                                    self.send_user_text(norm)
-                                except Exception:
-                                    pass
-        except Exception:
-            pass
         m = re.search(r"\[ACK:([A-Za-z0-9]{4,10})\]", norm)
         if m:
             aid = m.group(1).upper()
@@ -2971,9 +6794,62 @@ class ChatApp(QMainWindow):
             pass
             self._append_rx(norm)
 
-    def _next_ack_id(self) -> str:
-        import random
-        return f"{random.randint(1, 9999):04d}"
+    def _next_ack_id(self, to: str = '') -> str:
+        '''Next per-peer sequence id for messages to `to` (random 4 digits if no target).'''
+        peer = base_callsign((to or '').strip().upper())
+        if not peer:
+            import random
+            return f"{random.randint(1, 9999):04d}"
+        sp = self._seq_space()
+        busy = self._ack_manager().states
+        ob = self._outbox()
+        while True:
+            aid = seq_make_id(sp.next(peer), peer)
+            if aid not in busy and aid not in ob:
+                break
+        sp.save()
+        return aid
+
+    def _seq_space(self):
+        sp = self.__dict__.get('seq_space')
+        if sp is None:
+            sp = self.seq_space = SeqSpace().load()
+        return sp
+
+    def _seq_rx_note(self, frm: str, ack_id: str):
+        '''Record an incoming sequence id from frm: "new", "dup", "reset" or None (not a sequence id).
+        Gaps are reported on the status bar; the window is saved shortly after.'''
+        try:
+            n = seq_parse_id(ack_id, self._mycall_base())
+            if n is None:
+                return None
+            peer = base_callsign((frm or '').upper())
+            sp = self._seq_space()
+            status, gap = sp.rx_accept(peer, n)
+            if gap:
+                miss = sp.rx[peer].missing(8)
+                try: self._status(f"{gap} message(s) from {peer} missing (seq {', '.join(map(str, miss))})")
+                except Exception: pass
+            if not getattr(self, '_seq_save_pending', False):
+                self._seq_save_pending = True
+                def _flush():
+                    self._seq_save_pending = False
+                    sp.save()
+                QTimer.singleShot(2000, _flush)
+            return status
+        except Exception:
+            return None
+
+    def _seq_rx_line(self, frm: str, msg: str):
+        '''Note the sequence id carried by a message to us: plain, compressed or a fragment
+        of one (every fragment repeats the id, so all but the first count as "dup").'''
+        try:
+            if msg.startswith(('FILE ', '[ZNAK:')) or OUTBOX_ACK_REPLY_RE.match(msg):
+                return None
+            m = CHAT_FRAG_RE.match(msg) or ACK_TAG_RE.search(msg)
+            return self._seq_rx_note(frm, m.group(1)) if m else None
+        except Exception:
+            return None
 
     def _serial_is_open(self):
         try:
@@ -2990,6 +6866,7 @@ class ChatApp(QMainWindow):
                 self.ser.close()
             self.ser = serial.Serial(port=port, baudrate=baud, timeout=0.1, write_timeout=0.5)
             self._status(f'Opened {port} @ {baud} bps'); diag_log(f"[OPEN] port='{port}' baud={baud}")
+            QTimer.singleShot(2000, self._outbox_resume)   # resume messages left unacknowledged
             return True
         except Exception as e:
             QMessageBox.critical(self, 'Serial', f'Failed to open {port}: {e}')
@@ -3032,6 +6909,96 @@ class ChatApp(QMainWindow):
             raise
 
 
+    def _tx_write_line(self, text: str) -> bool:
+        '''Write one line (CR-terminated) and note it for echo suppression; no delay.'''
+        if not self._serial_is_open():
+            self._status('TX blocked: open a COM port first.')
+            try:
+                self._diag('[TX] blocked: serial not open')
+            except Exception:
+                pass
+            return False
+        # remember TX for echo suppression
+        try:
+            _RC_RECENT_TX.note(text)
+        except Exception:
+            pass
+        self._serial_write_text(text + "\r")
+        return True
+
+    def _relay_on_rx(self, norm: str):
+        '''Auto-Relay (relay_enabled setting, off by default): a plain chat line for a
+        station we can reach, heard from someone else, goes back out through the relay
+        gate and the TX queue. Protocol frames and ACK replies are never relayed.'''
+        try:
+            if not getattr(self, '_relay_on', False) or " DE " not in norm:
+                return
+            target = norm.split(" DE ", 1)[0].strip().upper()
+            mycall = self.mycall_edit.text().strip().upper() if hasattr(self, "mycall_edit") else ""
+            m_src = re.match(r'^\S+\s+DE\s+([A-Z0-9/\-]+)', norm, re.I)
+            src = (m_src.group(1).upper() if m_src else "")
+            if not target or target == mycall or base_callsign(src) == base_callsign(mycall):
+                return
+            if not self.link_graph.has_node(base_callsign(target)):
+                return
+            # Only when we are on a path the sender is not: if our best route to the target
+            # starts at the sender, the sender reaches it without us
+            hop = self._route_next_hop(target)
+            if hop is None or hop == base_callsign(src):
+                return
+            gate = self.__dict__.get('_relay_gate')
+            if gate is None:
+                gate = self._relay_gate = RelayGate()
+            plain, hops, ttl, dig = relay_parse(norm)
+            m = OUTBOX_CHAT_RE.match(plain)
+            body = (m.group(3) or '').strip() if m else ''
+            if not body or body.startswith(RELAY_SKIP_PREFIXES) or OUTBOX_ACK_REPLY_RE.match(body):
+                return
+            ttl = int(getattr(self, '_relay_ttl', ttl) or ttl) if hops == 0 else ttl
+            why = gate.check_relay(base_callsign(target), plain, hops, ttl, dig)
+            if not why:
+                out = relay_stamp(plain, hops + 1, ttl, dig) \
+                    if getattr(self, '_relay_header', True) else norm
+                self._tx_enqueue(out)
+            elif why in ('limited', 'loop', 'ttl'):
+                try: self._diag(f'[RELAY] dropped ({why}): {target}')
+                except Exception: pass
+        except Exception:
+            pass
+
+    def _tx_enqueue(self, text: str) -> bool:
+        '''Queue a line for background TX (relays etc.): the RX path never waits on PTT.
+        Lines go out one per TX_QUEUE_GAP_MS from a QTimer.'''
+        q = self.__dict__.get('_tx_queue')
+        if q is None:
+            from collections import deque
+            q = self._tx_queue = deque()
+            self._tx_timer = QTimer(self)
+            self._tx_timer.setSingleShot(True)
+            self._tx_timer.timeout.connect(self._tx_pump)
+        if len(q) >= TX_QUEUE_MAX:
+            try: self._diag(f'[TX] queue full, dropped: {text[:40]}')
+            except Exception: pass
+            return False
+        q.append(text)
+        if not self._tx_timer.isActive():
+            self._tx_timer.start(0)
+        return True
+
+    def _tx_pump(self):
+        q = self.__dict__.get('_tx_queue')
+        if not q:
+            return
+        text = q.popleft()
+        try:
+            if self._tx_write_line(text):
+                self._status('TX sent (queued).')
+        except Exception as e:
+            try: self._status(f'TX error: {e}')
+            except Exception: pass
+        if q:
+            self._tx_timer.start(TX_QUEUE_GAP_MS)
+
     def send_user_text(self, text: str) -> bool:
         '''
         Wire SEND -> PTT by writing a full line to the serial device,
@@ -3039,23 +7006,10 @@ class ChatApp(QMainWindow):
         Returns True if actually written.
         '''
         try:
-            if not self._serial_is_open():
-                self._status('TX blocked: open a COM port first.')
-                try:
-                    self._diag('[TX] blocked: serial not open')
-                except Exception:
-                    pass
-                return False
-
-            # remember TX for echo suppression
-            try:
-                _RC_RECENT_TX.note(text)
-            except Exception:
-                pass
-
             import time
             # Engage PTT: write the line with CR terminator
-            self._serial_write_text(text + "\r")
+            if not self._tx_write_line(text):
+                return False
             self._status('PTT keyed → TX sending...')
             time.sleep(0.2)  # delay before unkey (adjust as needed)
 
@@ -3113,7 +7067,10 @@ class ChatApp(QMainWindow):
         self._messages = []
         self.ser = None
         # Beacon graph live state
-        self._graph_parents = {}
+        self.link_graph = LinkGraph()
+        self.link_graph.subscribe(self._on_link_graph_changed)
+        self.link_router = LinkRouter(self.link_graph, quality_fn=self._route_edge_snr)
+        self._ack_manager()
         self._current_parent_for_children = None
         self._last_beacon_heard_ts = None
 
@@ -3135,13 +7092,16 @@ class ChatApp(QMainWindow):
 
         # Manual ACK tab
         self.ack_tab = QWidget(); self.ack_layout = QHBoxLayout(self.ack_tab); self.ack_layout.setContentsMargins(8,4,8,4)
-        self.ack_layout.addWidget(QLabel("ACK pause (s):"))
+        self.ack_layout.addWidget(QLabel("Initial ACK pause (s):"))
         self.ack_btns = []
         for val in (9,10,11,12,13):
             b = QPushButton(str(val)); b.setCheckable(True)
             b.clicked.connect(lambda _=False, v=val, btn=b: self._set_ack_pause(v, btn))
             self.ack_layout.addWidget(b); self.ack_btns.append(b)
         self.ack_layout.addStretch()
+        self.ack_rtt_label = QLabel("")
+        self.ack_layout.addWidget(self.ack_rtt_label)
+        self._refresh_ack_rtt_label()
         self.tab_widget.addTab(self.ack_tab, "Manual ACK")
 
         # Beacon tab
@@ -3286,42 +7246,14 @@ class ChatApp(QMainWindow):
         v = QVBoxLayout(self.map_left)
         def _get_mycall(): return base_callsign(self.mycall_edit.text()) if hasattr(self,"mycall_edit") else "MYCALL"
         def _get_live():
-            data = load_json("link_graph.json") or {}
-            parents = {}
-            try:
-                if isinstance(data, dict):
-                    if isinstance(data.get("parents"), dict):
-                        parents = data["parents"]
-                    elif isinstance(data.get("graph"), dict):
-                        parents = data["graph"]
-                    elif isinstance(data.get("beacons"), dict):
-                        parents = data["beacons"]
-                    else:
-                        # if flat list, make them direct parents with no children
-                        if isinstance(data.get("nodes"), list):
-                            parents = {str(x): [] for x in data["nodes"] if isinstance(x,(str,))}
-                elif isinstance(data, list):
-                    parents = {str(x): [] for x in data if isinstance(x,(str,))}
-            except Exception:
-                parents = {}
-            # normalize children (accept schemas: list, {"children": {...}}, {"last":ts,"children":{...}})
-            children = {}
-            for p, v in (parents.items() if isinstance(parents, dict) else []):
-                if isinstance(v, (list,tuple)):
-                    children[p] = [str(x) for x in v if isinstance(x,(str,))]
-                elif isinstance(v, dict):
-                    vc = v.get("children") if isinstance(v.get("children"), dict) else {}
-                    children[p] = [str(k) for k in vc.keys() if isinstance(k,(str,))]
-                else:
-                    children[p] = []
-            edges = []
-            for p, kids in children.items():
-                for c in kids:
-                    edges.append((p, c))
-            return parents, children, edges
-        self.linkmap = LinkMapWidget(_get_mycall, _get_live, lambda: self.theme_mgr.current if hasattr(self,'theme_mgr') else {})
+            lg = self.link_graph
+            parents = lg.to_dict()
+            children = {p: lg.children_of(p) for p in parents}
+            return parents, children, list(lg.edges())
+        self.linkmap = LinkMapWidget(_get_mycall, _get_live, lambda: self.theme_mgr.current if hasattr(self,'theme_mgr') else {},
+                                     self._route_tip)
         try:
-            self.linkmap.get_metric = self._metric_from_mycall
+            self.linkmap.get_metrics = self._metrics_from_mycall
         except Exception:
             pass
         self.linkmap_scroll = QScrollArea(self)
@@ -3354,7 +7286,7 @@ class ChatApp(QMainWindow):
             v.addWidget(ctrl, 0)
             def _do_reload_positions():
                 try:
-                    self._load_positions()
+                    self._positions = self._load_positions()
                 except Exception:
                     pass
                 try:
@@ -3377,7 +7309,9 @@ class ChatApp(QMainWindow):
     def _show_main_view(self): self.main_left.show(); self.map_left.hide()
     def _show_map_view(self):
         try:
-            self.linkmap.reset_view()  # avoid heavy refit; just reset
+            # keep the user's zoom if they set one
+            if not getattr(self.linkmap, '_user_view', False):
+                self.linkmap.reset_view()
         except Exception as e:
             try:
                 self._status(f"Map render suppressed: {e}", 5000)
@@ -3543,7 +7477,7 @@ class ChatApp(QMainWindow):
 
     def _ui_file_upload_section(self):
         g = QGroupBox("File Upload")
-        h = QHBoxLayout(g)
+        v = QVBoxLayout(g); h = QHBoxLayout(); v.addLayout(h)
         self.upload_btn = QPushButton("  Upload  "); self.upload_btn.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Preferred)
         self.upload_btn.clicked.connect(self.choose_file_to_send); h.addWidget(self.upload_btn)
         self.file_path_edit = QLineEdit(); self.file_path_edit.setReadOnly(True); h.addWidget(self.file_path_edit)
@@ -3553,7 +7487,13 @@ class ChatApp(QMainWindow):
         except Exception: pass
         self.send_file_btn = QPushButton("  Send File  "); self.send_file_btn.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Preferred)
         self.send_file_btn.clicked.connect(self.send_selected_file); h.addWidget(self.send_file_btn)
+        self.send_fleet_btn = QPushButton("  Send to Fleet  "); self.send_fleet_btn.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Preferred)
+        self.send_fleet_btn.clicked.connect(self.send_selected_file_fleet); h.addWidget(self.send_fleet_btn)
         self.remote_label = QLabel("Remote: —"); h.addWidget(self.remote_label)
+        # running transfers (both directions) with progress; cancel the selected one
+        self.transfers_list = QListWidget(); self.transfers_list.setMaximumHeight(90); v.addWidget(self.transfers_list)
+        tr = QHBoxLayout(); cancel_btn = QPushButton("Cancel Transfer"); cancel_btn.clicked.connect(self._file_cancel_selected)
+        tr.addStretch(1); tr.addWidget(cancel_btn); v.addLayout(tr)
         # left-justify
         wrap2 = QWidget(); hb2 = QHBoxLayout(wrap2); hb2.setContentsMargins(0,0,0,0); hb2.addWidget(g); hb2.addStretch(1)
         self.left_layout.addWidget(wrap2)
@@ -3634,6 +7574,13 @@ class ChatApp(QMainWindow):
         st = load_json("settings.json") or {}
         self.mycall_edit.setText(st.get("mycall",""))
         self.to_edit.setText("")
+        # Auto-Relay (off unless relay_enabled), relay hop header (optional) and hop limit
+        try:
+            self._relay_on = bool(st.get("relay_enabled", False))
+            self._relay_header = bool(st.get("relay_hop_header", True))
+            self._relay_ttl = max(1, min(15, int(st.get("relay_ttl", RELAY_DEFAULT_TTL))))
+        except Exception:
+            self._relay_on, self._relay_header, self._relay_ttl = False, True, RELAY_DEFAULT_TTL
         # scrub legacy target key if present
         if "target" in st:
             try:
@@ -3689,10 +7636,12 @@ class ChatApp(QMainWindow):
             self._serial_baud_default = 38400
 
     def save_settings(self):
-        st = {
+        # keep keys the UI does not edit (relay_enabled, chat_mtu, file_* ...)
+        st = load_json("settings.json") or {}
+        st.update({
             "mycall": self.mycall_edit.text().strip().upper(),
             "beacon_minutes": self.beacon_minutes
-        }
+        })
         st["auto_accept_files"] = bool(self.auto_accept_files.isChecked()) if hasattr(self,"auto_accept_files") else False
         st["theme"] = self.theme_combo.currentText() if hasattr(self,"theme_combo") else "Light"
         # KISS not persisted
@@ -3761,69 +7710,43 @@ class ChatApp(QMainWindow):
         self._enable_beacon(m, immediate=True)
 
     def update_beacons_list(self):
-        # prefer in-memory graph but also accept file-only
-        if getattr(self, '_graph_parents', None):
-            self._refresh_beacons_ui()
-            return
-        data = load_json("link_graph.json") or {}
-        self.beacons_list.clear()
-        parents = data.get("parents") if isinstance(data, dict) else {}
-        if isinstance(parents, dict):
-            for p, kids in sorted(parents.items()):
-                self.beacons_list.addItem(f"..{p}")
-                if isinstance(kids, (list,tuple)):
-                    for k in kids: self.beacons_list.addItem(f"  /{k}")
+        # the in-memory graph is loaded at startup and kept current by beacon RX
+        self._refresh_beacons_ui()
 
     
     # ---- Beacon graph persistence/update ----
     def _load_link_graph(self):
-        '''Load graph from store/link_graph.json; preserve dict schema (parents -> {last, children{...}}).'''
+        '''Load store/link_graph.json into self.link_graph (list or dict parent schema).'''
+        self._lg_loading = True
         try:
-            data = load_json(os.path.join('store','link_graph.json')) or {}
+            data = load_json('link_graph.json') or {}
+            if not data:
+                # older builds wrote to store/store/link_graph.json
+                data = load_json(os.path.join('store', 'link_graph.json')) or {}
             parents = data.get('parents') if isinstance(data, dict) else {}
-            fixed = {}
-            if isinstance(parents, dict):
-                for pk, pv in parents.items():
-                    if isinstance(pv, dict):
-                        fixed[str(pk)] = {
-                            'last': int(pv.get('last', 0)) if isinstance(pv.get('last', 0), int) else pv.get('last', 0),
-                            'children': dict(pv.get('children') or {})
-                        }
-                    elif isinstance(pv, (list, tuple)):
-                        fixed[str(pk)] = {'last': 0, 'children': {str(x): {'last': 0} for x in pv if isinstance(x,(str,))}}
-                    else:
-                        fixed[str(pk)] = {'last': 0, 'children': {}}
-                self._graph_parents = fixed
-            else:
-                self._graph_parents = {}
-            ts = data.get('last_beacon_ts')
+            self.link_graph.load_dict(parents if isinstance(parents, dict) else {})
+            ts = data.get('last_beacon_ts') if isinstance(data, dict) else None
             if ts:
                 try:
                     self._last_beacon_heard_ts = datetime.datetime.fromisoformat(ts)
                 except Exception:
                     self._last_beacon_heard_ts = None
         except Exception:
-            self._graph_parents = {}
-            self._last_beacon_heard_ts = None
-        except Exception:
-            self._graph_parents = {}
             self._last_beacon_heard_ts = None
+        finally:
+            # the flush triggered by the load refreshes UI but must not rewrite the file
+            try:
+                QTimer.singleShot(0, lambda: setattr(self, '_lg_loading', False))
+            except Exception:
+                self._lg_loading = False
 
     def _save_link_graph(self):
         '''Persist current graph to store/link_graph.json (with last_beacon_ts).'''
         try:
-            def _valid_graph(g):
-                if not isinstance(g, dict): return False
-                for pv in g.values():
-                    if not isinstance(pv, dict): return False
-                    ch = pv.get('children', {})
-                    if not isinstance(ch, dict): return False
-                return True
-            graph = self._graph_parents if _valid_graph(getattr(self, '_graph_parents', {})) else {}
-            payload = {"parents": graph}
+            payload = {"parents": self.link_graph.to_dict()}
             if getattr(self, '_last_beacon_heard_ts', None):
                 payload["last_beacon_ts"] = self._last_beacon_heard_ts.isoformat(timespec="seconds")
-            save_json(os.path.join('store','link_graph.json'), payload)
+            save_json('link_graph.json', payload)
         except Exception:
             pass
 
@@ -3842,13 +7765,13 @@ class ChatApp(QMainWindow):
                 myc = ""
             parent_brush = QBrush(QColor(50, 205, 50))   # lime green
             child_brush  = QBrush(QColor(255, 165, 0))   # orange
-            for p, kids in sorted(self._graph_parents.items()):
+            for p in sorted(self.link_graph.parents):
                 if p.upper() == myc:
                     continue
                 itp = QListWidgetItem(p)
                 itp.setForeground(parent_brush)
                 self.beacons_list.addItem(itp)
-                for c in [c for c in kids if (c or '').upper() != myc]:
+                for c in [c for c in self.link_graph.children_of(p) if (c or '').upper() != myc]:
                     itc = QListWidgetItem("  " + c)
                     itc.setForeground(child_brush)
                     self.beacons_list.addItem(itc)
@@ -3865,12 +7788,11 @@ class ChatApp(QMainWindow):
         p = base_callsign(parent_cs)
         if not p:
             return
-        if p not in self._graph_parents:
-            self._graph_parents[p] = []
         self._current_parent_for_children = p
         self._last_beacon_heard_ts = datetime.datetime.now()
-        self._save_link_graph()
-        self._refresh_beacons_ui()
+        self.link_graph.update(p)
+        try: self._outbox_peer_heard(p)
+        except Exception: pass
 
     def _record_child_beacon(self, child_cs: str):
         try:
@@ -3885,11 +7807,8 @@ class ChatApp(QMainWindow):
         c = base_callsign(child_cs)
         if not c:
             return
-        if c not in self._graph_parents.get(p, []):
-            self._graph_parents.setdefault(p, []).append(c)
         self._last_beacon_heard_ts = datetime.datetime.now()
-        self._save_link_graph()
-        self._refresh_beacons_ui()
+        self.link_graph.update(p, [c])
 
     def _scan_for_beacon_line(self, line: str):
         '''Parse one-line beacons: '..PARENT [Lat xx.xxxxx Lon yy.yyyyy|POS:lat,lon] [/CHILD1 [/CHILD2 ...]]'.
@@ -3921,7 +7840,6 @@ class ChatApp(QMainWindow):
             try:
                 if lat is not None and lon is not None:
                     self._positions_upsert(parent, float(lat), float(lon), source='beacon-rx')
-                    self._save_positions()
             except Exception:
                 pass
 
@@ -3932,21 +7850,7 @@ class ChatApp(QMainWindow):
                     self._record_child_beacon(ch.strip().upper())
                 except Exception:
                     pass
-
-            # Refresh UI and map + persist
-            try:
-                self._save_link_graph()
-            except Exception:
-                pass
-            try:
-                self._refresh_beacons_ui()
-            except Exception:
-                pass
-            try:
-                if hasattr(self, 'linkmap') and hasattr(self.linkmap, 'draw_graph'):
-                    self.linkmap.draw_graph()
-            except Exception:
-                pass
+            # Persist, UI and map refresh happen once via the link_graph subscriber
         except Exception:
             pass
 
@@ -3968,16 +7872,10 @@ class ChatApp(QMainWindow):
             if last is None:
                 return
             delta = (now - last).total_seconds() / 60.0
-            if delta > minutes and self._graph_parents:
-                self._graph_parents = {}
+            if delta > minutes and self.link_graph.parents:
                 self._current_parent_for_children = None
                 # do not reset last timestamp; leave it to indicate last activity
-                self._save_link_graph()
-                self._refresh_beacons_ui()
-                try:
-                    if hasattr(self,'linkmap'): self.linkmap.draw_graph()
-                except Exception:
-                    pass
+                self.link_graph.clear()
         except Exception:
             pass
 # ---- Messages storage (store/messages_v1.json) ----
@@ -4064,7 +7962,7 @@ class ChatApp(QMainWindow):
             return
 
         try:
-            ack_id = self._next_ack_id()
+            ack_id = self._next_ack_id(to)
         except Exception:
             # fallback id
             ack_id = "0000"
@@ -4124,9 +8022,7 @@ class ChatApp(QMainWindow):
         except Exception:
             pause = 12
         try:
-            st = AckState(self, ack_id, base_line, pause)
-            self._ack_states[ack_id] = st
-            st.start()
+            AckState(self, ack_id, base_line, pause, target=to).start()
         except Exception as e:
             try:
                 diag_log(f"[ERROR] starting AckState: {type(e).__name__}: {e}")
@@ -4159,7 +8055,7 @@ class ChatApp(QMainWindow):
             except Exception: pass
             return False
         try:
-            ack_id = self._next_ack_id()
+            ack_id = self._next_ack_id(to)
         except Exception:
             ack_id = "0000"
         base_line = f"{to} DE {me} {msg} [ACK:{ack_id}]"
@@ -4206,8 +8102,7 @@ class ChatApp(QMainWindow):
         except Exception:
             pause = 12
         try:
-            st = AckState(self, ack_id, base_line, pause)
-            self._ack_states[ack_id] = st; st.start(); ok = True
+            AckState(self, ack_id, base_line, pause, target=to).start(); ok = True
         except Exception:
             ok = bool(self.send_user_text(base_line))
         try: self._touch_last_tx()
@@ -4304,12 +8199,6 @@ class ChatApp(QMainWindow):
             pass
 
     # ---- Incoming Files (stubs) ----
-    def _incoming_selected_sid(self):
-        it = self.incoming_list.currentItem()
-        return it.text() if it else None
-    def _incoming_accept_selected(self): self._status("Accept (stub)")
-    def _incoming_decline_selected(self): self._status("Decline (stub)")
-    def _incoming_reset_window(self): self.incoming_list.clear(); self._status("Reset window")
 
     # ---- Fleet actions ----
     def _on_active_fleet_changed(self, name):
@@ -4359,8 +8248,20 @@ class ChatApp(QMainWindow):
         if not path:
             QMessageBox.information(self, "Send File", "Please choose a file first.")
             return False
-        ok = self.send_file_path(path)
-        return bool(ok)
+        return bool(self.send_file_path(path))
+
+    def send_selected_file_fleet(self):
+        '''Multicast the chosen file to the members of the active fleet.'''
+        path = getattr(self, "selected_file_path", "")
+        if not path:
+            QMessageBox.information(self, "Send File", "Please choose a file first.")
+            return False
+        name = (self.fleet.active_fleets or ["Default"])[0]
+        members = [m[:-2] if m.endswith("-*") else m for m in self.fleet.list_members(name)]
+        if not members:
+            QMessageBox.information(self, "Send File", f"Fleet '{name}' has no members.")
+            return False
+        return bool(self.send_file_path(path, fleet=members))
 
     # ---- Fixed GPS save ----
     def save_fixed_gps(self):
@@ -4618,7 +8519,10 @@ class ChatApp(QMainWindow):
             my = self._mycall_base()
             if not my or not frm:
                 return False
-            reply = f"{frm} DE {my} ACK {ack_id}"
+            reply = f"{frm} DE {my} ACK {ack_id}{self._chat_z_tag()}"
+            mb = CHAT_Z_BODY_RE.match(msg or "")
+            if mb:
+                self._chat_z_heard(frm, ack_id, mb.group(1))
             try:
                 _ = self.send_user_text(reply)
                 self._status(f"Auto-ACK sent to {frm} ({ack_id})")
@@ -4701,8 +8605,6 @@ class BeaconPane(QWidget):
 
     def refresh(self):
         try:
-            if hasattr(self.owner, "_load_link_graph"):
-                self.owner._load_link_graph()
             gp = getattr(self.owner, "_graph_parents", {}) or {}
             my = self.owner._my_base() if hasattr(self.owner, "_my_base") else "MYCALL"
 
@@ -4794,45 +8696,22 @@ class BeaconPane(QWidget):
 
 # Monkey-patched helpers bound to ChatApp at runtime (avoid editing class body)
 def _rc_link_graph_load(self):
-    d = load_json('link_graph.json') or {}
-    g = d.get('parents') or {}
-    self._graph_parents = g if isinstance(g, dict) else {}
+    ChatApp._load_link_graph(self)
 
 def _rc_link_graph_save(self):
-    d = getattr(self, "_graph_parents", {}) or {}
-    try:
-        # Guard: never wipe an existing file with empty content
-        if not d:
-            p = os.path.join('store', 'link_graph.json') if os.path.isdir('store') else 'link_graph.json'
-            if os.path.exists(p):
-                return
-        save_json('link_graph.json', {"parents": d})
-    except Exception:
-        pass
+    ChatApp._save_link_graph(self)
 
 def _rc_link_graph_update(self, parent: str, children: list, ts: int = None):
     try:
-        import time as _t
         p = _rc_base_callsign(parent)
         if not p: return
-        ts = int(ts or _t.time())
-        gp = getattr(self, "_graph_parents", {})
-        if not isinstance(gp, dict): gp = {}
-        ent = gp.get(p) or {"last": 0, "children": {}}
-        ent["last"] = ts
-        ch = ent.get("children") or {}
-        for c in (children or []):
-            cc = _rc_base_callsign(c)
-            if not cc: continue
-            ce = ch.get(cc) or {"last": 0}
-            ce["last"] = ts
-            ch[cc] = ce
-        ent["children"] = ch
-        gp[p] = ent
-        self._graph_parents = gp
-        _rc_link_graph_save(self)
+        kids = [cc for cc in (_rc_base_callsign(c) for c in (children or [])) if cc]
+        self.link_graph.update(p, kids, ts)
     except Exception:
-        pass
+        return
+    # Hearing a station's beacon releases messages queued for it
+    try: self._outbox_peer_heard(p)
+    except Exception: pass
 
 def _rc_is_fresh(self, ts: int, window: int):
     try:
@@ -4861,6 +8740,45 @@ def _rc_is_parent_linked(self, parent: str) -> bool:
 def _rc_is_station_linked(self, callsign: str) -> bool:
     return _rc_is_parent_linked(self, callsign or '')
 
+# Link quality (SNR history) is written by Linkmap.py into store/link_quality.json
+try:
+    from Linkmap import LinkQualityStore as _RcLinkQuality
+except Exception:
+    _RcLinkQuality = None
+
+def _rc_link_quality_store(self):
+    '''LinkQualityStore from store/link_quality.json, reloaded (and routes invalidated) when the file changes.'''
+    try:
+        if _RcLinkQuality is None:
+            return None
+        path = store_path('link_quality.json')
+        mt = os.path.getmtime(path) if os.path.exists(path) else None
+        cache = getattr(self, '_lq_cache', None)
+        if cache is None or cache[0] != mt:
+            cache = self._lq_cache = (mt, _RcLinkQuality.load(path) if mt else None)
+            r = self.__dict__.get('link_router')
+            if r is not None:
+                r.invalidate()
+        return cache[1]
+    except Exception:
+        return None
+
+def _rc_link_quality_text(self, src: str, dst: str) -> str:
+    '''"  · -7 dB ↓" for edge src>dst over the last hour, or "" if unknown.'''
+    try:
+        st = _rc_link_quality_store(self)
+        if st is None:
+            return ""
+        key = _RcLinkQuality.key(src, dst)
+        s = st.summary(key, 3600)
+        if not s:
+            return ""
+        tr = st.trend(key, 3600)
+        arrow = "" if tr is None or abs(tr) < 2 else (" ↑" if tr > 0 else " ↓")
+        return f"  · {s['mean']:+.0f} dB{arrow}"
+    except Exception:
+        return ""
+
 def _rc_linked_icon_color(self):
     try:
         nm = (getattr(self, "theme_name", "") or "").lower()
@@ -4977,9 +8895,7 @@ def _rc_refresh_beacons_icons(self):
         if lst is None:
             return  # nothing to draw into
 
-        # Ensure graph loaded
-        try: self._load_link_graph()
-        except Exception: pass
+        # In-memory graph (kept current by beacon RX; no disk reload)
         gp = getattr(self, '_graph_parents', {}) or {}
 
         my = self._my_base() if hasattr(self, '_my_base') else 'MYCALL'
@@ -5013,6 +8929,20 @@ def _rc_refresh_beacons_icons(self):
             h, m = divmod(m, 60)
             return f"{h}h {m}m" if h else f"{m}m"
 
+        route_tip = getattr(self, '_route_tip', None) or (lambda call: "")
+        # distance/bearing from MYCALL for every listed station, in one batch
+        try:
+            calls = {p for p, _ in linked + unlinked}
+            calls.update(k for _, ent in linked + unlinked for k in (ent.get('children') or {}))
+            metrics = self._metrics_from_mycall(calls)
+        except Exception:
+            metrics = {}
+
+        def tip(call):
+            t = route_tip(call) or ""
+            m = metrics.get(base_callsign(call))
+            return (t + "\n" if t else "") + _geo_metric_text(m) if m else t
+
         lst.clear()
 
         # Render a group (first linked, then unlinked)
@@ -5020,8 +8950,9 @@ def _rc_refresh_beacons_icons(self):
             for p, ent in group:
                 # parent line
                 icon = "🔗" if linked_flag else "○"
-                it = QListWidgetItem(f"{icon} {p}   · {fmt_age(ent.get('last'))} ago")
+                it = QListWidgetItem(f"{icon} {p}   · {fmt_age(ent.get('last'))} ago{_rc_link_quality_text(self, my, p)}")
                 it.setForeground(QBrush(col_link if linked_flag else col_parent))
+                it.setToolTip(tip(p))
                 lst.addItem(it)
                 # children
                 kids = sorted((ent.get('children') or {}).items(), key=lambda kv: int(kv[1].get('last') or 0), reverse=True)
@@ -5034,8 +8965,9 @@ def _rc_refresh_beacons_icons(self):
                     except Exception:
                         pass
                     prefix = "  🔗 " if child_linked else "     "
-                    kit = QListWidgetItem(f"{prefix}{k}   · {fmt_age(meta.get('last'))} ago")
+                    kit = QListWidgetItem(f"{prefix}{k}   · {fmt_age(meta.get('last'))} ago{_rc_link_quality_text(self, p, k)}")
                     kit.setForeground(QBrush(col_link if child_linked else col_unlk))
+                    kit.setToolTip(tip(k))
                     lst.addItem(kit)
 
         render_group(linked, True)
@@ -5142,6 +9074,18 @@ except Exception:
 
 def main():
     import sys, os, traceback
+    if '--bench-file-encoding' in sys.argv:
+        i = sys.argv.index('--bench-file-encoding')
+        _file_bench_main(sys.argv[i + 1:])
+        return
+    if '--bench-file-fec' in sys.argv:
+        i = sys.argv.index('--bench-file-fec')
+        _file_fec_bench_main(sys.argv[i + 1:])
+        return
+    if '--bench-chat-codec' in sys.argv:
+        i = sys.argv.index('--bench-chat-codec')
+        _chat_codec_bench_main(sys.argv[i + 1:])
+        return
     print('[BOOT] start')
     try:
         print('[BOOT] QApplication')
@@ -6985,6 +10929,13 @@ try:
         if not ack_id or _f22_already_replied(frm_cs, ack_id):
             return
         reply = f"{frm_cs} DE {myc} [ACK:{ack_id}]"
+        try:   # capability tag ([Z1]/[Z0]); the message joins the history for frm's dictionary
+            reply = f"{frm_cs} DE {myc} {self._chat_ack_reply(ack_id)}"
+            mb = CHAT_Z_BODY_RE.match(body.strip())
+            if mb:
+                self._chat_z_heard(frm_cs, ack_id, mb.group(1))
+        except Exception:
+            pass
         try:
             if hasattr(self, 'send_user_text'):
                 self.send_user_text(reply)
@@ -7408,9 +11359,6 @@ try:
     def _f25_link_graph_path():
         return os.path.join(_f25_store_dir(), 'link_graph.json')
 
-    def _f25_positions_path():
-        return os.path.join(_f25_store_dir(), 'positions.json')
-
     def _f25_read_json_safe(path, fallback):
         try:
             if os.path.exists(path):
@@ -7431,18 +11379,11 @@ try:
         # disabled: handled by unified graph updater
         return
 
-    def _f25_update_positions(parent, lat, lon):
+    def _f25_update_positions(self, parent, lat, lon):
+        # same store, tracks and save throttle as the unpatched beacon path
         if lat is None or lon is None:
             return
-        p = _f25_positions_path()
-        data = _f25_read_json_safe(p, {"version": 1, "positions": {}})
-        pos = data.setdefault("positions", {})
-        pos[parent] = {
-            "lat": lat, "lon": lon,
-            "ts": _dt.utcnow().isoformat(timespec='seconds') + 'Z',
-            "src": "beacon"
-        }
-        _f25_write_json_safe(p, data)
+        self._positions_upsert(parent, float(lat), float(lon), source='beacon-rx')
 
     def _f25_update_heartbeat(self, parent, children):
         try:
@@ -7473,13 +11414,11 @@ try:
                 parent, children, lat, lon = parsed
                 try: _f25_update_heartbeat(self, parent, children)
                 except Exception: pass
-                try: self._rc_link_graph_update(parent, children)
-                except Exception: pass
-                try: _f25_update_positions(parent, lat, lon)
+                try: _rc_link_graph_update(self, parent, children)
                 except Exception: pass
                 try: _f25_update_link_graph(parent, children)
                 except Exception: pass
-                try: _f25_update_positions(parent, lat, lon)
+                try: _f25_update_positions(self, parent, lat, lon)
                 except Exception: pass
             return  # never send to Messages
         if callable(_F25_ORIG_RX):
@@ -7513,7 +11452,7 @@ try:
                         except Exception: pass
                         try: _f25_update_link_graph(parent, children)
                         except Exception: pass
-                        try: _f25_update_positions(parent, lat, lon)
+                        try: _f25_update_positions(self_app, parent, lat, lon)
                         except Exception: pass
                     continue  # do not show in Messages
                 # non-beacon lines flow to the pre-existing F17 path
@@ -7604,4 +11543,27 @@ except Exception as _e_inst_rx:
         diag_log(f"F17_INSTANT_RX patch failed: {_e_inst_rx}")
     except Exception:
         pass
-# ======== End F17_INSTANT_RX ========
\ No newline at end of file
+# ======== End F17_INSTANT_RX ========
+
+
+# ======== F27_PROTOCOL_RX: protocol frames first, ahead of the patched RX chain ========
+# The patches above replace ChatApp._on_serial_thread_line without calling the class-body
+# handler, so FILE frames, [FRG:] fragments, compressed text and bare ACKs would never
+# reach _rx_protocol_line. This outermost wrapper hands every line to it first.
+try:
+    _F27_ORIG_RX = getattr(ChatApp, "_on_serial_thread_line", None)
+    def _F27_RX(self, line: str):
+        try:
+            if self._rx_protocol_line(line):
+                return
+        except Exception:
+            pass
+        if callable(_F27_ORIG_RX):
+            return _F27_ORIG_RX(self, line)
+    ChatApp._on_serial_thread_line = _F27_RX
+except Exception as _e_f27:
+    try:
+        diag_log(f"F27 protocol RX hook failed: {_e_f27}")
+    except Exception:
+        pass
+# ======== End F27_PROTOCOL_RX ========
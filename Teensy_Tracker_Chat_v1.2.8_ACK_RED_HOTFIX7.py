@@ -9,12 +9,14 @@ Change:
   the ACK time to arrive for the last try.
 Keeps HOTFIX6:
 - Live RX (no X0/X1 muting), sender-verified ACKs
-- Auto-retry up to 3 attempts with fixed 6s + 0–1s jitter between tries
+- Auto-retry up to 3 attempts, 6s + 0–1s jitter between tries until the
+  peer's ACK round-trip is known; then SRTT + 4*RTTVAR per peer with
+  doubling per retry (kept in peer_rtt.json beside this script)
 - Mandatory ACK IDs, green→red on ACK, auto-ACK of inbound [ACK:ID]
 - Console filtering, heartbeat list, GPS SEND, crash guards
 """
 
-import sys, re, time, os, math, tempfile, traceback, random
+import sys, re, time, os, math, tempfile, traceback, random, json
 from collections import deque
 from datetime import datetime
 from PyQt5 import QtCore, QtGui, QtWidgets
@@ -192,6 +194,135 @@ def _to_base36(n: int, width: int = 4) -> str:
         s = digits[r] + s
     return s.rjust(width, '0')
 
+class TimerWheel:
+    """Hashed timer wheel: schedule()/cancel() are O(1) and one periodic tick calls
+    advance(), so pending retries don't each need their own QTimer."""
+    def __init__(self, tick_s: float = 0.25, slots: int = 256):
+        self.tick_s = float(tick_s)
+        self.n = int(slots)
+        self._slots = [dict() for _ in range(self.n)]  # key -> (due tick, fn)
+        self._where = {}                               # key -> slot index
+        self._t0 = time.monotonic()
+        self._cur = 0
+
+    def _tick_at(self, now=None):
+        return int(((time.monotonic() if now is None else now) - self._t0) / self.tick_s)
+
+    def __len__(self):
+        return len(self._where)
+
+    def schedule(self, key, delay_s: float, fn):
+        """Call fn(key) after delay_s, replacing any earlier deadline for key."""
+        self.cancel(key)
+        if not self._where:
+            self._cur = self._tick_at()
+        due = max(self._cur + 1, self._tick_at() + max(1, int(math.ceil(float(delay_s) / self.tick_s))))
+        i = due % self.n
+        self._slots[i][key] = (due, fn)
+        self._where[key] = i
+
+    def cancel(self, key):
+        i = self._where.pop(key, None)
+        if i is not None:
+            self._slots[i].pop(key, None)
+
+    def clear(self):
+        for s in self._slots:
+            s.clear()
+        self._where.clear()
+
+    def advance(self):
+        target = self._tick_at()
+        fired = []
+        for t in range(self._cur + 1, self._cur + 1 + min(target - self._cur, self.n)):
+            slot = self._slots[t % self.n]
+            for k in [k for k, (due, _) in slot.items() if due <= target]:
+                fired.append((k, slot.pop(k)[1]))
+                self._where.pop(k, None)
+        self._cur = max(self._cur, target)
+        for k, fn in fired:
+            try:
+                fn(k)
+            except Exception:
+                traceback.print_exc()
+        return len(fired)
+
+RTO_MIN_S = 4.0
+RTO_MAX_S = 60.0
+RTO_DEFAULT_S = 6.0
+PEER_RTT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "peer_rtt.json")
+
+class PeerRttTable:
+    """Per-peer SRTT/RTTVAR (RFC 6298) from first-attempt ACK round trips; retransmitted
+    messages are not sampled (Karn). Counts retries and retries avoided vs the fixed 6s."""
+    def __init__(self, path: str = PEER_RTT_PATH):
+        self.path = path
+        self.peers = {}   # CALL -> {srtt, rttvar, rto, samples, acks, retries, avoided, fails}
+
+    def _peer(self, call):
+        call = (call or "").upper().split("-")[0]
+        return self.peers.setdefault(call, {"srtt": None, "rttvar": None, "rto": None, "samples": 0,
+                                            "acks": 0, "retries": 0, "avoided": 0, "fails": 0})
+
+    def retry_delay(self, call, attempt: int) -> float:
+        """Fixed RTO_DEFAULT_S until the peer has an RTT sample; then its RTO, doubled per retry."""
+        p = self._peer(call)
+        if not p["rto"]:
+            return RTO_DEFAULT_S
+        return min(RTO_MAX_S, p["rto"] * (2 ** max(0, int(attempt) - 1)))
+
+    def note_ack(self, call, attempts: int, rtt: float):
+        p = self._peer(call)
+        p["acks"] += 1
+        if attempts != 1:
+            return
+        rtt = max(0.0, float(rtt))
+        if p["srtt"] is None:
+            p["srtt"], p["rttvar"] = rtt, rtt / 2.0
+        else:
+            p["rttvar"] = 0.75 * p["rttvar"] + 0.25 * abs(p["srtt"] - rtt)
+            p["srtt"] = 0.875 * p["srtt"] + 0.125 * rtt
+        p["rto"] = min(RTO_MAX_S, max(RTO_MIN_S, p["srtt"] + 4.0 * p["rttvar"]))
+        p["samples"] += 1
+        if rtt > RTO_DEFAULT_S + 0.5:
+            p["avoided"] += 1   # the fixed timer would have retransmitted
+
+    def note_retry(self, call):
+        self._peer(call)["retries"] += 1
+
+    def note_fail(self, call):
+        p = self._peer(call)
+        p["fails"] += 1
+        if p["rto"]:
+            p["rto"] = min(RTO_MAX_S, p["rto"] * 2.0)
+
+    def totals(self):
+        t = {"retries": 0, "avoided": 0}
+        for p in self.peers.values():
+            t["retries"] += p["retries"]; t["avoided"] += p["avoided"]
+        return t
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                d = json.load(f)
+            if isinstance(d, dict):
+                for k, v in d.items():
+                    if isinstance(v, dict):
+                        self._peer(k).update(v)
+        except Exception:
+            pass
+        return self
+
+    def save(self):
+        try:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.peers, f, indent=1)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"[peer_rtt] save failed: {e!r}")
+
 class UppercaseLineEdit(QLineEdit):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -281,7 +412,11 @@ class ChatApp(QMainWindow):
         self.ack_counter = 1
         self.chat_items = []  # newest first
         self.sent_by_ack = {} # ack_id -> item dict
-        self.retry_timers = {} # ack_id -> QTimer
+        self.retry_wheel = TimerWheel(0.25)  # ack_id -> pending retry/fail deadline
+        self.retry_tick = QTimer(self)
+        self.retry_tick.setInterval(250)
+        self.retry_tick.timeout.connect(self._retry_wheel_tick)
+        self.peer_rtt = PeerRttTable().load()
         self.auto_ack_enabled = True
 
         # diagnostic log (silent)
@@ -693,13 +828,9 @@ class ChatApp(QMainWindow):
                 self.ser = None
             self.beacon_timer.stop()
         finally:
-            # Stop and clear any retry timers
-            for tid in list(self.retry_timers.values()):
-                try:
-                    tid.stop()
-                except Exception:
-                    pass
-            self.retry_timers.clear()
+            # Stop and clear any pending retries
+            self.retry_wheel.clear()
+            self.retry_tick.stop()
             self.connect_btn.setText("Connect")
             self.connect_btn.setEnabled(True)
             self.disconnect_btn.setEnabled(False)
@@ -998,6 +1129,7 @@ class ChatApp(QMainWindow):
             "to": (to or "").upper(),
             "frm": (frm or "").upper(),
             "attempt": 1 if (kind == "sent" and ack_id) else None,
+            "tx0": time.monotonic(),
             "max_attempts": 3 if (kind == "sent" and ack_id) else None,
             "failed": False,
         }
@@ -1042,18 +1174,21 @@ class ChatApp(QMainWindow):
         ack_id = (ack_id or "").upper()
         item = self.sent_by_ack.get(ack_id)
         if item and not item.get("ack"):
+            if not item.get("failed"):
+                self.peer_rtt.note_ack(item.get("to"), item.get("attempt") or 1,
+                                       time.monotonic() - item.get("tx0", time.monotonic()))
+                self.peer_rtt.save()
             item["ack"] = True
             item["failed"] = False
-            # cancel retry timer if any
-            t = self.retry_timers.pop(ack_id, None)
-            if t:
-                try: t.stop()
-                except Exception: pass
+            # cancel pending retry if any
+            self.retry_wheel.cancel(ack_id)
             self._rebuild_chat_view()
+            t = self.peer_rtt.totals()
+            stats = f" (retries sent {t['retries']}, avoided {t['avoided']})"
             if from_callsign:
-                self.status_label.setText(f"ACK {ack_id} verified from {from_callsign}.")
+                self.status_label.setText(f"ACK {ack_id} verified from {from_callsign}.{stats}")
             else:
-                self.status_label.setText(f"ACK {ack_id} verified.")
+                self.status_label.setText(f"ACK {ack_id} verified.{stats}")
         else:
             self.status_label.setText(f"ACK {ack_id} received (no matching pending message).")
 
@@ -1066,31 +1201,27 @@ class ChatApp(QMainWindow):
         a = item.get("attempt") or 1
         m = item.get("max_attempts") or 3
 
-        delay_ms = int(6000 + random.random()*1000)
-
-        # Stop any old timer
-        old = self.retry_timers.get(ack_id)
-        if old:
-            try: old.stop()
-            except Exception: pass
-
-        timer = QTimer(self)
-        timer.setSingleShot(True)
-        timer.setInterval(delay_ms)
+        delay_ms = int(self.peer_rtt.retry_delay(item.get("to"), a) * 1000 + random.random()*1000)
 
+        # (schedule() replaces any earlier deadline for this ack_id)
         if a < m:
             # schedule next resend
-            timer.timeout.connect(lambda aid=ack_id: self._retry_send(aid))
+            self.retry_wheel.schedule(ack_id, delay_ms / 1000.0, self._retry_send)
             next_attempt = a + 1
             self.status_label.setText(f"Waiting for ACK {ack_id}… scheduling retry {next_attempt}/{m} in {delay_ms//1000}s.")
         else:
             # a == m -> we already transmitted final attempt; schedule a final wait before fail
-            timer.timeout.connect(lambda aid=ack_id: self._final_fail(aid))
+            self.retry_wheel.schedule(ack_id, delay_ms / 1000.0, self._final_fail)
             self.status_label.setText(f"Waiting for ACK {ack_id} after attempt {a}/{m}… final wait {delay_ms//1000}s.")
 
-        self.retry_timers[ack_id] = timer
         self._rebuild_chat_view()
-        timer.start()
+        if not self.retry_tick.isActive():
+            self.retry_tick.start()
+
+    def _retry_wheel_tick(self):
+        self.retry_wheel.advance()
+        if not len(self.retry_wheel):
+            self.retry_tick.stop()
 
     def _retry_send(self, ack_id: str):
         item = self.sent_by_ack.get(ack_id)
@@ -1107,6 +1238,7 @@ class ChatApp(QMainWindow):
         self.recent_sent.append({"full": _norm(line), "msg": _norm(_extract_msg_only(line)), "ts": time.time()})
         # bump attempt count
         item["attempt"] = a + 1
+        self.peer_rtt.note_retry(item.get("to"))
         self._rebuild_chat_view()
         # schedule next (either another resend or final wait)
         self._schedule_retry(ack_id)
@@ -1116,13 +1248,14 @@ class ChatApp(QMainWindow):
         if not item or item.get("ack"):
             return
         item["failed"] = True
-        t = self.retry_timers.pop(ack_id, None)
-        if t:
-            try: t.stop()
-            except Exception: pass
+        self.retry_wheel.cancel(ack_id)
+        self.peer_rtt.note_fail(item.get("to"))
+        self.peer_rtt.save()
         self._rebuild_chat_view()
         m = item.get("max_attempts") or 3
-        self.status_label.setText(f"No ACK {ack_id} after {m} attempts.")
+        t = self.peer_rtt.totals()
+        self.status_label.setText(f"No ACK {ack_id} after {m} attempts. "
+                                  f"(retries sent {t['retries']}, avoided {t['avoided']})")
 
     # -------- TX high-level --------
     def send_user_text(self, text: str) -> bool:
@@ -1267,11 +1400,9 @@ class ChatApp(QMainWindow):
         self.recv_text.clear()
         self.chat_items.clear()
         self.sent_by_ack.clear()
-        # stop timers too
-        for t in list(self.retry_timers.values()):
-            try: t.stop()
-            except Exception: pass
-        self.retry_timers.clear()
+        # drop pending retries too
+        self.retry_wheel.clear()
+        self.retry_tick.stop()
         self.status_label.setText("Receive window cleared.")
 
     # -------- Device helpers --------
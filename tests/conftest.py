@@ -0,0 +1,20 @@
+import importlib.util
+import os
+import shutil
+
+import pytest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Robust_Chat_v1.6.py")
+
+
+@pytest.fixture(scope="session")
+def rc(tmp_path_factory):
+    '''Robust_Chat_v1.6.py imported as a module, with every RX patch installed. It runs from
+    a scratch copy because the app keeps its logs and store/ next to the script.'''
+    pytest.importorskip("PyQt5")
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    app = shutil.copy(APP, tmp_path_factory.mktemp("app"))
+    spec = importlib.util.spec_from_file_location("robust_chat_v1_6", app)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
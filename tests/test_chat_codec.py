@@ -0,0 +1,102 @@
+import pytest
+
+_BORROWED = ('_rx_protocol_line', '_chat_z', '_chat_z_enabled', '_chat_z_tag', '_chat_ack_reply',
+             '_chat_z_fleet', '_chat_z_rx', '_chat_z_heard', '_chat_z_expand', '_rx_handle_z',
+             '_seq_rx_line', '_seq_rx_note', '_seq_space')
+
+
+@pytest.fixture
+def station(rc, monkeypatch):
+    store = {}
+    monkeypatch.setattr(rc, 'load_json', lambda name: store.get(name, {}))
+    monkeypatch.setattr(rc, 'save_json', lambda name, data: store.__setitem__(name, data))
+    monkeypatch.setattr(rc.QTimer, 'singleShot', staticmethod(lambda ms, fn: None))
+
+    class Station:
+        '''Just enough of a ChatApp for the RX protocol path.'''
+        def __init__(self, call):
+            self.call = call
+            self.tx = []
+            self.shown = []
+
+        def _mycall_base(self):
+            return self.call
+
+        def _settings_get(self):
+            return {}
+
+        def _outbox_on_rx(self, line):
+            pass
+
+        def _relay_on_rx(self, line):
+            pass
+
+        def _send_protocol_line(self, payload, to):
+            self.tx.append(f"{to} DE {self.call} {payload}")
+            return True
+
+        def _append_rx(self, line):
+            self.shown.append(line)
+
+        def _diag(self, msg):
+            pass
+
+        def _status(self, msg):
+            self.status = msg
+
+    for name in _BORROWED:
+        setattr(Station, name, getattr(rc.ChatApp, name))
+    return Station
+
+
+def test_compressed_text_is_expanded_and_acked_on_the_live_chain(rc, station):
+    rx = station("K1ABC")
+    text = "Good morning all stations, net control check in please"
+    peers = rc.ChatCodecPeers()
+    peers.note_support("K1ABC")
+    z = peers.pack("N0CALL", "K1ABC", text)
+    assert z and len(z) < len(text)
+    rc.ChatApp._on_serial_thread_line(rx, f"K1ABC DE N0CALL {z} [ACK:00B1] (attempt 1/3)")
+    assert rx.shown == [f"K1ABC DE N0CALL {text} [ACK:00B1]"]
+    assert rx.tx == ["N0CALL DE K1ABC [ACK:00B1] [Z1]"]
+
+
+def test_unknown_dictionary_asks_for_plain_text(rc, station):
+    rx = station("K1ABC")
+    peers = rc.ChatCodecPeers()
+    peers.note_support("K1ABC")
+    peers.note_sent("K1ABC", "0001", "a history the receiver never saw")
+    z = peers.pack("N0CALL", "K1ABC", "Meet at the repeater at 1900 local, bring the antenna analyzer")
+    rc.ChatApp._on_serial_thread_line(rx, f"K1ABC DE N0CALL {z} [ACK:00B2] (attempt 1/3)")
+    assert rx.shown == []
+    assert rx.tx == ["N0CALL DE K1ABC [ZNAK:00B2]"]
+
+
+def test_capability_tag_on_an_ack_reply_is_learned(rc, station):
+    me = station("N0CALL")
+    rc.ChatApp._on_serial_thread_line(me, "N0CALL DE K1ABC [ACK:00B3] [Z1]")
+    assert me._chat_z().supports("K1ABC")
+    rc.ChatApp._on_serial_thread_line(me, "N0CALL DE W2XYZ ACK 00B4 [Z0]")
+    assert me._chat_z().reassembles("W2XYZ") and not me._chat_z().supports("W2XYZ")
+
+
+def test_received_sequence_ids_are_recorded_on_the_live_chain(rc, station):
+    rx = station("K1ABC")
+    for seq in (1, 2, 2, 5):
+        aid = rc.seq_make_id(seq, "K1ABC")
+        rc.ChatApp._on_serial_thread_line(rx, f"K1ABC DE N0CALL hello {seq} [ACK:{aid}] (attempt 1/3)")
+    win = rx._seq_space().rx["N0CALL"]
+    assert win.cumulative() == 2
+    assert win.missing(8) == [3, 4]
+    assert "missing" in rx.status
+
+
+def test_relay_header_is_stripped_before_the_payload_parsers(rc, station):
+    rx = station("K1ABC")
+    text = "Good morning all stations, net control check in please"
+    peers = rc.ChatCodecPeers()
+    peers.note_support("K1ABC")
+    z = peers.pack("N0CALL", "K1ABC", text)
+    plain, _, ttl, dig = rc.relay_parse(f"K1ABC DE N0CALL {z} [ACK:00B5] (attempt 1/3)")
+    rc.ChatApp._on_serial_thread_line(rx, rc.relay_stamp(plain, 1, ttl, dig))
+    assert rx.shown == [f"K1ABC DE N0CALL {text} [ACK:00B5]"]
@@ -0,0 +1,32 @@
+class _App:
+    def __init__(self, rc, peers=()):
+        self.cz = rc.ChatCodecPeers()
+        for call, level in peers:
+            self.cz.note_support(call, level)
+        self.sent = []
+
+    def _chat_mtu(self):
+        return 20
+
+    def _chat_z_wire(self, base_text, target):
+        return base_text
+
+    def _chat_frag_ok(self, call):
+        return self.cz.reassembles(call)
+
+
+LONG = "K1ABC DE N0CALL this message is well over twenty characters long [ACK:00A1]"
+
+
+def test_no_fragments_for_a_peer_without_a_capability_tag(rc):
+    st = rc.AckState(_App(rc), "00A1", LONG, 12, target="K1ABC")
+    assert st._fragments() is None
+
+
+def test_fragments_for_a_peer_that_reassembles(rc):
+    for level in (0, 1):
+        st = rc.AckState(_App(rc, [("K1ABC", level)]), "00A1", LONG, 12, target="K1ABC-7")
+        hdr, frags = st._fragments()
+        assert hdr == "K1ABC DE N0CALL"
+        assert "".join(t for _, t in frags) == "this message is well over twenty characters long"
+        assert all(len(t) <= 20 for _, t in frags)
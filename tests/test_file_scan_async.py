@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+_BORROWED = ('send_file_path', '_file_scan_done', '_file_row', '_file_row_label')
+
+
+@pytest.fixture
+def sender(rc, monkeypatch):
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication([])
+    jobs = []
+
+    class Job:
+        def __init__(self, app, fid, to, path, name, nbytes, sha1, cmp, enc, parts, spool, window, resume=False):
+            self.fid, self.nbytes, self.cmp = fid, nbytes, cmp
+            parts.close()
+
+    monkeypatch.setattr(rc, 'FileSendJob', Job)
+
+    class Engine:
+        jobs = {}
+
+        def start(self, job):
+            jobs.append(job)
+
+    class Sender:
+        '''Just enough of a ChatApp to offer a file.'''
+        def __init__(self):
+            self.engine = Engine()
+            self.status = []
+
+        def _ensure_file_state(self): pass
+        def _file_engine(self): return self.engine
+        def _get_target_call(self): return 'K1ABC'
+        def _file_max_bytes(self): return 0
+        def _file_make_fid(self, to=None): return 'F0000AA'
+        def _file_compress_enabled(self): return True
+        def _file_encoding(self): return 'b64'
+        def _file_window_size(self): return 4
+        def _status(self, msg): self.status.append(msg)
+
+    for name in _BORROWED:
+        setattr(Sender, name, getattr(rc.ChatApp, name))
+    return app, Sender(), jobs
+
+
+def test_file_scan_runs_off_the_gui_thread(sender, tmp_path):
+    app, me, jobs = sender
+    path = tmp_path / "log.txt"
+    path.write_bytes(b"CQ CQ DE N0CALL\n" * 20000)
+    assert me.send_file_path(str(path)) == 'F0000AA'
+    assert jobs == []   # the scan result is delivered through the event loop
+    deadline = time.time() + 30
+    while not jobs and time.time() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    assert [(j.fid, j.nbytes) for j in jobs] == [('F0000AA', 320000)]
+    assert jobs[0].cmp in ('zlib', 'lzma')
+    while me.__dict__.get('_file_scans') and time.time() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    assert me._file_scans == {}
@@ -0,0 +1,60 @@
+import pytest
+
+
+@pytest.fixture
+def station(rc):
+    class Station:
+        '''MYCALL fixed at the origin, three stations heard.'''
+        _beacon_coords_enabled = True
+        _beacon_coords_lat, _beacon_coords_lon = 0.0, 0.0
+
+        def __init__(self):
+            self._positions = {'K1ABC': {'lat': 1.0, 'lon': 0.0},
+                               'W2XYZ': {'lat': 0.0, 'lon': 1.0},
+                               'K9DEF': {'lat': 'bad', 'lon': 0.0}}
+
+    for name in ('_my_position', '_geo_index', '_metrics_from_mycall', '_stations_within_km',
+                 '_stations_nearest', '_stations_in_bbox'):
+        setattr(Station, name, getattr(rc.ChatApp, name))
+    return Station()
+
+
+def test_metrics_for_many_stations_in_one_call(rc, station, monkeypatch):
+    batches = []
+    real = rc._geo_metrics_batch
+    monkeypatch.setattr(rc, '_geo_metrics_batch', lambda la, lo, pts: batches.append(len(pts)) or real(la, lo, pts))
+    m = station._metrics_from_mycall(['K1ABC', 'w2xyz', 'K9DEF', 'NOPOS'])
+    assert sorted(m) == ['K1ABC', 'W2XYZ']
+    assert m['K1ABC']['card'] == 'N' and m['W2XYZ']['card'] == 'E'
+    assert round(m['K1ABC']['km']) == 111
+    assert batches == [2]
+    station._metrics_from_mycall(['K1ABC', 'W2XYZ'])
+    assert batches == [2, 0]   # both cached until either end moves
+    station._beacon_coords_lat = 0.5
+    station._metrics_from_mycall(['K1ABC', 'W2XYZ'])
+    assert batches == [2, 0, 2]
+
+
+def test_spatial_queries_from_mycall(station):
+    assert [cs for _, cs in station._stations_within_km(150)] == ['K1ABC', 'W2XYZ']
+    assert station._stations_within_km(100) == []
+    assert [cs for _, cs in station._stations_nearest(1)] == ['K1ABC']
+    assert station._stations_in_bbox(0.5, -0.5, 1.5, 0.5) == ['K1ABC']
+
+
+def test_beacons_heard_rows_carry_distance_and_bearing(rc, station):
+    import time
+    from PyQt5.QtWidgets import QApplication, QListWidget
+    app = QApplication.instance() or QApplication([])
+    now = int(time.time())
+    station.beacons_list = QListWidget()
+    station._graph_parents = {'K1ABC': {'last': now, 'children': {'W2XYZ': {'last': now}}}}
+    station._my_base = lambda: 'N0CALL'
+    station._is_parent_linked = lambda p: True
+    station._is_station_linked = lambda c: False
+    station._route_tip = lambda c: ''
+    rc._rc_refresh_beacons_icons(station)
+    tips = [station.beacons_list.item(i).toolTip() for i in range(station.beacons_list.count())]
+    assert tips[0].startswith('111 km') and tips[0].endswith(' N')
+    assert tips[1].startswith('111 km') and tips[1].endswith(' E')
+    assert app is not None
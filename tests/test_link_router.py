@@ -0,0 +1,37 @@
+import time
+
+
+def _graph(rc, now):
+    g = rc.LinkGraph()
+    g.update("K1ABC", ["W2XYZ"], ts=now)
+    return g
+
+
+def test_child_to_parent_edge_uses_the_logged_parent_snr(rc):
+    now = int(time.time())
+    asked = []
+
+    def snr(src, dst):
+        asked.append((src, dst))
+        return 3.0 if (src, dst) == ("K1ABC", "W2XYZ") else None
+
+    r = rc.LinkRouter(_graph(rc, now), origin="N0CALL", quality_fn=snr)
+    adj = r._adjacency(now)
+    fwd = dict(adj["K1ABC"])["W2XYZ"]
+    back = dict(adj["W2XYZ"])["K1ABC"]
+    assert fwd == back
+    assert ("W2XYZ", "K1ABC") not in asked
+
+
+def test_freshness_is_measured_from_the_newest_beacon(rc, monkeypatch):
+    now = int(time.time())
+    g = rc.LinkGraph()
+    g.update("K1ABC", ["W2XYZ"], ts=now - rc.ROUTE_MAX_AGE_SEC)
+    g.update("K9DEF", ["KC1QQQ"], ts=now)
+    r = rc.LinkRouter(g, origin="N0CALL")
+    stale, fresh = r.route("W2XYZ").cost, r.route("KC1QQQ").cost
+    assert stale > fresh
+    v = r.version
+    monkeypatch.setattr(rc.time, "time", lambda: now + 10 * rc.ROUTE_MAX_AGE_SEC)
+    assert (r.route("W2XYZ").cost, r.route("KC1QQQ").cost) == (stale, fresh)
+    assert r.version == v   # no rebuild without a graph event
@@ -0,0 +1,53 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+LINKMAP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Linkmap.py")
+
+
+@pytest.fixture(scope="module")
+def lm():
+    spec = importlib.util.spec_from_file_location("linkmap", LINKMAP)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def _run(lm, monkeypatch, log, out, *extra):
+    monkeypatch.setattr(sys, "argv", ["Linkmap.py", "--input", str(log), "--output", str(out),
+                                      "--mycall", "N0CALL", *extra])
+    lm.main()
+
+
+def _count(lm, out, key):
+    st = lm.LinkQualityStore.load(lm.quality_path_for(str(out)))
+    return sum(row[1] for row in st.series(key, "1d"))
+
+
+def test_one_shot_reruns_do_not_duplicate_samples(lm, tmp_path, monkeypatch):
+    log, out = tmp_path / "beacons.txt", tmp_path / "link_graph.json"
+    log.write_text("..<K1ABC> -5 dB\n/W2XYZ -9 dB\n")
+    for _ in range(3):
+        _run(lm, monkeypatch, log, out)
+    assert _count(lm, out, "N0CALL>K1ABC") == 1
+    assert _count(lm, out, "K1ABC>W2XYZ") == 1
+    with open(log, "a") as f:
+        f.write("..<K1ABC> -4 dB\n/W2XYZ -7")   # last line still being written
+    _run(lm, monkeypatch, log, out)
+    assert _count(lm, out, "N0CALL>K1ABC") == 2
+    assert _count(lm, out, "K1ABC>W2XYZ") == 1
+    with open(log, "a") as f:
+        f.write(" dB\n")
+    _run(lm, monkeypatch, log, out)
+    assert _count(lm, out, "K1ABC>W2XYZ") == 2
+
+
+def test_overwrite_starts_the_quality_history_over(lm, tmp_path, monkeypatch):
+    log, out = tmp_path / "beacons.txt", tmp_path / "link_graph.json"
+    log.write_text("..<K1ABC> -5 dB\n")
+    _run(lm, monkeypatch, log, out)
+    _run(lm, monkeypatch, log, out, "--mode", "overwrite")
+    _run(lm, monkeypatch, log, out, "--mode", "overwrite")
+    assert _count(lm, out, "N0CALL>K1ABC") == 1
@@ -0,0 +1,57 @@
+class _Graph:
+    def __init__(self):
+        self.updates = []
+
+    def update(self, parent, children, ts=None):
+        self.updates.append((parent, children))
+
+
+class _Ack:
+    def __init__(self, ack_id, target):
+        self.ack_id = ack_id
+        self.target = target
+        self.acked = False
+
+    def on_ack_received(self):
+        self.acked = True
+
+
+class _Station:
+    def __init__(self, call, states=()):
+        self.call = call
+        self.link_graph = _Graph()
+        self.heard = []
+        self.states = {st.ack_id: st for st in states}
+
+    def _outbox_peer_heard(self, call):
+        self.heard.append(call)
+
+    def _ack_manager(self):
+        return self
+
+    def get(self, ack_id):
+        return self.states.get(ack_id)
+
+
+def test_beacon_graph_update_releases_the_outbox(rc):
+    me = _Station("N0CALL")
+    rc._rc_link_graph_update(me, "K1ABC-7", ["W2XYZ"])
+    assert me.link_graph.updates == [("K1ABC", ["W2XYZ"])]
+    assert me.heard == ["K1ABC"]
+
+
+def test_ack_replies_settle_the_message(rc):
+    bare, tagged = _Ack("00C1", "K1ABC"), _Ack("00C2", "K1ABC-7")
+    me = _Station("N0CALL", [bare, tagged])
+    rc.ChatApp._outbox_on_rx(me, "N0CALL DE K1ABC ACK 00C1 [Z1]")
+    rc.ChatApp._outbox_on_rx(me, "N0CALL DE K1ABC [ACK:00C2]")
+    assert bare.acked and tagged.acked
+    assert me.heard == ["K1ABC", "K1ABC"]
+
+
+def test_ack_from_another_station_is_ignored(rc):
+    st = _Ack("00C3", "K1ABC")
+    me = _Station("N0CALL", [st])
+    me._outbox = lambda: {}
+    rc.ChatApp._outbox_on_rx(me, "N0CALL DE W2XYZ ACK 00C3")
+    assert not st.acked
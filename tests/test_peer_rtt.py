@@ -0,0 +1,12 @@
+def test_default_pause_stays_fixed_until_the_peer_is_sampled(rc):
+    t = rc.PeerRttTable()
+    assert [t.retry_delay("K1ABC", n, 12.0) for n in (1, 2, 3)] == [12.0, 12.0, 12.0]
+    t.note_retry("K1ABC")   # a retry alone gives no RTT sample
+    assert t.retry_delay("K1ABC", 3, 12.0) == 12.0
+
+
+def test_sampled_peer_backs_off_from_its_rto(rc):
+    t = rc.PeerRttTable()
+    t.sample("K1ABC", 2.0)
+    rto = t.get("K1ABC").rto
+    assert [t.retry_delay("K1ABC-7", n, 12.0) for n in (1, 2, 3)] == [rto, 2 * rto, 4 * rto]
@@ -0,0 +1,68 @@
+import pytest
+
+_BORROWED = ('_load_positions', '_positions_for_save', '_save_positions', '_save_positions_soon',
+             '_pos_track', '_positions_upsert')
+
+
+class _Timer:
+    pending = []
+
+    @classmethod
+    def singleShot(cls, ms, fn):
+        cls.pending.append((ms, fn))
+
+
+@pytest.fixture
+def station(rc, monkeypatch):
+    store = {}
+    monkeypatch.setattr(rc, 'load_json', lambda name: store.get(name, {}))
+    monkeypatch.setattr(rc, 'save_json', lambda name, data: store.__setitem__(name, data))
+    monkeypatch.setattr(rc, 'QTimer', _Timer)
+    _Timer.pending = []
+
+    class Station:
+        '''Just enough of a ChatApp for the positions store.'''
+        saves = 0
+
+        def _mirror_positions_to_geojson_from_store(self):
+            Station.saves += 1
+
+        def _geo_index(self):
+            raise RuntimeError('no index here')
+
+    for name in _BORROWED:
+        setattr(Station, name, getattr(rc.ChatApp, name))
+    return Station, store
+
+
+def test_tracks_stay_packed_in_memory_and_saves_are_throttled(rc, station):
+    Station, store = station
+    st = Station()
+    st._positions_upsert('K1ABC', 40.0, -75.0)
+    st._positions_upsert('K1ABC', 40.01, -75.0)
+    st._positions_upsert('K1ABC', 40.02, -75.0)
+    assert 'track' not in st._positions['K1ABC']
+    assert len(st._pos_tracks['K1ABC']) == 3
+    assert Station.saves == 1 and len(_Timer.pending) == 1
+    _Timer.pending[0][1]()
+    assert Station.saves == 2
+    saved = store['positions.json']['K1ABC']
+    assert saved['track']['lat'] == [40.0, 40.01, 40.02]
+    assert saved['lat'] == 40.02
+
+
+def test_stored_tracks_load_into_the_packed_columns(rc, station):
+    Station, store = station
+    store['positions.json'] = {'K1ABC': {'lat': 1.0, 'lon': 2.0, 'track': {'t': [5], 'lat': [1.0], 'lon': [2.0]}}}
+    st = Station()
+    st._positions = st._load_positions()
+    assert st._positions == {'K1ABC': {'lat': 1.0, 'lon': 2.0}}
+    assert st._pos_tracks['K1ABC'].points() == [(5, 1.0, 2.0)]
+
+
+def test_beacon_pipe_positions_go_through_the_upsert(rc, station):
+    Station, store = station
+    st = Station()
+    rc._f25_update_positions(st, 'k1abc', 40.0, -75.0)
+    assert store['positions.json']['K1ABC']['source'] == 'beacon-rx'
+    assert 'positions' not in store['positions.json']
@@ -0,0 +1,82 @@
+class _Call:
+    def __init__(self, call):
+        self.call = call
+
+    def text(self):
+        return self.call
+
+
+class _Relay:
+    '''Just enough of a ChatApp for _relay_on_rx: K9DEF hears W2XYZ in the link graph, TX is recorded.'''
+
+    def __init__(self, rc, call="N0CALL"):
+        self.mycall_edit = _Call(call)
+        self.link_graph = rc.LinkGraph()
+        self.link_graph.update("K9DEF", ["W2XYZ"])
+        self.sent = []
+        self._relay_on = True
+        for name in ('_relay_on_rx', '_link_router', '_route_next_hop'):
+            setattr(self, name, getattr(rc.ChatApp, name).__get__(self))
+
+    def _mycall_base(self):
+        return self.mycall_edit.text()
+
+    def _outbox_on_rx(self, line):
+        pass
+
+    def _route_edge_snr(self, src, dst):
+        return None
+
+    def _tx_enqueue(self, text):
+        self.sent.append(text)
+        return True
+
+    def _diag(self, msg):
+        pass
+
+
+def test_rate_limited_line_is_relayed_once_tokens_refill(rc):
+    gate = rc.RelayGate(ttl=30, target_rate=(1.0, 1), global_rate=(10.0, 10))
+    assert gate.check("W2XYZ", "W2XYZ DE K1ABC one", now=100.0) == ""
+    assert gate.check("W2XYZ", "W2XYZ DE K1ABC two", now=100.1) == "limited"
+    assert gate.check("W2XYZ", "W2XYZ DE K1ABC two", now=101.5) == ""
+    assert gate.check("W2XYZ", "W2XYZ DE K1ABC two", now=103.0) == "dup"
+
+
+def test_relay_runs_from_the_protocol_dispatcher(rc):
+    me = _Relay(rc)
+    handled = rc.ChatApp._rx_protocol_line(me, "W2XYZ DE K1ABC hello [ACK:00C1]")
+    assert handled is False
+    assert len(me.sent) == 1
+    assert me.sent[0].startswith("W2XYZ DE K1ABC hello [RLY:1/")
+    assert me.sent[0].endswith("[ACK:00C1]")
+    rc.ChatApp._rx_protocol_line(me, me.sent[0])
+    assert len(me.sent) == 1
+
+
+def test_unheard_targets_are_not_relayed(rc):
+    me = _Relay(rc)
+    rc.ChatApp._rx_protocol_line(me, "KC1QQQ DE K1ABC hello")
+    assert me.sent == []
+
+
+def test_relay_is_off_unless_enabled(rc):
+    me = _Relay(rc)
+    me._relay_on = False
+    rc.ChatApp._rx_protocol_line(me, "W2XYZ DE K1ABC hello")
+    assert me.sent == []
+
+
+def test_protocol_frames_and_ack_replies_are_not_relayed(rc):
+    me = _Relay(rc)
+    for body in ("FILE PART 3/10 [FID:F00010A] QUJDREVGRw==", "FILE FEC 1/2 [FID:F00010A] QUJD",
+                 "[FRG:0042 1/2 1D0F] part one", "[ZNAK:00B2]", "~Z1 0001 eJwrSS0u", "[ACK:00C1] [Z1]",
+                 "ACK 00C1"):
+        rc.ChatApp._rx_protocol_line(me, f"W2XYZ DE K1ABC {body}")
+    assert me.sent == []
+
+
+def test_no_relay_when_the_best_route_starts_at_the_sender(rc):
+    me = _Relay(rc)
+    rc.ChatApp._rx_protocol_line(me, "W2XYZ DE K9DEF hello")
+    assert me.sent == []
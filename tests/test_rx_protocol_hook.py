@@ -0,0 +1,28 @@
+class _Probe:
+    '''Stands in for a ChatApp: records what the protocol dispatcher is handed.'''
+
+    def __init__(self, handled=True):
+        self.handled = handled
+        self.lines = []
+
+    def _rx_protocol_line(self, line):
+        self.lines.append(line)
+        return self.handled
+
+
+def test_patched_rx_handler_reaches_protocol_dispatcher(rc):
+    probe = _Probe()
+    line = "N0CALL DE K1ABC FILE PART 1/3 [FID:A1B2C3D] SGVsbG8="
+    rc.ChatApp._on_serial_thread_line(probe, line)
+    assert probe.lines == [line]
+
+
+def test_protocol_frames_stop_before_the_patch_chain(rc, monkeypatch):
+    probe = _Probe(handled=True)
+    reached = []
+    monkeypatch.setattr(rc, "_F27_ORIG_RX", lambda self, line: reached.append(line))
+    rc.ChatApp._on_serial_thread_line(probe, "N0CALL DE K1ABC [FRG:0042 1/2 1D0F] part one")
+    assert reached == []
+    probe.handled = False
+    rc.ChatApp._on_serial_thread_line(probe, "N0CALL DE K1ABC hello [ACK:0043]")
+    assert reached == ["N0CALL DE K1ABC hello [ACK:0043]"]